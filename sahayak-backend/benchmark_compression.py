@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Bytes on the wire and CPU cost of response compression per response type.
+
+Payloads are shaped like the real responses: a JSON lesson plan in English and
+in Hindi (Devanagari is 3 bytes per character in UTF-8), a three-grade
+worksheet set, a short knowledge answer (below the size threshold) and an SSE
+stream of chunk events compressed with a flush after every event, as the
+middleware sends it. The defaults are gzip-6 and br-5; streams prefer gzip.
+
+Usage: python benchmark_compression.py [iterations]
+"""
+import json
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.compression import BROTLI_AVAILABLE, _Compressor, compress_body
+from services.sse import sse_event
+
+ENGLISH_LESSON = """
+Lesson Plan: The Water Cycle (Grade 4, Science, 40 minutes)
+
+Learning objectives
+1. Students describe evaporation, condensation, precipitation and collection in their own words.
+2. Students explain why puddles in the school yard disappear after a sunny afternoon.
+3. Students draw and label the water cycle using examples from their village.
+
+Materials: a steel tumbler, ice cubes, a small pot of warm water, chalk, chart paper, crayons.
+
+Introduction (5 minutes)
+Ask the class where the water in the village pond goes in May and where the rain comes from in July.
+Write every answer on the board without correcting it; we will come back to these ideas at the end.
+
+Activity 1: Evaporation (10 minutes)
+Place the pot of warm water near the window and cover half of it with a plate. After a few minutes
+lift the plate and let the children see the drops underneath. Explain that heat from the sun turns
+water into invisible vapour that rises into the air. Ask: why do wet clothes dry faster on a windy day?
+
+Activity 2: Condensation (10 minutes)
+Fill the steel tumbler with ice and wait. Droplets form on the outside even though the tumbler does not
+leak. The cold surface cools the water vapour in the air until it becomes liquid again. Clouds form the
+same way high in the sky, where the air is much colder than near the ground.
+
+Discussion: precipitation and collection (10 minutes)
+When the droplets in a cloud join together they become heavy and fall as rain, or as hail in some hilly
+areas. Rain flows into streams, wells, ponds and rivers, and soaks into the soil for plants and crops.
+Connect this to the monsoon calendar farmers in the village follow for sowing rice and millet.
+
+Assessment (5 minutes)
+Each child draws the four stages in a circle on chart paper and writes one sentence for each arrow.
+Stronger readers add one way their family saves water at home.
+
+Homework: observe the sky for three days and note whether there were clouds, wind or rain.
+""".strip()
+
+HINDI_LESSON = """
+पाठ योजना: जल चक्र (कक्षा 4, विज्ञान, 40 मिनट)
+
+सीखने के उद्देश्य
+1. छात्र वाष्पीकरण, संघनन, वर्षा और संग्रहण को अपने शब्दों में समझा सकेंगे।
+2. छात्र बता सकेंगे कि धूप वाले दिन स्कूल के आँगन के गड्ढों का पानी कहाँ चला जाता है।
+3. छात्र अपने गाँव के उदाहरणों से जल चक्र का चित्र बनाकर उसके भागों के नाम लिखेंगे।
+
+सामग्री: स्टील का गिलास, बर्फ के टुकड़े, गुनगुने पानी का छोटा बर्तन, चॉक, चार्ट पेपर, रंग।
+
+परिचय (5 मिनट)
+बच्चों से पूछें कि मई के महीने में गाँव के तालाब का पानी कहाँ जाता है और जुलाई में बारिश कहाँ से आती है।
+सभी उत्तर बोर्ड पर लिखें और अभी उन्हें सुधारें नहीं; पाठ के अंत में हम इन पर फिर से बात करेंगे।
+
+गतिविधि 1: वाष्पीकरण (10 मिनट)
+गुनगुने पानी का बर्तन खिड़की के पास रखें और उसका आधा हिस्सा एक प्लेट से ढक दें। कुछ मिनट बाद प्लेट
+उठाएँ और बच्चों को उसके नीचे जमी बूँदें दिखाएँ। समझाएँ कि सूरज की गर्मी पानी को भाप में बदल देती है जो
+हवा में ऊपर उठ जाती है। पूछें: हवा वाले दिन गीले कपड़े जल्दी क्यों सूखते हैं?
+
+गतिविधि 2: संघनन (10 मिनट)
+स्टील के गिलास में बर्फ भरें और थोड़ी देर प्रतीक्षा करें। गिलास के बाहर पानी की बूँदें दिखाई देंगी, जबकि
+गिलास कहीं से नहीं रिसता। ठंडी सतह हवा की भाप को ठंडा करके फिर से पानी बना देती है। आकाश में बादल भी
+इसी तरह बनते हैं, जहाँ हवा ज़मीन के पास की तुलना में बहुत ठंडी होती है।
+
+चर्चा: वर्षा और संग्रहण (10 मिनट)
+जब बादल की छोटी बूँदें आपस में मिलकर भारी हो जाती हैं तो वे बारिश बनकर गिरती हैं, और पहाड़ी इलाकों में
+कभी-कभी ओले भी पड़ते हैं। बारिश का पानी नालों, कुओं, तालाबों और नदियों में जाता है और मिट्टी में समाकर
+पौधों और फसलों के काम आता है। इसे उस मानसून कैलेंडर से जोड़ें जिसके अनुसार गाँव के किसान धान और बाजरा बोते हैं।
+
+मूल्यांकन (5 मिनट)
+हर बच्चा चार्ट पेपर पर एक गोले में चारों चरण बनाए और हर तीर के लिए एक वाक्य लिखे।
+अच्छा पढ़ने वाले बच्चे यह भी लिखें कि उनका परिवार घर पर पानी कैसे बचाता है।
+
+गृहकार्य: तीन दिन तक आकाश को देखें और लिखें कि बादल, हवा या बारिश थी या नहीं।
+""".strip()
+
+HINDI_QUESTIONS = [
+    "पानी भाप में कैसे बदलता है? अपने घर का एक उदाहरण लिखिए।",
+    "बादल किससे बनते हैं?",
+    "ठंडे गिलास के बाहर बूँदें क्यों दिखाई देती हैं?",
+    "बारिश का पानी कहाँ-कहाँ जाता है? कोई तीन जगह लिखिए।",
+    "किसान मानसून का इंतज़ार क्यों करते हैं?",
+    "खाली स्थान भरिए: सूरज की गर्मी से पानी का ______ होता है।",
+    "सही या गलत: संघनन में भाप फिर से पानी बन जाती है।",
+    "जल चक्र के चार चरणों के नाम क्रम से लिखिए।",
+    "अपने गाँव में पानी बचाने के दो तरीके बताइए।",
+    "गर्मियों में तालाब का पानी कम क्यों हो जाता है?"
+]
+
+
+def hindi_worksheets():
+    worksheets = {}
+    for offset, grade in enumerate(("3", "4", "5")):
+        questions = HINDI_QUESTIONS[offset:] + HINDI_QUESTIONS[:offset]
+        worksheets[grade] = (
+            f"कार्यपत्रक - कक्षा {grade}\nविषय: विज्ञान - जल चक्र\n\n"
+            + "\n".join(f"{index}. {question}" for index, question in enumerate(questions, 1))
+            + f"\n\nउत्तर कुंजी (कक्षा {grade}):\n"
+            + "\n".join(f"{index}. {question[:30]}..." for index, question in enumerate(questions[:5], 1))
+        )
+    return {
+        "worksheets": worksheets,
+        "success": True,
+        "message": "Successfully generated worksheets for grades 3, 4, 5 using Google AI"
+    }
+
+
+def payloads():
+    def as_json(data):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+    sse = [
+        sse_event("chunk", {"text": " ".join(HINDI_LESSON.split()[start:start + 15]) + " "}).encode("utf-8")
+        for start in range(0, len(HINDI_LESSON.split()), 15)
+    ]
+    sse.append(sse_event("done", {"lesson_plan": HINDI_LESSON, "language": "hi"}).encode("utf-8"))
+
+    return [
+        ("lesson plan (en) JSON", [as_json({"lesson_plan": ENGLISH_LESSON, "language": "en"})]),
+        ("lesson plan (hi) JSON", [as_json({"lesson_plan": HINDI_LESSON, "language": "hi"})]),
+        ("worksheets 3 grades (hi)", [as_json(hindi_worksheets())]),
+        ("knowledge answer (en)", [as_json({"answer": ENGLISH_LESSON[:600], "language": "en"})]),
+        ("lesson SSE stream (hi)", sse),
+    ]
+
+
+def encode(chunks, encoding, level, minimum_size):
+    """Bytes on the wire as the middleware would send them"""
+    if encoding == "identity":
+        return sum(len(chunk) for chunk in chunks)
+    if len(chunks) == 1:
+        if len(chunks[0]) < minimum_size:
+            return len(chunks[0])
+        return len(compress_body(chunks[0], encoding, gzip_level=level, brotli_quality=level))
+    compressor = _Compressor(encoding, level, level)
+    total = 0
+    for chunk in chunks[:-1]:
+        total += len(compressor.compress(chunk, flush=True))
+    return total + len(compressor.compress(chunks[-1]) + compressor.finish())
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    minimum_size = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    settings = [("identity", 0), ("gzip", 1), ("gzip", 6), ("gzip", 9)]
+    if BROTLI_AVAILABLE:
+        settings += [("br", 1), ("br", 4), ("br", 5), ("br", 6)]
+
+    print(f"Compression per response type ({iterations} iterations, threshold {minimum_size} bytes)")
+    print(f"   {'response':<26} {'encoding':<8} {'bytes':>7} {'ratio':>6} {'cpu µs':>8} "
+          f"{'256 kbps ms':>12} {'1 Mbps ms':>10}")
+    for name, chunks in payloads():
+        original = sum(len(chunk) for chunk in chunks)
+        for encoding, level in settings:
+            wire = encode(chunks, encoding, level, minimum_size)
+            cpu_started = time.process_time()
+            for _ in range(iterations):
+                encode(chunks, encoding, level, minimum_size)
+            cpu_us = (time.process_time() - cpu_started) / iterations * 1e6
+            label = encoding if encoding == "identity" else f"{encoding}-{level}"
+            print(f"   {name:<26} {label:<8} {wire:7d} {original / wire:6.2f} {cpu_us:8.0f} "
+                  f"{wire * 8 / 256:12.0f} {wire * 8 / 1000:10.0f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
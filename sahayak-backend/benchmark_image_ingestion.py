@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Cost of preparing a textbook page photo for Gemini, and the bytes it saves.
+
+Compares sending the raw upload with the ingestion pipeline (decode once at
+reduced JPEG scale, downscale to WORKSHEET_IMAGE_MAX_SIDE, re-encode) and with
+a naive full-resolution decode + resize. Pass phone photos to measure real
+pages; without arguments a synthetic 12 MP camera JPEG is used.
+
+Usage: python benchmark_image_ingestion.py [photo.jpg ...]
+"""
+import io
+import os
+import sys
+import time
+import random
+import statistics
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image, ImageDraw, ImageOps
+
+from services.image_ingestion import ImageIngestor
+
+RUNS = 5
+
+
+def synthetic_photo(width=4000, height=3000):
+    """Camera-like JPEG: sensor noise, uneven lighting and dark lines of text"""
+    rng = random.Random(7)
+    noise = Image.effect_noise((width, height), 30).convert("RGB")
+    light = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    image = Image.blend(noise, light, 0.5)
+    draw = ImageDraw.Draw(image)
+    for line in range(38):
+        y = 120 + line * 75
+        x = 250
+        while x < width - 400:
+            word = rng.randint(60, 260)
+            draw.rectangle((x, y, x + word, y + 32), fill=(25, 25, 30))
+            x += word + rng.randint(25, 45)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=92)
+    return output.getvalue()
+
+
+def naive_prepare(data, max_side, quality):
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def main():
+    photos = [(path, open(path, "rb").read()) for path in sys.argv[1:]] or [("synthetic 12 MP", synthetic_photo())]
+    max_side = int(os.getenv("WORKSHEET_IMAGE_MAX_SIDE", "1024"))
+    quality = int(os.getenv("WORKSHEET_IMAGE_QUALITY", "80"))
+    ingestor = ImageIngestor(max_side=max_side, quality=quality)
+
+    print(f"Target: longest side {max_side} px, JPEG quality {quality}; median of {RUNS} runs")
+    for name, data in photos:
+        width, height = Image.open(io.BytesIO(data)).size
+        print(f"\n{name}: {width}x{height}, {len(data) / 1024:.0f} KiB raw, "
+              f"{len(data) * 4 / 3 / 1024:.0f} KiB as base64 in the request")
+
+        naive_ms = []
+        for _ in range(RUNS):
+            started = time.perf_counter()
+            naive = naive_prepare(data, max_side, quality)
+            naive_ms.append((time.perf_counter() - started) * 1000)
+
+        runs = [ingestor.prepare(data) for _ in range(RUNS)]
+        prepared = runs[0]
+        stage = {key: statistics.median(run.timings_ms[key] for run in runs) for key in prepared.timings_ms}
+
+        print(f"   full decode + resize      {statistics.median(naive_ms):7.1f} ms  -> {len(naive) / 1024:6.0f} KiB")
+        print(f"   ingestion pipeline        {stage['total']:7.1f} ms  -> {len(prepared.data) / 1024:6.0f} KiB "
+              f"({prepared.width}x{prepared.height})")
+        print(f"      decode {stage['decode']:.1f} ms, resize {stage['resize']:.1f} ms, encode {stage['encode']:.1f} ms")
+        print(f"   bytes saved per model call {(len(data) - len(prepared.data)) / 1024:6.0f} KiB "
+              f"({len(prepared.data) / len(data):.1%} of the raw photo)")
+
+
+if __name__ == "__main__":
+    main()
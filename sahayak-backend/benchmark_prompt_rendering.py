@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: prompt assembly with per-request f-strings (the original code,
+which also rebuilt its lookup tables on every call) versus the precompiled
+prompt registry.
+
+Usage: python benchmark_prompt_rendering.py [iterations]
+"""
+import sys
+import os
+import timeit
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.genkit_ai_service import GenkitAIService, WORD_LIMITS, GRADE_INSTRUCTIONS
+from services.prompt_templates import PROMPTS
+
+
+def educational_prompt_before(prompt, grade_level="3", length="medium", content_type="content"):
+    word_limits = {size: dict(limits) for size, limits in WORD_LIMITS.items()}
+    word_count = word_limits.get(length, word_limits["medium"])
+    grade_instructions = dict(GRADE_INSTRUCTIONS)
+    grade_instruction = grade_instructions.get(grade_level, grade_instructions["3"])
+    enhanced_prompt = f"""
+You are an expert educational content creator with perfect knowledge of facts and grammar.
+
+Topic: {prompt}
+Grade Level: {grade_level}
+Content Type: {content_type}
+Word Limit: {word_count['min']}-{word_count['max']} words
+
+Critical Requirements:
+- Use perfect grammar and spelling
+- Ensure ALL facts are completely accurate and verified
+- Use simple, clear sentences appropriate for grade {grade_level} students
+- Be educational, engaging, and age-appropriate
+- Stay strictly within the word limit
+- {grade_instruction}
+
+Write about '{prompt}':
+"""
+    return enhanced_prompt.strip()
+
+
+def vision_worksheet_prompt_before(grade="4", subject="Science"):
+    return f"""
+                You are an expert Indian educator creating worksheets. Analyze the provided textbook page image carefully and create a comprehensive worksheet for Grade {grade} students in {subject}.
+
+                Please examine the image and identify:
+                1. Main concepts, topics, and learning objectives
+                2. Text content, examples, and explanations
+                3. Diagrams, illustrations, or visual elements
+                4. Any exercises or activities shown
+                5. Key vocabulary and terms
+
+                Based on your analysis, create a Grade {grade} worksheet that includes:
+
+                WORKSHEET STRUCTURE:
+                - Clear header with grade and subject
+                - Learning objectives based on image content
+                - 8-12 varied questions directly related to the image content
+                - Multiple question types: fill-in-the-blank, short answer, match the following, true/false, multiple choice
+                - Questions that test comprehension, application, and analysis
+                - Difficulty appropriate for Grade {grade} Indian curriculum
+                - Clear instructions for each section
+
+                QUESTION TYPES TO INCLUDE:
+                1. Vocabulary questions (key terms from the image)
+                2. Comprehension questions (understanding main concepts)
+                3. Application questions (using the knowledge)
+                4. Analysis questions (comparing, contrasting, explaining)
+                5. Visual interpretation (if diagrams are present)
+
+                REQUIREMENTS:
+                - Align with Indian curriculum standards for Grade {grade}
+                - Use age-appropriate language
+                - Include both recall and higher-order thinking questions
+                - Make it engaging and educational
+                - Ensure questions directly relate to image content
+                - Add bonus questions for advanced learners
+
+                Subject: {subject}
+                Grade Level: {grade}
+
+                Create a complete, ready-to-print worksheet.
+                """
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    service = GenkitAIService()
+    topics = [f"topic {index}" for index in range(100)]
+
+    cases = [
+        (
+            "educational.en (topic varies)",
+            lambda i: educational_prompt_before(topics[i % 100]),
+            lambda i: service._create_educational_prompt(topics[i % 100], "en", "content", "3", "medium")
+        ),
+        (
+            "worksheet.vision (per grade/subject)",
+            lambda i: vision_worksheet_prompt_before("4", "Science"),
+            lambda i: PROMPTS.render("worksheet.vision", {"grade": "4", "subject": "Science"})
+        ),
+    ]
+
+    print(f"Prompt rendering over {iterations} iterations:")
+    for name, before, after in cases:
+        counter = iter(range(10 ** 9))
+        before_seconds = timeit.timeit(lambda: before(next(counter)), number=iterations)
+        counter = iter(range(10 ** 9))
+        after_seconds = timeit.timeit(lambda: after(next(counter)), number=iterations)
+        before_us = before_seconds / iterations * 1e6
+        after_us = after_seconds / iterations * 1e6
+        print(f"   {name}")
+        print(f"      f-string assembly: {before_us:7.2f} µs")
+        print(f"      prompt registry:   {after_us:7.2f} µs   ({before_us / after_us:.1f}x)")
+
+    print("Hot templates:")
+    for template in PROMPTS.stats()["hot_templates"]:
+        print(f"   {template['name']:<22} renders={template['renders']:<8} "
+              f"variants={template['compiled_variants']:<4} version={template['version']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the generation routers against the offline LLM
+provider: no network, no API key, no quota spent.
+
+Every request uses a distinct topic and the response cache is off, so each one
+reaches the provider. Tune the stand-in with the OFFLINE_LLM_* variables
+(latency distribution, error rate, token throughput); the Gemini quota
+scheduler is opened up unless GOOGLE_AI_RPM is set.
+
+/visuals is not included: it calls external image services after the model.
+
+Usage: python benchmark_routers.py [requests_per_endpoint] [concurrency]
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["LLM_PROVIDER"] = "offline"
+os.environ.setdefault("GOOGLE_AI_CACHE_ENABLED", "false")
+os.environ.setdefault("GOOGLE_AI_RPM", "100000")
+os.environ.setdefault("GOOGLE_AI_TPM", "1000000000")
+os.environ.setdefault("GOOGLE_AI_MAX_CONCURRENCY", "64")
+os.environ.setdefault("OFFLINE_LLM_LATENCY_MS", "300")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+ENDPOINTS = [
+    ("/content/generate", lambda i: {
+        "topic": f"water cycle {i}", "gradeLevel": "3", "contentType": "story", "language": "en", "length": "short"
+    }),
+    ("/lessons/generate", lambda i: {
+        "topic": f"fractions {i}", "subject": "Mathematics", "grade_level": "4", "language": "en"
+    }),
+    ("/knowledge/ask", lambda i: {
+        "question": f"Why is the sky blue? ({i})", "language": "en", "complexity": "simple"
+    }),
+    ("/assessment/generate-text", lambda i: {
+        "grade_level": str(1 + i % 5), "language": "en", "difficulty": ["easy", "medium", "hard"][i % 3]
+    }),
+    ("/worksheets/generate-with-vision", lambda i: {
+        "image": "", "grades": ["3", "4", "5"], "subject": f"Science {i}"
+    }),
+]
+
+
+async def benchmark_endpoint(client, path, payload, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(index):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, json=payload(index))
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(index) for index in range(requests)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "throughput": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "errors": errors
+    }
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    from main import app
+    from services.genkit_ai_service import GenkitAIService
+
+    service = GenkitAIService()
+    print(f"Provider: {service.provider.stats()}")
+    print(f"{requests} requests per endpoint, {concurrency} concurrent")
+    print(f"   {'endpoint':<36} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+        for path, payload in ENDPOINTS:
+            result = await benchmark_endpoint(client, path, payload, requests, concurrency)
+            print(f"   {path:<36} {result['throughput']:8.1f} {result['p50_ms']:9.0f} "
+                  f"{result['p95_ms']:9.0f} {result['errors']:7d}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Latency of a multi-grade worksheet request, grades one after another versus
+generated concurrently, against the offline LLM provider (no network, no quota).
+
+The stand-in answers after OFFLINE_LLM_LATENCY_MS (fixed, 1500 ms by default)
+plus token streaming time, about what one gemini-1.5-flash worksheet takes.
+The response cache is off and every run uses a new subject, so every grade
+reaches the provider.
+
+Usage: python benchmark_worksheets.py [grades] [runs]
+"""
+import asyncio
+import statistics
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["LLM_PROVIDER"] = "offline"
+os.environ.setdefault("GOOGLE_AI_CACHE_ENABLED", "false")
+os.environ.setdefault("GOOGLE_AI_RPM", "100000")
+os.environ.setdefault("GOOGLE_AI_TPM", "1000000000")
+os.environ.setdefault("OFFLINE_LLM_LATENCY_MS", "1500")
+os.environ.setdefault("OFFLINE_LLM_LATENCY_DISTRIBUTION", "fixed")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+
+async def main():
+    grade_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    grades = [str(grade) for grade in range(1, grade_count + 1)]
+
+    from main import app
+    from routers import worksheets
+    from services.genkit_ai_service import GenkitAIService
+
+    print(f"Provider: {GenkitAIService().provider.stats()}")
+    print(f"{grade_count} grades per request, {runs} runs each")
+    print(f"   {'endpoint':<34} {'fan-out':>7} {'mean s':>8} {'max s':>7} {'speedup':>8}")
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=300) as client:
+        requests = [
+            ("/worksheets/generate-with-vision",
+             lambda subject: client.post("/worksheets/generate-with-vision",
+                                         json={"image": "", "grades": grades, "subject": subject})),
+            ("/worksheets/generate",
+             lambda subject: client.post("/worksheets/generate",
+                                         data={"grades": grades, "subject": subject},
+                                         files={"image": ("page.jpg", b"page", "image/jpeg")})),
+        ]
+        for path, send in requests:
+            baseline = None
+            for fan_out in (1, grade_count):
+                worksheets.WORKSHEET_MAX_CONCURRENCY = fan_out
+                elapsed = []
+                for run in range(runs):
+                    started = time.perf_counter()
+                    response = await send(f"Science {path} {fan_out} {run}")
+                    elapsed.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.text
+                    assert len(response.json()["worksheets"]) == grade_count
+                mean = statistics.mean(elapsed)
+                baseline = baseline or mean
+                print(f"   {path:<34} {fan_out:7d} {mean:8.2f} {max(elapsed):7.2f} {baseline / mean:7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,6 +11,9 @@ import logging
 
 # Import route modules
 from routers import content, worksheets, knowledge, visuals, assessment, lessons, dashboard
+from services.rate_limiter import QuotaExceededError
+from services.structured_logging import configure_logging, bind_request_id
+from services.compression import CompressionMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -107,11 +110,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging with less verbose output
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+# Negotiated brotli/gzip: lesson plans, worksheets and Devanagari text are large
+# and many schools are on slow links
+if os.getenv("COMPRESSION_ENABLED", "true").lower() == "true":
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=int(os.getenv("COMPRESSION_MIN_SIZE", "1024")),
+        gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    )
+
+@app.middleware("http")
+async def request_id_middleware(request, call_next):
+    """Tag every log line for this request with one ID and echo it back to the client"""
+    request_id = bind_request_id(request.headers.get("X-Request-ID"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.exception_handler(QuotaExceededError)
+async def quota_exceeded_handler(request, exc: QuotaExceededError):
+    """Tell clients when to retry instead of serving fallback content"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Structured logging through a background queue (LOG_FORMAT=json|text)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Reduce logging from external libraries
@@ -150,12 +177,15 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
+    from services.genkit_ai_service import GenkitAIService
+    
     return {
         "status": "healthy", 
         "service": "sahayak-api",
         "ai_service": "Google AI",
         "ai_ready": ai_status,
-        "google_ai_configured": check_google_ai_setup()
+        "google_ai_configured": check_google_ai_setup(),
+        "ai_circuit_breaker": GenkitAIService().circuit_breaker.stats()
     }
 
 @app.get("/debug/ai-status")
@@ -196,6 +226,29 @@ async def debug_ai_status():
             "api_key_configured": bool(os.getenv("GOOGLE_AI_API_KEY"))
         }
 
+@app.get("/debug/ai-stats")
+async def debug_ai_stats():
+    """Debug endpoint exposing AI service counters (cache hits, misses, evictions)"""
+    from services.genkit_ai_service import GenkitAIService
+
+    service = GenkitAIService()
+    return {
+        "ai_service": "Google AI (Gemini)",
+        "stats": service.get_stats(),
+        "timestamp": str(__import__('datetime').datetime.now())
+    }
+
+@app.get("/debug/ai-usage")
+async def debug_ai_usage(window_minutes: Optional[int] = None):
+    """Per-module token, latency and cost accounting over a rolling window"""
+    from services.genkit_ai_service import GenkitAIService
+
+    service = GenkitAIService()
+    return {
+        "usage": service.usage.snapshot(window_minutes),
+        "timestamp": str(__import__('datetime').datetime.now())
+    }
+
 if __name__ == "__main__":
     import uvicorn
     
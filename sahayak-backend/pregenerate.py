@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Pre-generate content for predictable topics so that morning classroom bursts
+are served from the response cache.
+
+Topics come from a JSON file of specs (see config/pregeneration-topics.example.json)
+and/or the most requested topics of recent traffic. Results are written to the
+shared SQLite response cache (GOOGLE_AI_CACHE_PATH) that the server reads.
+
+Usage:
+  python pregenerate.py --topics topics.json             # run now, inside PREGEN_WINDOW
+  python pregenerate.py --top 100                        # recent most requested topics
+  python pregenerate.py --topics topics.json --force     # run now, even outside the window
+  python pregenerate.py --topics topics.json --schedule  # every night in PREGEN_WINDOW
+
+A one-off run started outside the off-peak window exits without generating
+anything unless --force is given.
+
+Or from cron at the start of the off-peak window:
+  0 1 * * * cd /path/to/sahayak-backend && python pregenerate.py --topics topics.json --top 100
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from services.structured_logging import configure_logging
+from services.genkit_ai_service import GenkitAIService
+from services.pregeneration import (
+    PregenerationRunner, load_topic_file, next_window, run_nightly, topic_traffic, traffic_specs
+)
+from routers import content, lessons, assessment
+
+ENDPOINTS = {
+    "content": (content.ContentRequest, content.generation_args),
+    "lessons": (lessons.LessonRequest, lessons.generation_args),
+    "assessment": (assessment.TextGenerationRequest, assessment.generation_args)
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm the response cache for popular topics")
+    parser.add_argument("--topics", help="JSON file with a list of topic specs")
+    parser.add_argument("--top", type=int, default=0, help="also warm the N most requested recent topics")
+    parser.add_argument("--days", type=int, default=int(os.getenv("PREGEN_TRAFFIC_DAYS", "14")),
+                        help="traffic look-back for --top")
+    parser.add_argument("--schedule", action="store_true", help="run inside the off-peak window every night")
+    parser.add_argument("--window", default=os.getenv("PREGEN_WINDOW", "01:00-05:00"),
+                        help="off-peak window, HH:MM-HH:MM local time")
+    parser.add_argument("--force", action="store_true",
+                        help="run now even outside the off-peak window, without stopping at its end")
+    args = parser.parse_args()
+
+    if not args.topics and not args.top:
+        parser.error("give --topics and/or --top")
+    if args.force and args.schedule:
+        parser.error("--force runs once now; it cannot be combined with --schedule")
+
+    window_start, window_end = next_window(args.window)
+    if not args.schedule and not args.force and window_start > time.time():
+        sys.exit(f"Outside the off-peak window {args.window} (next start "
+                 f"{datetime.datetime.fromtimestamp(window_start):%Y-%m-%d %H:%M}); use --force to run now")
+
+    configure_logging()
+
+    def load_specs():
+        specs = load_topic_file(args.topics) if args.topics else []
+        traffic = topic_traffic()
+        if args.top and traffic is not None:
+            specs += traffic_specs(traffic, args.days, args.top)
+        return specs
+
+    runner = PregenerationRunner(
+        GenkitAIService(),
+        ENDPOINTS,
+        max_requests=int(os.getenv("PREGEN_MAX_REQUESTS", "500")),
+        max_tokens=int(os.getenv("PREGEN_MAX_TOKENS", "1000000")),
+        concurrency=int(os.getenv("PREGEN_CONCURRENCY", "2"))
+    )
+
+    if args.schedule:
+        asyncio.run(run_nightly(runner, load_specs, args.window))
+    else:
+        # A run started by hand or by cron still stops when the window closes
+        report = asyncio.run(runner.run(load_specs(), until=None if args.force else window_end))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,37 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple, Any
 import logging
 from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError
+from services.prompt_templates import PROMPTS
 from services.speech_service import SpeechService
+from services.pregeneration import record_request
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Define complexity levels
+COMPLEXITY_BY_GRADE = {
+    "1": "very simple sentences with 3-5 words each",
+    "2": "simple sentences with basic vocabulary",
+    "3": "moderate sentences with elementary vocabulary",
+    "4": "compound sentences with intermediate vocabulary",
+    "5": "complex sentences with advanced elementary vocabulary"
+}
+
+DIFFICULTY_LEVELS = {
+    "easy": "simple and repetitive",
+    "medium": "moderately challenging", 
+    "hard": "appropriately challenging"
+}
+
+READING_WORD_LIMITS = {
+    "short": "50-100 words",
+    "medium": "100-150 words", 
+    "long": "150-200 words"
+}
+
 class AssessmentResponse(BaseModel):
     overall_score: float
     fluency_score: float
@@ -27,6 +51,27 @@ class TextGenerationRequest(BaseModel):
 class TextGenerationResponse(BaseModel):
     text: str
 
+def generation_args(request: TextGenerationRequest) -> Tuple[str, Dict[str, Any]]:
+    """Prompt and generate_text options for a request; cache pre-generation uses the same"""
+    complexity = COMPLEXITY_BY_GRADE.get(request.grade_level, "simple sentences")
+    difficulty_level = DIFFICULTY_LEVELS.get(request.difficulty, "moderately challenging")
+    target_length = READING_WORD_LIMITS.get(request.word_limit, "100-150 words")
+    
+    # Create prompt for text generation
+    prompt = PROMPTS.render("assessment.reading_passage", {
+        "difficulty_level": difficulty_level,
+        "grade_level": request.grade_level,
+        "language": request.language,
+        "complexity": complexity,
+        "target_length": target_length
+    })
+    return prompt, {
+        "grade_level": request.grade_level,
+        "language": request.language,
+        "content_type": "reading_passage",
+        "length": request.word_limit
+    }
+
 @router.post("/analyze", response_model=AssessmentResponse)
 async def analyze_reading(
     audio: UploadFile = File(...),
@@ -52,25 +97,15 @@ async def analyze_reading(
         fluency_analysis = await speech_service.analyze_reading_fluency(original_text, transcription)
         
         # Generate detailed feedback using AI
-        analysis_prompt = f"""
-        Analyze this reading assessment for a Grade {grade_level} student:
-        
-        Original Text: {original_text}
-        Student's Reading (transcribed): {transcription}
-        Language: {language}
-        
-        Basic Analysis:
-        - Accuracy: {fluency_analysis['accuracy']}%
-        - Correct Words: {fluency_analysis['correct_words']}/{fluency_analysis['total_words']}
-        
-        Please provide specific, constructive feedback in {language} that:
-        1. Acknowledges what the student did well
-        2. Identifies specific areas for improvement
-        3. Gives practical tips for better reading
-        4. Is encouraging and age-appropriate for grade {grade_level}
-        
-        Keep the feedback concise but helpful (2-3 sentences).
-        """
+        analysis_prompt = PROMPTS.render(
+            "assessment.feedback",
+            {"grade_level": grade_level, "language": language},
+            original_text=original_text,
+            transcription=transcription,
+            accuracy=fluency_analysis['accuracy'],
+            correct_words=fluency_analysis['correct_words'],
+            total_words=fluency_analysis['total_words']
+        )
         
         # Get AI-generated feedback
         feedback = await ai_service.generate_text(
@@ -102,6 +137,9 @@ async def analyze_reading(
             missed_words=missed_words[:5]  # Limit to top 5 missed words
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error in reading assessment: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to assess reading: {str(e)}")
@@ -116,60 +154,17 @@ async def generate_reading_text(request: TextGenerationRequest):
         
         # Initialize Genkit AI service
         ai_service = GenkitAIService()
-        
-        # Define complexity levels
-        complexity_map = {
-            "1": "very simple sentences with 3-5 words each",
-            "2": "simple sentences with basic vocabulary",
-            "3": "moderate sentences with elementary vocabulary",
-            "4": "compound sentences with intermediate vocabulary",
-            "5": "complex sentences with advanced elementary vocabulary"
-        }
-        
-        difficulty_map = {
-            "easy": "simple and repetitive",
-            "medium": "moderately challenging", 
-            "hard": "appropriately challenging"
-        }
-        
-        word_limit_map = {
-            "short": "50-100 words",
-            "medium": "100-150 words", 
-            "long": "150-200 words"
-        }
-        
-        complexity = complexity_map.get(request.grade_level, "simple sentences")
-        difficulty_level = difficulty_map.get(request.difficulty, "moderately challenging")
-        target_length = word_limit_map.get(request.word_limit, "100-150 words")
-        
-        # Create prompt for text generation
-        prompt = f"""
-        Generate a {difficulty_level} reading passage for Grade {request.grade_level} students in {request.language}.
-        
-        Requirements:
-        - Use {complexity}
-        - Length: {target_length}
-        - Educational content (science, nature, friendship, family values)
-        - Include Indian cultural context and familiar scenarios
-        - Make it engaging and age-appropriate
-        - Use proper grammar and punctuation
-        
-        If the language is Hindi or Marathi, write completely in that script.
-        
-        Create a story or informational text that would be interesting for children to read aloud.
-        """
+        record_request("assessment", request)
         
         # Generate text using Genkit AI
-        generated_text = await ai_service.generate_text(
-            prompt,
-            grade_level=request.grade_level,
-            language=request.language,
-            content_type="reading_passage",
-            length=request.word_limit
-        )
+        prompt, options = generation_args(request)
+        generated_text = await ai_service.generate_text(prompt, **options)
         
         return TextGenerationResponse(text=generated_text)
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error generating reading text: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate text: {str(e)}")
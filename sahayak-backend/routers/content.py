@@ -1,13 +1,22 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Tuple, Dict, Any
 import logging
+import os
 from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError, BULK
 from services.speech_service import SpeechService
+from services.sse import sse_generation_events, sse_response
+from services.batch import sse_batch_events
+from services.pregeneration import record_request
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Specs from one batch generated at the same time; quota is still enforced by the AI service
+BATCH_MAX_ITEMS = int(os.getenv("CONTENT_BATCH_MAX_ITEMS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("CONTENT_BATCH_MAX_CONCURRENCY", "8"))
+
 class ContentRequest(BaseModel):
     model_config = {"populate_by_name": True}  # Allow both field names and aliases
     
@@ -21,6 +30,19 @@ class ContentRequest(BaseModel):
 class ContentResponse(BaseModel):
     content: str
 
+class BatchContentRequest(BaseModel):
+    items: List[ContentRequest] = Field(min_length=1, max_length=BATCH_MAX_ITEMS)
+
+def generation_args(request: ContentRequest) -> Tuple[str, Dict[str, Any]]:
+    """Prompt and generate_text options for a request; cache pre-generation uses the same"""
+    return request.topic, {
+        "language": request.language,
+        "content_type": request.content_type,
+        "grade_level": request.grade_level,
+        "length": request.length,
+        "subject": request.subject
+    }
+
 @router.post("/generate", response_model=ContentResponse)
 async def generate_content(request: ContentRequest):
     """
@@ -31,23 +53,58 @@ async def generate_content(request: ContentRequest):
         
         # Initialize Genkit AI service (free with API key!)
         ai_service = GenkitAIService()
+        record_request("content", request)
         
         # Pass the topic directly to the service
-        generated_content = await ai_service.generate_text(
-            request.topic,
-            language=request.language,
-            content_type=request.content_type,
-            grade_level=request.grade_level,
-            length=request.length,
-            subject=request.subject
-        )
+        prompt, options = generation_args(request)
+        generated_content = await ai_service.generate_text(prompt, **options)
         
         return ContentResponse(content=generated_content)
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error generating content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate content: {str(e)}")
 
+@router.post("/generate/stream")
+async def generate_content_stream(request: ContentRequest):
+    """
+    Stream generated content over Server-Sent Events as Gemini produces it.
+    The final `done` event carries the same fields as /generate.
+    """
+    logger.info(f"Streaming content for topic: {request.topic}, grade: {request.grade_level}")
+    
+    ai_service = GenkitAIService()
+    record_request("content", request)
+    prompt, options = generation_args(request)
+    chunks = ai_service.generate_text_stream(prompt, **options)
+    
+    return sse_response(sse_generation_events(
+        chunks,
+        lambda content: ContentResponse(content=content)
+    ))
+
+@router.post("/generate/batch")
+async def generate_content_batch(request: BatchContentRequest):
+    """
+    Generate many content specs in one request. Items run concurrently (bounded)
+    and each result is sent as an SSE `item` event with its index and status as
+    soon as it completes; a final `done` event summarises the batch.
+    """
+    logger.info(f"Generating content batch of {len(request.items)} items")
+    
+    ai_service = GenkitAIService()
+    
+    async def generate(item: ContentRequest) -> str:
+        # Cached and duplicate specs are served by the cache / single-flight in the service;
+        # a failed item is reported as an error instead of placeholder content
+        prompt, options = generation_args(item)
+        return await ai_service.generate_text(prompt, priority=BULK, fallback=False, **options)
+    
+    return sse_response(sse_batch_events(request.items, generate, BATCH_MAX_CONCURRENCY))
+
 @router.post("/generate-audio")
 async def generate_audio_content(
     topic: str,
@@ -83,6 +140,9 @@ async def generate_audio_content(
             "success": True
         }
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error generating audio content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate audio content: {str(e)}")
@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError
+from services.sse import sse_generation_events, sse_response
 import logging
 
 router = APIRouter()
@@ -36,7 +38,8 @@ async def ask_question(request: QuestionRequest):
             language=request.language,
             grade_level=request.complexity, # Assuming complexity maps to grade_level for now
             content_type="answer",
-            length=request.length
+            length=request.length,
+            semantic_cache=True  # Paraphrased questions reuse earlier answers
         )
         
         return AnswerResponse(
@@ -46,10 +49,50 @@ async def ask_question(request: QuestionRequest):
             complexity=request.complexity # Assuming complexity maps to grade_level for now
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error processing question: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process question: {str(e)}")
 
+@router.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """
+    Stream an answer over Server-Sent Events as Gemini produces it.
+    The final `done` event carries the same fields as /ask.
+    """
+    logger.info(f"Streaming answer for question: {request.question[:50]}...")
+    
+    ai_service = GenkitAIService()
+    chunks = ai_service.generate_text_stream(
+        request.question,
+        language=request.language,
+        grade_level=request.complexity,
+        content_type="answer",
+        length=request.length,
+        semantic_cache=True
+    )
+    
+    return sse_response(sse_generation_events(
+        chunks,
+        lambda answer: AnswerResponse(
+            answer=answer,
+            question=request.question,
+            language=request.language,
+            complexity=request.complexity
+        )
+    ))
+
+@router.get("/semantic-cache")
+async def semantic_cache_stats():
+    """Near-duplicate question index: hit ratio, similarity of hits and audit samples"""
+    ai_service = GenkitAIService()
+    return {
+        "enabled": ai_service.semantic_cache_enabled,
+        **ai_service.semantic_cache.stats(include_samples=True)
+    }
+
 @router.get("/health")
 async def knowledge_health():
     """Health check for knowledge base service"""
@@ -1,8 +1,11 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Tuple, Any
 import logging
 from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError
+from services.sse import sse_generation_events, sse_response
+from services.pregeneration import record_request
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -21,6 +24,17 @@ class LessonPlanResponse(BaseModel):
     grade_level: str
     language: str
 
+def generation_args(request: LessonRequest) -> Tuple[str, Dict[str, Any]]:
+    """Prompt and generate_text options for a request; cache pre-generation uses the same"""
+    # Pass the actual topic/theme entered by user, with the subject as an extra parameter
+    return request.topic, {
+        "language": request.language,
+        "content_type": "lesson_plan",
+        "grade_level": request.grade_level,
+        "subject": request.subject,
+        "length": request.length
+    }
+
 @router.post("/generate", response_model=LessonPlanResponse)
 async def generate_lesson_plan(request: LessonRequest):
     """
@@ -31,16 +45,11 @@ async def generate_lesson_plan(request: LessonRequest):
         
         # Initialize Google AI service
         ai_service = GenkitAIService()
+        record_request("lessons", request)
         
         # Generate lesson plan using Google AI with the specific topic and subject
-        lesson_plan = await ai_service.generate_text(
-            request.topic,  # Pass the actual topic/theme entered by user
-            language=request.language,
-            content_type="lesson_plan",
-            grade_level=request.grade_level,
-            subject=request.subject,  # Pass subject as additional parameter
-            length=request.length
-        )
+        prompt, options = generation_args(request)
+        lesson_plan = await ai_service.generate_text(prompt, **options)
         
         return LessonPlanResponse(
             lesson_plan=lesson_plan,
@@ -50,10 +59,37 @@ async def generate_lesson_plan(request: LessonRequest):
             language=request.language
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error generating lesson: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate lesson: {str(e)}")
 
+@router.post("/generate/stream")
+async def generate_lesson_plan_stream(request: LessonRequest):
+    """
+    Stream a lesson plan over Server-Sent Events as Gemini produces it.
+    The final `done` event carries the same fields as /generate.
+    """
+    logger.info(f"Streaming lesson for subject: {request.subject}")
+    
+    ai_service = GenkitAIService()
+    record_request("lessons", request)
+    prompt, options = generation_args(request)
+    chunks = ai_service.generate_text_stream(prompt, **options)
+    
+    return sse_response(sse_generation_events(
+        chunks,
+        lambda lesson_plan: LessonPlanResponse(
+            lesson_plan=lesson_plan,
+            topic=request.topic,
+            subject=request.subject,
+            grade_level=request.grade_level,
+            language=request.language
+        )
+    ))
+
 @router.get("/health")
 async def lessons_health():
     """Health check for lesson planning service"""
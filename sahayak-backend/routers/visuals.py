@@ -10,6 +10,8 @@ import uuid
 import requests
 from dotenv import load_dotenv
 from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError
+from services.prompt_templates import PROMPTS
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +19,22 @@ load_dotenv()
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+STYLE_DESCRIPTIONS = {
+    "illustration": "Create a detailed description for a colorful educational illustration",
+    "diagram": "Create a detailed description for a clear educational diagram with labels",
+    "cartoon": "Create a detailed description for a child-friendly cartoon-style educational visual",
+    "realistic": "Create a detailed description for a realistic educational photograph or illustration"
+}
+
+SUBJECT_CONTEXTS = {
+    "science": "focusing on scientific accuracy and clear explanation of concepts",
+    "mathematics": "emphasizing mathematical concepts, numbers, and geometric relationships",
+    "social_studies": "highlighting cultural, historical, or social elements appropriately",
+    "language": "incorporating text, writing, reading, or language learning elements",
+    "geography": "showing geographical features, maps, or location-based information",
+    "history": "depicting historical accuracy and age-appropriate historical context"
+}
+
 class VisualRequest(BaseModel):
     prompt: str
     style: str
@@ -53,12 +71,7 @@ def try_free_image_generation(prompt: str, style: str, subject: str, description
     try:
         # Get Stability AI API key from environment
         stability_api_key = os.getenv("STABILITY_API_KEY")
-        print(f"🔍 Environment check - Stability AI API Key found: {'Yes' if stability_api_key else 'No'}")
-        if stability_api_key:
-            print(f"🔑 Stability AI API Key starts with: {stability_api_key[:10]}...")
-        
         if not stability_api_key or stability_api_key == "your-stability-ai-api-key-here":
-            print("❌ Stability AI API key not configured, skipping image generation")
             logger.info("Stability AI API key not configured, skipping image generation")
             return None
 
@@ -72,8 +85,10 @@ def try_free_image_generation(prompt: str, style: str, subject: str, description
         digital art, clean composition, educational illustration, safe for children
         """
         
-        print(f"🤖 Trying Stability AI image generation...")
-        print(f"📝 Prompt: {educational_prompt.strip()[:100]}...")
+        logger.debug("Trying Stability AI image generation", extra={
+            "sample": True,
+            "prompt_preview": educational_prompt.strip()[:100]
+        })
         
         # Stability AI API endpoint for text-to-image
         url = "https://api.stability.ai/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
@@ -104,8 +119,7 @@ def try_free_image_generation(prompt: str, style: str, subject: str, description
         }
         
         response = requests.post(url, headers=headers, json=payload, timeout=60)
-        
-        print(f"📊 Response Status: {response.status_code}")
+        logger.info("Stability AI response", extra={"status_code": response.status_code})
         
         if response.status_code == 200:
             data = response.json()
@@ -130,27 +144,28 @@ def try_free_image_generation(prompt: str, style: str, subject: str, description
                         f.write(image_bytes)
                     
                     local_image_url = f"/uploads/visuals/{filename}"
-                    print(f"✅ Generated image via Stability AI: {local_image_url}")
+                    logger.info("Generated image via Stability AI", extra={"image_url": local_image_url})
                     return local_image_url
                 else:
-                    print("⚠️ No base64 image data in response")
+                    logger.warning("No base64 image data in Stability AI response")
                     return None
             else:
-                print("⚠️ No artifacts in Stability AI response")
+                logger.warning("No artifacts in Stability AI response")
                 return None
         elif response.status_code == 401:
-            print("❌ Stability AI API Key authentication failed")
+            logger.error("Stability AI API key authentication failed")
             return None
         elif response.status_code == 402:
-            print("⚠️ Insufficient credits in Stability AI account")
+            logger.warning("Insufficient credits in Stability AI account")
             return None
         else:
-            print(f"⚠️ Stability AI API failed: {response.status_code}")
-            print(f"📄 Response: {response.text[:200]}")
+            logger.warning(f"Stability AI API failed: {response.status_code}", extra={
+                "sample": True,
+                "response_preview": response.text[:200]
+            })
             return None
             
     except Exception as e:
-        print(f"⚠️ Stability AI image generation failed: {str(e)}")
         logger.warning(f"Stability AI image generation failed: {str(e)}")
         return None
 
@@ -242,45 +257,15 @@ def create_fallback_placeholder(prompt: str, style: str, subject: str) -> str:
 def enhance_prompt_for_education(prompt: str, style: str, subject: str) -> str:
     """Enhanced prompt for Google AI to generate detailed visual descriptions"""
     
-    style_descriptions = {
-        "illustration": "Create a detailed description for a colorful educational illustration",
-        "diagram": "Create a detailed description for a clear educational diagram with labels",
-        "cartoon": "Create a detailed description for a child-friendly cartoon-style educational visual",
-        "realistic": "Create a detailed description for a realistic educational photograph or illustration"
-    }
-    
-    subject_contexts = {
-        "science": "focusing on scientific accuracy and clear explanation of concepts",
-        "mathematics": "emphasizing mathematical concepts, numbers, and geometric relationships",
-        "social_studies": "highlighting cultural, historical, or social elements appropriately",
-        "language": "incorporating text, writing, reading, or language learning elements",
-        "geography": "showing geographical features, maps, or location-based information",
-        "history": "depicting historical accuracy and age-appropriate historical context"
-    }
-    
-    style_desc = style_descriptions.get(style, "Create a detailed description for an educational visual")
-    subject_context = subject_contexts.get(subject, "with general educational value")
-    
-    enhanced_prompt = f"""
-    {style_desc} about: {prompt}
+    style_desc = STYLE_DESCRIPTIONS.get(style, "Create a detailed description for an educational visual")
+    subject_context = SUBJECT_CONTEXTS.get(subject, "with general educational value")
     
-    Requirements:
-    - {subject_context}
-    - Suitable for elementary/primary school students
-    - Educationally valuable and engaging
-    - Clear, bright, and visually appealing
-    - Include specific visual elements that would help students understand the concept
-    - Describe colors, layout, and key educational components
-    - Make it appropriate for Indian educational context
-    
-    Style: {style.title()}
-    Subject: {subject.title()}
-    Topic: {prompt}
-    
-    Provide a detailed visual description that an illustrator could use to create the actual image.
-    """
-    
-    return enhanced_prompt
+    return PROMPTS.render("visual.description", {
+        "style_description": style_desc,
+        "subject_context": subject_context,
+        "style_title": style.title(),
+        "subject_title": subject.title()
+    }, topic=prompt)
 
 @router.post("/generate", response_model=VisualResponse)
 async def generate_visual(request: VisualRequest):
@@ -288,13 +273,11 @@ async def generate_visual(request: VisualRequest):
     Generate educational visual aids using Google AI + multiple image strategies
     """
     try:
-        logger.info(f"Generating visual for: {request.prompt[:50]}...")
-        print("=" * 60)
-        print("🎨 NEW EDUCATIONAL VISUAL GENERATION:")
-        print(f"   📝 Prompt: {request.prompt}")
-        print(f"   🎭 Style: {request.style}")
-        print(f"   📚 Subject: {request.subject}")
-        print("=" * 60)
+        logger.info("Visual request", extra={
+            "topic": request.prompt,
+            "style": request.style,
+            "subject": request.subject
+        })
         
         # Initialize Google AI service
         ai_service = GenkitAIService()
@@ -305,9 +288,7 @@ async def generate_visual(request: VisualRequest):
             try:
                 # Enhance the prompt for better educational content
                 enhanced_prompt = enhance_prompt_for_education(request.prompt, request.style, request.subject)
-                print(f"🔄 Enhanced prompt: {enhanced_prompt[:150]}...")
-                
-                print("🤖 Generating visual description with Google Gemini...")
+                logger.debug("Enhanced visual prompt", extra={"sample": True, "prompt_preview": enhanced_prompt[:150]})
                 
                 # Use Google AI to generate detailed visual description
                 visual_description = await ai_service.generate_text(
@@ -319,23 +300,25 @@ async def generate_visual(request: VisualRequest):
                     subject=request.subject
                 )
                 
-                print("✅ Visual description generated successfully!")
-                print(f"📝 Description: {visual_description[:150]}...")
+                logger.debug("Visual description", extra={
+                    "sample": True,
+                    "response_preview": visual_description[:150]
+                })
                 
+            except QuotaExceededError:
+                raise
+            
             except Exception as e:
-                print(f"⚠️ Google AI description failed: {str(e)}")
+                logger.warning(f"Google AI description failed: {str(e)}")
                 visual_description = f"Educational visual about {request.prompt} in {request.style} style for {request.subject}"
         
         # Generate actual visual using multiple strategies
-        print("🖼️ Creating educational visual...")
         image_url = create_educational_visual(request.prompt, request.style, request.subject, visual_description)
         
         # Enhanced prompt for response
         enhanced_response_prompt = f"Google AI Enhanced: {visual_description[:100]}..." if visual_description else request.prompt
         
-        print("✅ Educational visual created successfully!")
-        print(f"🔗 URL: {image_url}")
-        print("=" * 60)
+        logger.info("Educational visual created", extra={"image_url": image_url})
         
         return VisualResponse(
             imageUrl=image_url,
@@ -344,8 +327,10 @@ async def generate_visual(request: VisualRequest):
             subject=request.subject
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
-        print(f"❌ General error: {str(e)}")
         logger.error(f"Visual generation error: {str(e)}")
         
         # Create fallback
@@ -368,7 +353,7 @@ async def generate_image(prompt: str = Query(..., description="Image generation
     Simple image generation endpoint for educational content
     """
     try:
-        print(f"🎨 Simple image generation request: {prompt}")
+        logger.info("Simple image request", extra={"topic": prompt})
         
         # Initialize Google AI service
         ai_service = GenkitAIService()
@@ -376,15 +361,7 @@ async def generate_image(prompt: str = Query(..., description="Image generation
         description = ""
         if ai_service.genkit_available:
             # Generate educational image description
-            educational_prompt = f"""
-            Create a detailed description for an educational visual about: {prompt}
-            
-            Make it:
-            - Suitable for school children
-            - Educationally valuable
-            - Clear and engaging
-            - Appropriate for classroom use
-            """
+            educational_prompt = PROMPTS.render("visual.simple", topic=prompt)
             
             description = await ai_service.generate_text(
                 educational_prompt,
@@ -404,6 +381,9 @@ async def generate_image(prompt: str = Query(..., description="Image generation
             "service": "Google AI + Educational Visual Generator"
         })
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Simple image generation error: {str(e)}")
         return JSONResponse({
@@ -474,7 +454,7 @@ async def test_stability():
         if not stability_key or stability_key == "your-stability-ai-api-key-here":
             return {"status": "error", "error": "Stability AI API key not configured"}
         
-        print("🧪 Testing Stability AI image generation...")
+        logger.info("Testing Stability AI image generation")
         
         # Test with a simple educational prompt
         test_image_url = try_free_image_generation(
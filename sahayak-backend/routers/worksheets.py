@@ -1,33 +1,316 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, ValidationError
+from typing import Awaitable, Callable, List, Dict, Literal, Optional
+import os
+import asyncio
 import logging
 import base64
 import time
-from services.genkit_ai_service import GenkitAIService
+from services.genkit_ai_service import GRADE_INSTRUCTIONS, MULTI_GRADE, WORD_LIMITS, GenkitAIService
+from services.rate_limiter import QuotaExceededError, BULK
+from services.prompt_templates import PROMPTS
+from services.batch import run_bounded
+from services.worksheet_sets import MIN_QUESTIONS, parse_worksheet_set
+from services.image_ingestion import ImageIngestionError, PreparedImage, image_ingestor
+from services.page_analysis import PageAnalysis, page_analyzer
+from services.uploads import StreamedForm, UploadError, UploadTooLargeError, read_streamed_form
+from services.fallback_cascade import FallbackCascade
+from services.resilience import Deadline
+from services.question_bank import (
+    DEFAULT_BLUEPRINT, BankedQuestion, parse_blueprint, parse_question_list, parse_worksheet_questions,
+    question_bank, render_questions
+)
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Grades of one request generated at once; every call still waits for the
+# shared Gemini rate limiter in the bulk lane
+WORKSHEET_MAX_CONCURRENCY = int(os.getenv("WORKSHEET_MAX_CONCURRENCY", "5"))
+
+# "combined" asks for every grade's worksheet in one structured (JSON) call;
+# grades that fail validation are then generated one by one. "bank" assembles
+# worksheets from the question bank and only asks Gemini for missing types
+WORKSHEET_MODE = os.getenv("WORKSHEET_MODE", "per_grade")
+WORKSHEET_COMBINED_MAX_OUTPUT_TOKENS = int(os.getenv("WORKSHEET_COMBINED_MAX_OUTPUT_TOKENS", "8192"))
+
+# Analyse a textbook page once (cached by perceptual hash) and build every
+# grade's prompt from the analysis instead of sending the image again
+WORKSHEET_PAGE_ANALYSIS_ENABLED = os.getenv("WORKSHEET_PAGE_ANALYSIS_ENABLED", "true").lower() == "true"
+
+# Time budget of one worksheet request, shared by all of its grades. Each AI
+# tier of the fallback cascade (vision -> short worksheet -> static template)
+# starts only with at least TIER_MIN_SECONDS left and is capped by the time
+# remaining; the static template needs no provider call, so a request returns
+# within WORKSHEET_DEADLINE_SECONDS plus well under a millisecond per grade.
+# That bounds each request's latency, not capacity: abandoned provider calls
+# hold bulk-pool threads until the SDK returns
+WORKSHEET_DEADLINE_SECONDS = float(os.getenv("WORKSHEET_DEADLINE_SECONDS", "60"))
+WORKSHEET_TIER_MIN_SECONDS = float(os.getenv("WORKSHEET_TIER_MIN_SECONDS", "8"))
+
+WORKSHEET_CASCADE = FallbackCascade()
+
+# Questions per type of a worksheet assembled from the question bank
+WORKSHEET_BANK_BLUEPRINT = parse_blueprint(os.getenv("WORKSHEET_BANK_BLUEPRINT", "")) or DEFAULT_BLUEPRINT
+
+# Multipart image uploads are streamed: kept in memory up to SPOOL_BYTES, then
+# spooled to a temporary file, and rejected with 413 past MAX_BYTES
+WORKSHEET_UPLOAD_MAX_BYTES = int(os.getenv("WORKSHEET_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+WORKSHEET_UPLOAD_SPOOL_BYTES = int(os.getenv("WORKSHEET_UPLOAD_SPOOL_BYTES", str(1024 * 1024)))
+
+# Request body of the form endpoints, for the OpenAPI docs. Multipart uploads
+# are streamed; urlencoded forms (image as a base64 field, decoded on read) are
+# still accepted
+def worksheet_form_schema(image: Dict[str, str]) -> Dict[str, object]:
+    return {
+        "schema": {
+            "type": "object",
+            "required": ["image", "grades", "subject"],
+            "properties": {
+                "image": image,
+                "grades": {"type": "array", "items": {"type": "string"}},
+                "subject": {"type": "string"},
+                "topic": {"type": "string"},
+                "mode": {"type": "string", "enum": ["per_grade", "combined", "bank"]}
+            }
+        }
+    }
+
+WORKSHEET_FORM_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": worksheet_form_schema({"type": "string", "format": "binary"}),
+            "application/x-www-form-urlencoded": worksheet_form_schema({"type": "string", "format": "byte"})
+        }
+    }
+}
+
 class WorksheetRequest(BaseModel):
     image: str
     grades: List[str]  # target grades
     subject: str  # subject
+    mode: Literal["per_grade", "combined", "bank"] = WORKSHEET_MODE
+    topic: Optional[str] = None  # question bank topic; defaults to the page title
 
 class WorksheetResponse(BaseModel):
     worksheets: Dict[str, str]
     success: bool
     message: str
 
-@router.post("/generate", response_model=WorksheetResponse)
-async def generate_worksheets(
-    image: str = Form(...),
-    grades: List[str] = Form(...),  # target grades
-    subject: str = Form(...)  # subject
-):
+async def generate_per_grade(grades: List[str], generate: Callable[[str], Awaitable[str]]) -> Dict[str, str]:
+    """
+    Run `generate` for every distinct grade concurrently (bounded) and return
+    the worksheets in request order. The first error cancels the remaining
+    grades and is raised; per-grade fallbacks belong inside `generate`.
+    """
+    grades = list(dict.fromkeys(grades))
+    worksheets = {}
+    results = run_bounded(grades, generate, WORKSHEET_MAX_CONCURRENCY)
+    try:
+        async for index, content, error, _ in results:
+            if error is not None:
+                raise error
+            worksheets[grades[index]] = content
+    finally:
+        await results.aclose()
+    return {grade: worksheets[grade] for grade in grades}
+
+def grade_guidance(grades: List[str], length: str) -> str:
+    """Language rules and word limit for each grade of a multi-grade response"""
+    word_count = WORD_LIMITS.get(length, WORD_LIMITS["medium"])
+    return "\n".join(
+        f"- Grade {grade}: {GRADE_INSTRUCTIONS.get(grade, GRADE_INSTRUCTIONS['3'])} "
+        f"Word limit: {word_count['min']}-{word_count['max']} words."
+        for grade in grades
+    )
+
+async def generate_combined_worksheets(ai_service: GenkitAIService, grades: List[str], subject: str,
+                                      image: Optional[PreparedImage] = None,
+                                      analysis: Optional[PageAnalysis] = None,
+                                      deadline_seconds: Optional[float] = None) -> Dict[str, str]:
+    """
+    Differentiated worksheets for all grades from one structured-output call,
+    based on the page image or on its analysis. Returns only the grades whose
+    worksheet passed validation.
+    """
+    instructions = PROMPTS.render("worksheet.multi_grade", {
+        "grades": ", ".join(grades), "subject": subject, "grade_guidance": grade_guidance(grades, "long")
+    })
+    if analysis is not None:
+        instructions += f"\n\nTEXTBOOK PAGE:\n{analysis.render()}"
+    per_grade_tokens = ai_service.output_budget.max_output_tokens("long", "en", "worksheet")
+    
+    response = await ai_service.generate_text(
+        f"Grades {', '.join(grades)} {subject} worksheets",
+        instructions=instructions,
+        language="en",
+        content_type="worksheet_set",
+        grade_level=MULTI_GRADE,
+        length="long",
+        subject=subject,
+        priority=BULK,
+        image=image,
+        max_output_tokens=min(WORKSHEET_COMBINED_MAX_OUTPUT_TOKENS, per_grade_tokens * len(grades)),
+        response_mime_type="application/json",
+        deadline_seconds=deadline_seconds,
+        fallback=False,
+        # A set with any invalid or truncated grade is not cached, so a retry calls Gemini again
+        validate=lambda text: not parse_worksheet_set(text, grades)[1]
+    )
+    
+    valid, invalid = parse_worksheet_set(response, grades)
+    logger.info("Combined worksheet call", extra={
+        "grades_valid": list(valid),
+        "grades_invalid": invalid
+    })
+    return {grade: worksheet.render() for grade, worksheet in valid.items()}
+
+def format_vision_worksheet(grade: str, subject: str, content: str) -> str:
+    return f"""
+WORKSHEET - GRADE {grade} | SUBJECT: {subject.upper()}
+{'=' * 60}
+
+{content}
+
+{'=' * 60}
+Generated using Google AI (Gemini) - Educational Content
+"""
+
+def static_worksheet(grade: str, subject: str, analysis: Optional[PageAnalysis] = None) -> str:
+    """
+    Last tier of the fallback cascade: a worksheet from a fixed template, with
+    questions taken from the page analysis when there is one. No provider call.
+    """
+    if analysis is not None:
+        questions = [
+            f"Write the meaning of '{term.split(':')[0].strip()}' in your own words." for term in analysis.vocabulary[:3]
+        ]
+        questions += [f"Explain in two or three sentences: {concept}" for concept in analysis.concepts[:3]]
+        questions += analysis.exercises[:2]
+        questions += [f"Draw and label: {diagram}" for diagram in analysis.diagrams[:1]]
+        questions.append("Write two questions you still have about this page.")
+        title = analysis.title or subject
+    else:
+        questions = [
+            f"What is the main topic we are studying in {subject}?",
+            "Name three important concepts related to this topic.",
+            "Explain one thing you learned today.",
+            "Draw a simple diagram if applicable.",
+            "Write two questions you still have about this topic."
+        ]
+        title = "Basic Educational Worksheet"
+    numbered = "\n".join(f"{index}. {question}" for index, question in enumerate(questions, 1))
+    return f"""
+Grade {grade} Worksheet - {subject}
+{'='*40}
+
+{title}
+
+{numbered}
+
+Instructions: Answer all questions to the best of your ability.
+
+Note: This worksheet was prepared from a standard template. Please consult your teacher for additional materials.
+"""
+
+def bank_topic(request: WorksheetRequest, analysis: Optional[PageAnalysis]) -> Optional[str]:
+    """Topic the request's questions are banked under: the teacher's topic, else the page title"""
+    if request.topic and request.topic.strip():
+        return request.topic.strip()
+    if analysis is not None:
+        return analysis.title or analysis.concepts[0]
+    return None
+
+async def bank_questions(subject: str, grade: str, topic: Optional[str], content: str, source: str):
+    """Add the questions of a generated worksheet to the question bank; never fails the request"""
+    bank = question_bank()
+    if bank is None or topic is None:
+        return
+    try:
+        questions = parse_worksheet_questions(content)
+        if questions:
+            await bank.add(subject, grade, topic, questions, source)
+    except Exception as e:
+        logger.warning(f"Could not bank worksheet questions: {str(e)}")
+
+async def top_up_questions(ai_service: GenkitAIService, grade: str, subject: str, topic: str,
+                           analysis: Optional[PageAnalysis], existing: List[BankedQuestion],
+                           shortfall: Dict[str, int],
+                           deadline_seconds: Optional[float] = None) -> Optional[List[BankedQuestion]]:
+    """New questions of the missing types, from one structured-output call; None when there are none"""
+    instructions = PROMPTS.render(
+        "worksheet.bank_top_up", {"grade": grade, "subject": subject},
+        page=analysis.render() if analysis is not None else f"Topic: {topic}",
+        needed="\n".join(f"- {count} {question_type}" for question_type, count in shortfall.items()),
+        existing="\n".join(f"- {question.question.splitlines()[0]}" for question in existing) or "(none)"
+    )
+    
+    response = await ai_service.generate_text(
+        f"Grade {grade} {subject} questions: {topic}",
+        instructions=instructions,
+        language="en",
+        content_type="question_set",
+        grade_level=grade,
+        length="medium",
+        subject=subject,
+        priority=BULK,
+        response_mime_type="application/json",
+        deadline_seconds=deadline_seconds,
+        fallback=False
+    )
+    return parse_question_list(response) or None
+
+def worksheet_topic(grade: str, subject: str) -> str:
+    """Per-request part of a worksheet prompt; the template text is the system instruction"""
+    return f"Grade {grade} {subject} worksheet"
+
+async def read_worksheet_form(http_request: Request) -> StreamedForm:
+    """
+    Worksheet form: multipart is streamed, so the image part never sits in
+    memory whole; urlencoded posts from older clients are read whole
+    """
+    try:
+        return await read_streamed_form(
+            http_request,
+            file_fields=("image",),
+            max_file_bytes=WORKSHEET_UPLOAD_MAX_BYTES,
+            spool_bytes=WORKSHEET_UPLOAD_SPOOL_BYTES
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"Upload too large: {str(e)}")
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid upload: {str(e)}")
+
+def worksheet_form_request(form: StreamedForm) -> WorksheetRequest:
+    """Grades (repeated or comma-separated), subject and mode of a worksheet form"""
+    grades = [grade.strip() for value in form.getlist("grades") for grade in value.split(",") if grade.strip()]
+    fields = {"image": "", "grades": grades, "subject": form.get("subject"), "topic": form.get("topic")}
+    if form.get("mode"):
+        fields["mode"] = form.get("mode")
+    try:
+        request = WorksheetRequest.model_validate(fields)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    if not request.grades:
+        raise HTTPException(status_code=422, detail="grades: at least one grade is required")
+    return request
+
+@router.post("/generate", response_model=WorksheetResponse, openapi_extra=WORKSHEET_FORM_OPENAPI)
+async def generate_worksheets(http_request: Request):
     """
     Generate differentiated worksheets from textbook page image using Google AI
     """
+    form = await read_worksheet_form(http_request)
+    # Standard worksheets do not look at the page, so the spooled image is dropped
+    form.close()
+    if "image" not in form.files:
+        raise HTTPException(status_code=422, detail="image: a textbook page image is required")
+    request = worksheet_form_request(form)
+    grades, subject = request.grades, request.subject
+    
+    deadline = Deadline(WORKSHEET_DEADLINE_SECONDS)
+    
     try:
         logger.info(f"Generating worksheets for grades: {grades}, subject: {subject}")
         
@@ -35,45 +318,34 @@ async def generate_worksheets(
         ai_service = GenkitAIService()
         
         if not ai_service.genkit_available:
-            print("⚠️ Google AI not available, generating text-based worksheets")
-            
-        worksheets = {}
-        
-        for grade in grades:
-            # Create grade-specific prompt
-            prompt = f"""
-            Create a comprehensive worksheet for grade {grade} students in {subject}.
-            
-            Requirements:
-            - Adapt the difficulty level appropriately for grade {grade}
-            - Include 6-10 varied questions/exercises
-            - Mix different question types: fill-in-the-blank, short answer, match the following, multiple choice
-            - Make it suitable for Indian curriculum standards
-            - Include clear instructions for students
-            - Add educational value and learning objectives
-            - Structure it as a complete, ready-to-use worksheet
+            logger.warning("Google AI not available, generating text-based worksheets")
             
-            Grade Level: {grade}
-            Subject: {subject}
-            
-            Format the output as a well-structured worksheet with:
-            1. Header with grade and subject
-            2. Clear instructions
-            3. Varied question types
-            4. Appropriate difficulty level
-            5. Educational objectives
-            """
+        async def standard_worksheet(grade: str) -> str:
+            async def generate(timeout: float) -> str:
+                # Grade-specific instructions go in the system instruction
+                instructions = PROMPTS.render("worksheet.standard", {"grade": grade, "subject": subject})
+                
+                # Generate worksheet using Google AI
+                return await ai_service.generate_text(
+                    worksheet_topic(grade, subject),
+                    instructions=instructions,
+                    language="en",
+                    content_type="worksheet",
+                    grade_level=grade,
+                    length="long",  # More comprehensive worksheets
+                    subject=subject,
+                    priority=BULK,
+                    deadline_seconds=timeout,
+                    fallback=False
+                )
             
-            # Generate worksheet using Google AI
-            worksheet_content = await ai_service.generate_text(
-                prompt,
-                language="en",
-                content_type="worksheet",
-                grade_level=grade,
-                length="long",  # More comprehensive worksheets
-                subject=subject
+            return await WORKSHEET_CASCADE.run(
+                [("standard", WORKSHEET_TIER_MIN_SECONDS, generate)],
+                lambda: static_worksheet(grade, subject),
+                deadline
             )
-            worksheets[grade] = worksheet_content
+        
+        worksheets = await generate_per_grade(grades, standard_worksheet)
         
         return WorksheetResponse(
             worksheets=worksheets,
@@ -81,6 +353,9 @@ async def generate_worksheets(
             message=f"Successfully generated worksheets for grades {', '.join(grades)} using Google AI"
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         logger.error(f"Error generating worksheets: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to generate worksheets: {str(e)}")
@@ -88,115 +363,183 @@ async def generate_worksheets(
 @router.post("/generate-with-vision", response_model=WorksheetResponse)
 async def generate_worksheets_with_vision(request: WorksheetRequest):
     """
-    Generate differentiated worksheets using Google AI multimodal capabilities (enhanced image analysis)
+    Generate differentiated worksheets using Google AI multimodal capabilities (enhanced image analysis).
+    Takes the image as base64 in JSON; /generate-with-vision/upload streams it instead.
+    """
+    async def prepare_image() -> Optional[PreparedImage]:
+        return await image_ingestor().prepare_base64(request.image) if request.image else None
+    
+    return await vision_worksheets(request, prepare_image, Deadline(WORKSHEET_DEADLINE_SECONDS))
+
+@router.post("/generate-with-vision/upload", response_model=WorksheetResponse,
+             openapi_extra=WORKSHEET_FORM_OPENAPI)
+async def upload_worksheets_with_vision(http_request: Request):
+    """
+    Vision worksheets from a multipart upload. The page photo is streamed to a
+    spooled file (hashed as it arrives, capped at WORKSHEET_UPLOAD_MAX_BYTES)
+    and decoded from there, so memory stays flat whatever the photo size.
     """
+    # The upload counts against the request's time budget
+    deadline = Deadline(WORKSHEET_DEADLINE_SECONDS)
+    form = await read_worksheet_form(http_request)
     try:
-        logger.info(f"🔍 Generating Google AI vision-based worksheets for grades: {request.grades}, subject: {request.subject}")
-        
-        print("=" * 60)
-        print("📚 NEW GOOGLE AI WORKSHEET GENERATION:")
-        print(f"   📊 Grades: {', '.join(request.grades)}")
-        print(f"   📖 Subject: {request.subject}")
-        print(f"   🖼️ Image Analysis: Google AI Multimodal")
-        print("=" * 60)
+        request = worksheet_form_request(form)
+        upload = form.files.get("image")
+        if upload is None or upload.size == 0:
+            raise HTTPException(status_code=422, detail="image: a textbook page image is required")
+        return await vision_worksheets(request, lambda: image_ingestor().prepare_upload(upload), deadline)
+    finally:
+        form.close()
+
+async def vision_worksheets(request: WorksheetRequest,
+                            prepare_image: Callable[[], Awaitable[Optional[PreparedImage]]],
+                            deadline: Deadline) -> WorksheetResponse:
+    """
+    Vision worksheet pipeline shared by the JSON and the multipart endpoints.
+    Every grade goes through the fallback cascade against `deadline`.
+    """
+    analysis = None
+    try:
+        logger.info("Vision worksheet request", extra={"grades": request.grades, "subject": request.subject})
         
         # Initialize Google AI service
         ai_service = GenkitAIService()
         
         if not ai_service.genkit_available:
-            print("⚠️ Google AI not available, falling back to text-based generation")
-            return await generate_text_based_worksheets(request)
+            logger.warning("Google AI not available, falling back to text-based generation")
+            return await generate_text_based_worksheets(request, deadline)
         
-        worksheets = {}
+        # Decoded and downscaled once; every grade sends the same prepared image
+        image = await prepare_image()
+        
+        # One structured analysis of the page serves every grade, and later
+        # uploads of the same page (any teacher, any grade) reuse it
+        if image is not None and WORKSHEET_PAGE_ANALYSIS_ENABLED:
+            analysis = await WORKSHEET_CASCADE.attempt(
+                "page_analysis", WORKSHEET_TIER_MIN_SECONDS,
+                lambda timeout: page_analyzer().analyze(ai_service, image, deadline_seconds=timeout),
+                deadline,
+                reserve_seconds=WORKSHEET_TIER_MIN_SECONDS
+            )
         
-        for grade in request.grades:
-            print(f"📝 Generating Grade {grade} worksheet with Google AI...")
+        # Generated questions are banked under (subject, grade, topic)
+        topic = bank_topic(request, analysis)
+        bank = question_bank()
+        
+        async def vision_worksheet(grade: str) -> str:
+            generated = []
             
-            try:
-                # Create enhanced prompt for image-based worksheet generation
-                enhanced_prompt = f"""
-                You are an expert Indian educator creating worksheets. Analyze the provided textbook page image carefully and create a comprehensive worksheet for Grade {grade} students in {request.subject}.
-
-                Please examine the image and identify:
-                1. Main concepts, topics, and learning objectives
-                2. Text content, examples, and explanations
-                3. Diagrams, illustrations, or visual elements
-                4. Any exercises or activities shown
-                5. Key vocabulary and terms
-
-                Based on your analysis, create a Grade {grade} worksheet that includes:
-
-                WORKSHEET STRUCTURE:
-                - Clear header with grade and subject
-                - Learning objectives based on image content
-                - 8-12 varied questions directly related to the image content
-                - Multiple question types: fill-in-the-blank, short answer, match the following, true/false, multiple choice
-                - Questions that test comprehension, application, and analysis
-                - Difficulty appropriate for Grade {grade} Indian curriculum
-                - Clear instructions for each section
-
-                QUESTION TYPES TO INCLUDE:
-                1. Vocabulary questions (key terms from the image)
-                2. Comprehension questions (understanding main concepts)
-                3. Application questions (using the knowledge)
-                4. Analysis questions (comparing, contrasting, explaining)
-                5. Visual interpretation (if diagrams are present)
-
-                REQUIREMENTS:
-                - Align with Indian curriculum standards for Grade {grade}
-                - Use age-appropriate language
-                - Include both recall and higher-order thinking questions
-                - Make it engaging and educational
-                - Ensure questions directly relate to image content
-                - Add bonus questions for advanced learners
-
-                Subject: {request.subject}
-                Grade Level: {grade}
-                
-                Create a complete, ready-to-print worksheet.
-                """
-                
-                # Use Google AI multimodal capabilities
-                # Note: If Google AI vision API is available, you would process the image here
-                # For now, we'll generate enhanced text-based worksheets with image context awareness
+            async def generate(timeout: float) -> str:
+                if analysis is not None:
+                    # Text-only prompt built from the page analysis
+                    instructions = PROMPTS.render(
+                        "worksheet.from_analysis", {"grade": grade, "subject": request.subject},
+                        page=analysis.render()
+                    )
+                else:
+                    # Create enhanced instructions for image-based worksheet generation
+                    instructions = PROMPTS.render(
+                        "worksheet.vision", {"grade": grade, "subject": request.subject}
+                    )
                 
+                # Use Google AI multimodal capabilities when there is no analysis: the textbook page goes with the prompt
                 worksheet_content = await ai_service.generate_text(
-                    enhanced_prompt,
+                    worksheet_topic(grade, request.subject),
+                    instructions=instructions,
                     language="en",
                     content_type="worksheet", 
                     grade_level=grade,
                     length="long",
-                    subject=request.subject
+                    subject=request.subject,
+                    priority=BULK,
+                    image=None if analysis is not None else image,
+                    deadline_seconds=timeout,
+                    fallback=False
                 )
                 
-                # Format the worksheet with proper header
-                formatted_worksheet = f"""
-WORKSHEET - GRADE {grade} | SUBJECT: {request.subject.upper()}
-{'=' * 60}
-
-{worksheet_content}
-
-{'=' * 60}
-Generated using Google AI (Gemini) - Educational Content
-"""
+                # Banked after the cascade, so the harvest never eats into the tier's timeout
+                generated.append(worksheet_content)
                 
-                worksheets[grade] = formatted_worksheet
-                print(f"✅ Generated Google AI worksheet for Grade {grade} ({len(formatted_worksheet)} characters)")
-                
-            except Exception as e:
-                print(f"❌ Error for Grade {grade}: {str(e)}")
-                print(f"🔄 Falling back to text-based generation for Grade {grade}...")
+                # Format the worksheet with proper header
+                formatted_worksheet = format_vision_worksheet(grade, request.subject, worksheet_content)
                 
-                # Fallback to text-based generation
-                fallback_worksheet = await generate_fallback_worksheet(grade, request.subject)
-                worksheets[grade] = fallback_worksheet
-                print(f"✅ Generated fallback worksheet for Grade {grade}")
+                logger.info("Generated worksheet", extra={"grade": grade, "response_chars": len(formatted_worksheet)})
+                return formatted_worksheet
+            
+            # A failing grade falls back on its own, as far as the deadline allows
+            worksheet = await WORKSHEET_CASCADE.run(
+                [
+                    ("vision", WORKSHEET_TIER_MIN_SECONDS, generate),
+                    ("short", WORKSHEET_TIER_MIN_SECONDS,
+                     lambda timeout: generate_fallback_worksheet(grade, request.subject, timeout))
+                ],
+                lambda: static_worksheet(grade, request.subject, analysis),
+                deadline
+            )
+            for content in generated:
+                await bank_questions(request.subject, grade, topic, content, "per_grade")
+            return worksheet
         
-        print("=" * 60)
-        print("🎉 WORKSHEET GENERATION COMPLETE")
-        print(f"✅ Successfully generated {len(worksheets)} worksheets")
-        print(f"📊 Grades completed: {', '.join(worksheets.keys())}")
-        print("=" * 60)
+        async def bank_worksheet(grade: str) -> Optional[str]:
+            # Least-served banked questions first, read before any tier starts; only
+            # the Gemini call for the missing types is timed by the cascade
+            questions, shortfall = await bank.assemble(request.subject, grade, topic, WORKSHEET_BANK_BLUEPRINT)
+            topped_up = 0
+            if shortfall:
+                generated = await WORKSHEET_CASCADE.attempt(
+                    "bank_top_up", WORKSHEET_TIER_MIN_SECONDS,
+                    lambda timeout: top_up_questions(
+                        ai_service, grade, request.subject, topic, analysis, questions, shortfall, timeout
+                    ),
+                    deadline,
+                    reserve_seconds=WORKSHEET_TIER_MIN_SECONDS
+                ) or []
+                added = await bank.add(request.subject, grade, topic, generated, "top_up")
+                for question_type, missing in shortfall.items():
+                    new = [question for question in added if question.type == question_type][:missing]
+                    questions.extend(new)
+                    topped_up += len(new)
+            
+            logger.info("Assembled worksheet from question bank", extra={
+                "grade": grade,
+                "banked_questions": len(questions) - topped_up,
+                "topped_up_questions": topped_up
+            })
+            if len(questions) < MIN_QUESTIONS:
+                # Too few for a worksheet; the grade is generated in full
+                return None
+            await bank.mark_served(request.subject, grade, topic, questions)
+            content = render_questions(grade, f"Grade {grade} {request.subject} Worksheet: {topic}", questions)
+            return format_vision_worksheet(grade, request.subject, content)
+        
+        grades = list(dict.fromkeys(request.grades))
+        worksheets = {}
+        if request.mode == "bank" and bank is not None and topic is not None:
+            banked = await generate_per_grade(grades, bank_worksheet)
+            worksheets = {grade: content for grade, content in banked.items() if content is not None}
+        elif request.mode == "combined" and len(grades) > 1:
+            combined = await WORKSHEET_CASCADE.attempt(
+                "combined", WORKSHEET_TIER_MIN_SECONDS,
+                lambda timeout: generate_combined_worksheets(
+                    ai_service, grades, request.subject, None if analysis is not None else image, analysis,
+                    deadline_seconds=timeout
+                ),
+                deadline,
+                reserve_seconds=WORKSHEET_TIER_MIN_SECONDS
+            ) or {}
+            for grade, content in combined.items():
+                await bank_questions(request.subject, grade, topic, content, "combined")
+            worksheets = {
+                grade: format_vision_worksheet(grade, request.subject, content) for grade, content in combined.items()
+            }
+        
+        # Grades run concurrently
+        missing = [grade for grade in grades if grade not in worksheets]
+        if missing:
+            worksheets.update(await generate_per_grade(missing, vision_worksheet))
+        worksheets = {grade: worksheets[grade] for grade in grades}
+        
+        logger.info("Worksheet generation complete", extra={"grades_completed": list(worksheets.keys())})
         
         return WorksheetResponse(
             worksheets=worksheets,
@@ -204,55 +547,61 @@ Generated using Google AI (Gemini) - Educational Content
             message=f"Successfully generated Google AI vision-enhanced worksheets for grades {', '.join(request.grades)}"
         )
         
+    except QuotaExceededError:
+        raise
+    
+    except ImageIngestionError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid textbook page image: {str(e)}")
+    
     except Exception as e:
         logger.error(f"Error generating vision-based worksheets: {str(e)}")
-        print(f"❌ Critical error: {str(e)}")
         
-        # Last resort fallback
-        try:
-            fallback_worksheets = {}
-            for grade in request.grades:
-                fallback_worksheets[grade] = await generate_fallback_worksheet(grade, request.subject)
-            
-            return WorksheetResponse(
-                worksheets=fallback_worksheets,
-                success=True,
-                message=f"Generated fallback worksheets for grades {', '.join(request.grades)}"
-            )
-        except:
-            raise HTTPException(status_code=500, detail=f"Failed to generate worksheets: {str(e)}")
+        # Last resort: static templates, without further provider calls. The
+        # request is reported as failed and counted, not passed off as generated
+        fallback_worksheets = {
+            grade: static_worksheet(grade, request.subject, analysis) for grade in dict.fromkeys(request.grades)
+        }
+        WORKSHEET_CASCADE.record("pipeline", "failed")
+        WORKSHEET_CASCADE.record("static", "served", len(fallback_worksheets))
+        
+        return WorksheetResponse(
+            worksheets=fallback_worksheets,
+            success=False,
+            message=f"Worksheet generation failed; returned standard template worksheets for grades "
+                    f"{', '.join(request.grades)}"
+        )
 
-async def generate_text_based_worksheets(request: WorksheetRequest) -> WorksheetResponse:
+async def generate_text_based_worksheets(request: WorksheetRequest, deadline: Deadline) -> WorksheetResponse:
     """Generate text-based worksheets when vision processing is unavailable"""
     try:
         ai_service = GenkitAIService()
-        worksheets = {}
         
-        for grade in request.grades:
-            prompt = f"""
-            Create a comprehensive educational worksheet for Grade {grade} students in {request.subject}.
-            
-            Make it engaging and appropriate for Indian curriculum standards with:
-            - 8-10 varied questions
-            - Multiple question types (fill-in-the-blank, short answer, true/false, multiple choice)
-            - Clear instructions
-            - Educational value
-            - Grade-appropriate difficulty
-            
-            Grade: {grade}
-            Subject: {request.subject}
-            """
+        async def text_worksheet(grade: str) -> str:
+            async def generate(timeout: float) -> str:
+                instructions = PROMPTS.render("worksheet.text", {"grade": grade, "subject": request.subject})
+                
+                content = await ai_service.generate_text(
+                    worksheet_topic(grade, request.subject),
+                    instructions=instructions,
+                    language="en",
+                    content_type="worksheet",
+                    grade_level=grade,
+                    length="medium",
+                    subject=request.subject,
+                    priority=BULK,
+                    deadline_seconds=timeout,
+                    fallback=False
+                )
+                
+                return f"Grade {grade} Worksheet - {request.subject}\n{'='*50}\n\n{content}"
             
-            content = await ai_service.generate_text(
-                prompt,
-                language="en",
-                content_type="worksheet",
-                grade_level=grade,
-                length="medium",
-                subject=request.subject
+            return await WORKSHEET_CASCADE.run(
+                [("text", WORKSHEET_TIER_MIN_SECONDS, generate)],
+                lambda: static_worksheet(grade, request.subject),
+                deadline
             )
-            
-            worksheets[grade] = f"Grade {grade} Worksheet - {request.subject}\n{'='*50}\n\n{content}"
+        
+        worksheets = await generate_per_grade(request.grades, text_worksheet)
         
         return WorksheetResponse(
             worksheets=worksheets,
@@ -260,48 +609,32 @@ async def generate_text_based_worksheets(request: WorksheetRequest) -> Worksheet
             message=f"Generated text-based worksheets for grades {', '.join(request.grades)}"
         )
         
+    except QuotaExceededError:
+        raise
+    
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate text-based worksheets: {str(e)}")
 
-async def generate_fallback_worksheet(grade: str, subject: str) -> str:
-    """Generate a basic fallback worksheet"""
-    try:
-        ai_service = GenkitAIService()
-        
-        basic_prompt = f"""
-        Create a basic educational worksheet for Grade {grade} in {subject}.
-        Include 5-7 simple questions appropriate for the grade level.
-        Make it educational and engaging for Indian students.
-        """
-        
-        content = await ai_service.generate_text(
-            basic_prompt,
-            language="en",
-            content_type="worksheet",
-            grade_level=grade,
-            length="short",
-            subject=subject
-        )
-        
-        return f"Grade {grade} Worksheet - {subject}\n{'='*40}\n\n{content}\n\n(Generated with Google AI fallback)"
-        
-    except Exception as e:
-        return f"""
-Grade {grade} Worksheet - {subject}
-{'='*40}
-
-Basic Educational Worksheet
-
-1. What is the main topic we are studying in {subject}?
-2. Name three important concepts related to this topic.
-3. Explain one thing you learned today.
-4. Draw a simple diagram if applicable.
-5. Write two questions you still have about this topic.
-
-Instructions: Answer all questions to the best of your ability.
-
-Note: Worksheet generation encountered an error. Please consult your teacher for additional materials.
-"""
+async def generate_fallback_worksheet(grade: str, subject: str, deadline_seconds: Optional[float] = None) -> str:
+    """Generate a basic worksheet with a short prompt; raises when the provider gives no content"""
+    ai_service = GenkitAIService()
+    
+    instructions = PROMPTS.render("worksheet.fallback", {"grade": grade, "subject": subject})
+    
+    content = await ai_service.generate_text(
+        worksheet_topic(grade, subject),
+        instructions=instructions,
+        language="en",
+        content_type="worksheet",
+        grade_level=grade,
+        length="short",
+        subject=subject,
+        priority=BULK,
+        deadline_seconds=deadline_seconds,
+        fallback=False
+    )
+    
+    return f"Grade {grade} Worksheet - {subject}\n{'='*40}\n\n{content}\n\n(Generated with Google AI fallback)"
 
 @router.get("/health")
 async def worksheets_health():
@@ -312,5 +645,25 @@ async def worksheets_health():
         "status": "healthy",
         "ai_service": "Google AI (Gemini)",
         "ai_available": ai_service.genkit_available,
-        "features": ["text-based worksheets", "vision-enhanced worksheets", "multi-grade support"]
-    } 
\ No newline at end of file
+        "features": ["text-based worksheets", "vision-enhanced worksheets", "multi-grade support", "question bank"],
+        "deadline_seconds": WORKSHEET_DEADLINE_SECONDS,
+        "fallback_tiers": WORKSHEET_CASCADE.stats()
+    }
+
+@router.get("/image-stats")
+async def worksheet_image_stats():
+    """Textbook page images: decode / resize / encode time and bytes saved by downscaling"""
+    return image_ingestor().stats()
+
+@router.get("/page-analysis-stats")
+async def worksheet_page_analysis_stats():
+    """Textbook page analyses: calls made and hits of the perceptual-hash cache"""
+    return page_analyzer().stats()
+
+@router.get("/question-bank-stats")
+async def worksheet_question_bank_stats():
+    """Question bank: questions per type, duplicates dropped and assembly time"""
+    bank = question_bank()
+    if bank is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(bank.stats)}
@@ -0,0 +1,75 @@
+import time
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, List, Sequence, TypeVar
+from services.rate_limiter import QuotaExceededError
+from services.resilience import GenerationFailedError
+from services.sse import sse_event
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+async def run_bounded(items: Sequence[T], worker: Callable[[T], Awaitable[str]],
+                      max_concurrency: int) -> AsyncIterator[tuple]:
+    """
+    Run `worker` over `items` with at most `max_concurrency` in flight and yield
+    (index, result, error, elapsed_seconds) in completion order. Closing the
+    iterator (e.g. on client disconnect) cancels the items still running.
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run(index: int, item: T):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                return index, await worker(item), None, time.perf_counter() - started
+            except Exception as e:
+                return index, None, e, time.perf_counter() - started
+
+    tasks: List[asyncio.Task] = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def sse_batch_events(items: Sequence[T], worker: Callable[[T], Awaitable[str]],
+                           max_concurrency: int) -> AsyncIterator[str]:
+    """
+    Stream one `item` event per finished spec (index, status, content or error)
+    as soon as it completes, then a `done` event with the batch summary
+    """
+    started = time.perf_counter()
+    succeeded = failed = 0
+
+    results = run_bounded(items, worker, max_concurrency)
+    try:
+        async for index, content, error, elapsed in results:
+            event = {"index": index, "elapsed_ms": round(elapsed * 1000)}
+            if error is None:
+                succeeded += 1
+                event.update(status="ok", content=content)
+            elif isinstance(error, QuotaExceededError):
+                failed += 1
+                event.update(status="rate_limited", detail=str(error), status_code=429,
+                             retry_after=error.retry_after)
+            elif isinstance(error, GenerationFailedError):
+                failed += 1
+                logger.warning(f"Batch item {index} got no content: {str(error)}")
+                event.update(status="error", detail=str(error), status_code=502)
+            else:
+                failed += 1
+                logger.error(f"Batch item {index} failed: {str(error)}")
+                event.update(status="error", detail=str(error), status_code=500)
+            yield sse_event("item", event)
+
+        yield sse_event("done", {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": failed,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000)
+        })
+    finally:
+        await results.aclose()
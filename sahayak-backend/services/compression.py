@@ -0,0 +1,171 @@
+import zlib
+import logging
+from typing import Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Generated text compresses well; images and audio are already compressed
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml"
+)
+
+def negotiate_encoding(accept_encoding: str, preference: Tuple[str, ...] = ("br", "gzip")) -> Optional[str]:
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header, honouring q-values;
+    ties go to the first in `preference` (brotli only when installed). None
+    means send the body as is.
+    """
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        offered[name.strip().lower()] = quality
+
+    candidates = [encoding for encoding in preference if encoding != "br" or BROTLI_AVAILABLE]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = offered.get(encoding, offered.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Compressor:
+    """Incremental gzip or brotli encoder; flush() emits everything written so far"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality, mode=brotli.MODE_TEXT)
+        else:
+            # wbits=31 selects the gzip container
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + (self._brotli.flush() if flush else b"")
+        return self._zlib.compress(data) + (self._zlib.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    compressor = _Compressor(encoding, gzip_level, brotli_quality)
+    return compressor.compress(body) + compressor.finish()
+
+class CompressionMiddleware:
+    """
+    Negotiated brotli / gzip for text and JSON responses. Complete bodies
+    under `minimum_size` are sent as is. Streamed bodies (Server-Sent Events)
+    are compressed chunk by chunk and flushed after every chunk, so each
+    event still reaches the client as soon as it is produced; streams prefer
+    gzip, which compresses small flushed chunks better and at lower CPU cost
+    than brotli (see benchmark_compression.py).
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 5):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        stream_encoding = negotiate_encoding(accept_encoding, ("gzip", "br"))
+        responder = _CompressingResponder(send, encoding, stream_encoding, self)
+        await self.app(scope, receive, responder.send)
+
+class _CompressingResponder:
+    def __init__(self, send: Send, encoding: str, stream_encoding: str, settings: CompressionMiddleware):
+        self._send = send
+        self.encoding = encoding
+        self.stream_encoding = stream_encoding
+        self.settings = settings
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Held back until the first body chunk shows whether to compress
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.passthrough = (
+                "content-encoding" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            if not self.passthrough:
+                MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            return
+
+        if message["type"] != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.settings.minimum_size):
+                self.passthrough = True
+                await self._send(start_message)
+                await self._send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not more_body:
+                headers["Content-Encoding"] = self.encoding
+                compressed = compress_body(
+                    body, self.encoding, self.settings.gzip_level, self.settings.brotli_quality
+                )
+                headers["Content-Length"] = str(len(compressed))
+                await self._send(start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: the final size is unknown
+            headers["Content-Encoding"] = self.stream_encoding
+            del headers["Content-Length"]
+            self.compressor = _Compressor(
+                self.stream_encoding, self.settings.gzip_level, self.settings.brotli_quality
+            )
+            await self._send(start_message)
+
+        if self.passthrough:
+            await self._send(message)
+            return
+
+        if more_body:
+            data = self.compressor.compress(body, flush=True)
+        else:
+            data = self.compressor.compress(body) + self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
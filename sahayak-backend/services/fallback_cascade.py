@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.rate_limiter import QuotaExceededError
+from services.resilience import Deadline
+
+logger = logging.getLogger(__name__)
+
+# (name, minimum seconds left to start it, generate(timeout_seconds))
+Tier = Tuple[str, float, Callable[[float], Awaitable[Any]]]
+
+class FallbackCascade:
+    """
+    Tries generation tiers in order against one request deadline. A tier only
+    starts when at least its minimum time is left, and runs with whatever
+    remains as its timeout; the static tier at the end makes no provider call.
+    A request therefore returns within its deadline plus the time to render
+    the static template, however many grades or tiers fail. The bound is on
+    latency per request, not on server capacity: a timed-out SDK call keeps
+    its worker thread until the provider returns, which is why bulk calls
+    run on their own pool (GOOGLE_AI_BULK_MAX_CONCURRENCY). Quota errors are
+    not masked: they still reach the caller as HTTP 429.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, Dict[str, int]] = {}
+
+    async def attempt(self, name: str, min_seconds: float, generate: Callable[[float], Awaitable[Any]],
+                      deadline: Deadline, reserve_seconds: float = 0.0) -> Optional[Any]:
+        """
+        Result of one tier, or None when it was skipped, failed or produced
+        nothing. `reserve_seconds` of the remaining time is kept for the tiers
+        after an optional step such as a shared page analysis.
+        """
+        remaining = deadline.remaining() - reserve_seconds
+        if remaining < min_seconds:
+            self._count(name, "skipped")
+            return None
+        try:
+            result = await asyncio.wait_for(generate(remaining), timeout=remaining)
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            self._count(name, "failed")
+            logger.warning(f"Tier '{name}' failed: {str(e) or type(e).__name__}", extra={
+                "tier": name,
+                "remaining_seconds": round(deadline.remaining(), 2)
+            })
+            return None
+        if result is None:
+            self._count(name, "failed")
+            return None
+        self._count(name, "served")
+        return result
+
+    async def run(self, tiers: List[Tier], static: Callable[[], str], deadline: Deadline) -> str:
+        """First tier that succeeds in time, else the static template"""
+        for name, min_seconds, generate in tiers:
+            result = await self.attempt(name, min_seconds, generate, deadline)
+            if result is not None:
+                return result
+        self._count("static", "served")
+        return static()
+
+    def record(self, tier: str, outcome: str, count: int = 1):
+        """
+        Count an outcome decided outside attempt()/run(), e.g. static
+        worksheets served after the whole pipeline failed
+        """
+        self._count(tier, outcome, count)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._tiers.items()}
+
+    def _count(self, tier: str, outcome: str, count: int = 1):
+        with self._lock:
+            counts = self._tiers.setdefault(tier, {"served": 0, "failed": 0, "skipped": 0})
+            counts[outcome] += count
@@ -1,19 +1,129 @@
 import os
-import logging
 import time
+import random
+import logging
 import asyncio
-from typing import Optional, Dict, Any
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Callable, AsyncIterator, Tuple
 import json
+import hashlib
 from dotenv import load_dotenv
 
-# Google AI imports (simplified - no Genkit framework)
-import google.generativeai as genai
+from services.response_cache import ResponseCache, backend_path
+from services.single_flight import SingleFlight
+from services.prompt_templates import PROMPTS
+from services.llm_providers import provider_from_env
+from services.usage_metrics import PrefixReuseTracker, UsageRecorder
+from services.output_budget import OutputBudget
+from services.semantic_cache import SemanticQuestionIndex
+from services.image_ingestion import IMAGE_INPUT_TOKENS
+from services.rate_limiter import GeminiRateLimiter, QuotaExceededError, BULK, INTERACTIVE
+from services.resilience import (
+    CircuitBreaker, Deadline, GenerationFailedError, RetryPolicy, call_with_resilience,
+    is_quota_error
+)
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Length of the provider-side quota window; used as the Retry-After hint when
+# Gemini itself reports the quota as exhausted
+QUOTA_WINDOW_SECONDS = 60
+
+# Per-request time budget in seconds, derived from the endpoint that issues the call
+DEADLINE_SECONDS = {
+    "answer": 20,           # Knowledge Base Q&A is interactive
+    "explanation": 20,
+    "feedback": 20,
+    "visual": 25,
+    "content": 30,
+    "story": 30,
+    "example": 30,
+    "activity": 30,
+    "reading_passage": 30,
+    "lesson_plan": 40,
+    "worksheet": 45,
+    "worksheet_set": 60,    # Several grades in one response
+    "page_analysis": 30,
+    "question_set": 30      # Question bank top-ups
+}
+DEFAULT_DEADLINE_SECONDS = 30
+
+# Map content types to actual tab/module names
+CONTENT_TYPE_MODULES = {
+    "lesson_plan": "Lesson Planner",
+    "explanation": "Knowledge Base", 
+    "content": "Hyper Local Content Generator",
+    "worksheet": "Worksheets",
+    "worksheet_set": "Worksheets",
+    "page_analysis": "Worksheets",
+    "question_set": "Worksheets",
+    "visual": "Visual Aids",
+    "assessment": "Assessment",
+    "answer": "Knowledge Base",
+    "feedback": "Assessment",
+    "reading_passage": "Assessment",
+    "story": "Content Generator",
+    "example": "Content Generator",
+    "activity": "Content Generator"
+}
+
+# Define word limits clearly
+WORD_LIMITS = {
+    "short": {"min": 100, "max": 150},
+    "medium": {"min": 200, "max": 300}, 
+    "long": {"min": 400, "max": 500}
+}
+
+# Define grade-specific vocabulary and complexity instructions
+GRADE_INSTRUCTIONS = {
+    "1": "Use very simple words that a 6-7 year old can understand. Use short sentences (5-8 words). Avoid complex concepts. Use familiar examples from daily life.",
+    "2": "Use simple words that a 7-8 year old can understand. Use short to medium sentences (8-12 words). Use basic concepts. Use examples from home and school.",
+    "3": "Use age-appropriate words for 8-9 year olds. Use clear, medium-length sentences (10-15 words). Explain concepts step by step. Use relatable examples.",
+    "4": "Use vocabulary suitable for 9-10 year olds. Use well-structured sentences (12-18 words). Include slightly more complex concepts with explanations.",
+    "5": "Use vocabulary appropriate for 10-11 year olds. Use detailed sentences (15-20 words). Include more advanced concepts with clear explanations and examples."
+}
+
+# grade_level for one response covering several grades, whose per-grade
+# instructions are part of the task instructions instead
+MULTI_GRADE = "multi-grade"
+MULTI_GRADE_INSTRUCTION = "Follow the grade-specific instructions for each grade's part of the response."
+
+def _educational_variant(language: str, content_type: str, grade_level: str, length: str):
+    """Compiled educational prompt for one combination of static parameters (cached by PROMPTS)"""
+    word_count = WORD_LIMITS.get(length, WORD_LIMITS["medium"])
+    
+    # Language-specific prompts with improved Hindi support
+    if language == "hi":
+        return PROMPTS.variant(
+            "educational.hi",
+            grade_level=grade_level,
+            min_words=word_count["min"],
+            max_words=word_count["max"]
+        )
+    if language == "en":
+        return PROMPTS.variant(
+            "educational.en",
+            grade_level=grade_level,
+            content_type=content_type,
+            min_words=word_count["min"],
+            max_words=word_count["max"],
+            grade_instruction=MULTI_GRADE_INSTRUCTION if grade_level == MULTI_GRADE
+            else GRADE_INSTRUCTIONS.get(grade_level, GRADE_INSTRUCTIONS["3"])
+        )
+    # For other languages, provide clear instructions
+    return PROMPTS.variant(
+        "educational.other",
+        language=language,
+        grade_level=grade_level,
+        min_words=word_count["min"],
+        max_words=word_count["max"]
+    )
+
 class GenkitAIService:
     """
     Simplified Google AI service - Better Hindi, enhanced prompts, no dependency conflicts
@@ -36,32 +146,141 @@ class GenkitAIService:
         self.model_name = "gemini-1.5-flash"  # Free tier model
         self.genkit_available = False
         
-        # Initialize Google AI
+        # Gemini by default; LLM_PROVIDER=offline swaps in a local stand-in for load tests
+        self.provider = provider_from_env(self.api_key)
+        
+        # Gemini SDK calls are blocking, so they run on a bounded thread pool
+        # instead of the event loop. The pool size caps concurrent upstream calls.
+        self.max_concurrency = max(1, int(os.getenv("GOOGLE_AI_MAX_CONCURRENCY", "32")))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency,
+            thread_name_prefix="gemini"
+        )
+        # Bulk work (worksheets, batches, pre-generation) runs on its own smaller
+        # pool. A call abandoned at its deadline keeps its thread until the SDK
+        # returns, so a hanging provider can only tie up bulk threads, never the
+        # ones interactive endpoints need
+        self.bulk_max_concurrency = max(1, int(os.getenv("GOOGLE_AI_BULK_MAX_CONCURRENCY", "8")))
+        self._bulk_executor = ThreadPoolExecutor(
+            max_workers=self.bulk_max_concurrency,
+            thread_name_prefix="gemini-bulk"
+        )
+        # SDK calls running per pool, including ones whose caller gave up
+        self._blocking_calls = {INTERACTIVE: 0, BULK: 0}
+        self._blocking_lock = threading.Lock()
+        
+        # Response cache shared by all routers (memory LRU + on-disk tier)
+        self.cache_enabled = os.getenv("GOOGLE_AI_CACHE_ENABLED", "true").lower() == "true"
+        cache_path = backend_path(os.getenv("GOOGLE_AI_CACHE_PATH", "cache/responses.sqlite3"))
+        self.response_cache = ResponseCache(
+            max_entries=int(os.getenv("GOOGLE_AI_CACHE_MAX_ENTRIES", "1024")),
+            ttl_seconds=float(os.getenv("GOOGLE_AI_CACHE_TTL_SECONDS", "86400")),
+            disk_path=cache_path if self.cache_enabled else ""
+        )
+        
+        # Near-duplicate question index for callers passing semantic_cache=True
+        self.semantic_cache_enabled = (
+            self.cache_enabled and os.getenv("KNOWLEDGE_SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.semantic_cache = SemanticQuestionIndex(
+            threshold=float(os.getenv("KNOWLEDGE_SEMANTIC_THRESHOLD", "0.8")),
+            max_entries=int(os.getenv("KNOWLEDGE_SEMANTIC_MAX_ENTRIES", "5000")),
+            ttl_seconds=float(os.getenv("GOOGLE_AI_CACHE_TTL_SECONDS", "86400")),
+            audit_rate=float(os.getenv("KNOWLEDGE_SEMANTIC_AUDIT_RATE", "0.2"))
+        )
+        
+        # Model and generation config objects are built once and shared by all requests
+        self._models: Dict[tuple, Any] = {}
+        self.max_cached_models = max(1, int(os.getenv("GOOGLE_AI_MAX_CACHED_MODELS", "256")))
+        self._generation_configs: Dict[tuple, Any] = {}
+        self._registry_lock = threading.Lock()
+        
+        # Coalesces concurrent identical requests into one upstream call
+        self._single_flight = SingleFlight()
+        
+        # Keeps upstream calls inside the Gemini RPM/TPM quota (free tier defaults)
+        self.rate_limiter = GeminiRateLimiter(
+            requests_per_minute=float(os.getenv("GOOGLE_AI_RPM", "15")),
+            tokens_per_minute=float(os.getenv("GOOGLE_AI_TPM", "1000000")),
+            max_wait_seconds=float(os.getenv("GOOGLE_AI_MAX_QUEUE_WAIT_SECONDS", "10")),
+            max_queue_depth=int(os.getenv("GOOGLE_AI_MAX_QUEUE_DEPTH", "100")),
+            # Bulk work (multi-grade worksheets, batches) may wait longer but never starves
+            bulk_max_wait_seconds=float(os.getenv("GOOGLE_AI_BULK_MAX_QUEUE_WAIT_SECONDS", "60")),
+            bulk_min_share=float(os.getenv("GOOGLE_AI_BULK_MIN_SHARE", "0.2"))
+        )
+        
+        # Retries for transient provider errors and a breaker that fails fast during outages
+        self.retry_policy = RetryPolicy(
+            max_attempts=int(os.getenv("GOOGLE_AI_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("GOOGLE_AI_RETRY_BASE_DELAY", "0.5")),
+            max_delay=float(os.getenv("GOOGLE_AI_RETRY_MAX_DELAY", "8"))
+        )
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("GOOGLE_AI_BREAKER_FAILURE_THRESHOLD", "5")),
+            recovery_seconds=float(os.getenv("GOOGLE_AI_BREAKER_RECOVERY_SECONDS", "30"))
+        )
+        self._resilience_counters = {"retries": 0, "timeouts": 0, "admission_timeouts": 0}
+        
+        # Output token budget sized from the requested word limit and language
+        self.output_budget = OutputBudget(
+            WORD_LIMITS,
+            slack=float(os.getenv("GOOGLE_AI_OUTPUT_TOKEN_SLACK", "1.25")),
+            ceiling=int(os.getenv("GOOGLE_AI_MAX_OUTPUT_TOKENS", "2048")),
+            stream_stop_factor=float(os.getenv("GOOGLE_AI_STREAM_STOP_FACTOR", "1.2"))
+        )
+        # Share of responses without reported usage that are measured with count_tokens
+        self.token_calibration_rate = float(os.getenv("GOOGLE_AI_TOKEN_CALIBRATION_RATE", "0.05"))
+        
+        # Rolling token / latency / cost accounting per module and language
+        self.usage = UsageRecorder(
+            window_minutes=int(os.getenv("GOOGLE_AI_USAGE_WINDOW_MINUTES", "60")),
+            input_price_per_mtok=float(os.getenv("GOOGLE_AI_INPUT_PRICE_PER_MTOK", "0.075")),
+            output_price_per_mtok=float(os.getenv("GOOGLE_AI_OUTPUT_PRICE_PER_MTOK", "0.30"))
+        )
+        
+        # The static part of each prompt goes out as a system instruction when the
+        # SDK supports it, and as provider-side cached context once it is large
+        # enough for explicit caching (Gemini's minimum is 32k tokens)
+        self.system_instruction_enabled = (
+            os.getenv("GOOGLE_AI_SYSTEM_INSTRUCTION_ENABLED", "true").lower() == "true"
+        )
+        self.context_cache_min_tokens = int(os.getenv("GOOGLE_AI_CONTEXT_CACHE_MIN_TOKENS", "32768"))
+        self.context_cache_ttl_seconds = float(os.getenv("GOOGLE_AI_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+        self._context_models: Dict[str, tuple] = {}
+        self.prefix_reuse = PrefixReuseTracker(
+            window_seconds=float(os.getenv("GOOGLE_AI_PREFIX_REUSE_WINDOW_SECONDS", "3600"))
+        )
+        
+        # Initialize the LLM provider
         try:
-            if self.api_key and self.api_key != "":
-                # Configure Google AI
-                genai.configure(api_key=self.api_key)
-                
-                self.genkit_available = True
-                print("✅ Google AI service initialized successfully!")
-                print(f"📚 Using model: {self.model_name}")
-                logger.info("Google AI service initialized")
-            else:
-                self.genkit_available = False
-                print("⚠️ Google AI API key not found. Add GOOGLE_AI_API_KEY to .env file")
-                logger.warning("Google AI API key not configured")
+            self.genkit_available = self.provider.configure()
+            if self.genkit_available:
+                logger.info("Google AI service initialized", extra={
+                    "provider": self.provider.name,
+                    "model": self.model_name
+                })
                 
         except Exception as e:
             self.genkit_available = False
-            print(f"❌ Google AI initialization failed: {str(e)}")
             logger.error(f"Google AI initialization error: {str(e)}")
             
         self._initialized = True
     
     async def generate_text(self, prompt_text: str, **kwargs) -> str:
         """
-        Generate educational content using Google Gemini with enhanced prompts
+        Generate educational content using Google Gemini with enhanced prompts.
+        Pass priority="bulk" for multi-grade, batch or background work so that
+        interactive requests are scheduled ahead of it, semantic_cache=True
+        to answer paraphrases of earlier prompts from the near-duplicate index,
+        `instructions` for static task instructions that belong in the system
+        instruction rather than in the per-request prompt, `image` (a
+        PreparedImage) to send an image along with the prompt,
+        fallback=False to get GenerationFailedError instead of placeholder
+        content when the provider fails (deadline_seconds bounds the call), and
+        `validate` (content -> bool) to keep content that fails the caller's
+        checks out of the caches.
         """
+        started = time.perf_counter()
         try:
             # Extract parameters from frontend
             language = kwargs.get("language", "en")
@@ -70,203 +289,715 @@ class GenkitAIService:
             subject = kwargs.get("subject", "General")
             length = kwargs.get("length", "medium")
             
-            # Add timestamp to ensure fresh responses
-            timestamp = int(time.time())
+            logger.info("Generation request", extra={
+                "topic": prompt_text,
+                "subject": subject,
+                "language": language,
+                "content_module": CONTENT_TYPE_MODULES.get(content_type, content_type.title()),
+                "grade_level": grade_level,
+                "length": length
+            })
             
-            # Map content types to actual tab/module names
-            content_type_mapping = {
-                "lesson_plan": "Lesson Planner",
-                "explanation": "Knowledge Base", 
-                "content": "Hyper Local Content Generator",
-                "worksheet": "Worksheets",
-                "visual": "Visual Aids",
-                "assessment": "Assessment",
-                "answer": "Knowledge Base",
-                "story": "Content Generator",
-                "example": "Content Generator",
-                "activity": "Content Generator"
-            }
+            cache_key = self._cache_key(
+                prompt_text, language, content_type, grade_level, subject, length,
+                kwargs.get("instructions"), kwargs.get("image"),
+                kwargs.get("max_output_tokens"), kwargs.get("response_mime_type")
+            )
+            if self.cache_enabled:
+                cached_content = await self.response_cache.get(cache_key)
+                if cached_content is not None:
+                    logger.info("Served from response cache", extra={"response_chars": len(cached_content)})
+                    self._record_usage(prompt_text, kwargs, "hit", started)
+                    return cached_content
             
-            # Get the actual module name
-            module_name = content_type_mapping.get(content_type, content_type.title())
+            semantic_content = self._semantic_lookup(prompt_text, kwargs)
+            if semantic_content is not None:
+                self._record_usage(prompt_text, kwargs, "hit", started)
+                return semantic_content
             
-            # Display frontend inputs in terminal
-            print("=" * 60)
-            print("🔥 NEW GOOGLE AI REQUEST:")
-            print(f"   📋 Topic: {prompt_text}")
-            print(f"   📚 Subject: {subject}")
-            print(f"   🌐 Language: {language.upper()}")
-            print(f"   📊 Content Type: {module_name}")
-            print(f"   🎓 Grade Level: {grade_level}")
-            print(f"   📏 Length: {length}")
-            print(f"   🆔 Request ID: {timestamp}")
-            print("=" * 60)
+            # Identical requests already in flight share one upstream call; only
+            # the caller that runs it fills in `outcome`. Callers coalesce only
+            # when they would handle a failure the same way and wait in the
+            # same scheduler lane
+            outcome: Dict[str, Any] = {}
+            fallback = kwargs.get("fallback") is not False
+            flight_key = f"{cache_key}:{kwargs.get('priority', INTERACTIVE)}:{fallback}"
+            content = await self._single_flight.do(
+                flight_key,
+                lambda: self._generate_uncached(prompt_text, cache_key, outcome, **kwargs)
+            )
+            self._record_usage(prompt_text, kwargs, "miss" if outcome else "coalesced", started, **outcome)
+            return content
             
-            logger.info(f"Processing: {prompt_text} | {content_type} | Grade {grade_level} | {language}")
-            
-            if self.genkit_available:
-                try:
-                    print(f"🤖 Generating content with Google Gemini...")
-                    print(f"📝 Topic: {prompt_text[:50]}...")
-                    print(f"🌐 Language: {language}")
-                    print(f"🎯 Grade Level: {grade_level}")
-                    
-                    # Create educational prompt with enhanced structure
-                    enhanced_prompt = self._create_educational_prompt(
-                        prompt_text, language, content_type, grade_level, timestamp, length, subject
+        except (QuotaExceededError, GenerationFailedError):
+            # Surfaced to the caller as HTTP 429 / handled by the caller instead of fallback content
+            raise
+                
+        except Exception as e:
+            error_msg = "I'm sorry, I couldn't generate content at this moment. Please try again."
+            logger.error(f"Error generating content: {str(e)}")
+            if kwargs.get("fallback") is False:
+                raise GenerationFailedError(f"No content generated for '{prompt_text}'") from e
+            return error_msg
+    
+    async def _generate_uncached(self, prompt_text: str, cache_key: str, outcome: Dict[str, Any],
+                                 **kwargs) -> str:
+        """
+        Generate content with Google Gemini and cache the result; runs once per
+        in-flight key. Token counts and upstream latency are written to `outcome`.
+        """
+        outcome["fallback"] = True
+        language = kwargs.get("language", "en")
+        content_type = kwargs.get("content_type", "explanation")
+        grade_level = kwargs.get("grade_level", "3")
+        subject = kwargs.get("subject", "General")
+        length = kwargs.get("length", "medium")
+        priority = kwargs.get("priority", INTERACTIVE)
+        
+        if self.genkit_available:
+            try:
+                # Static instructions and the per-request part of the prompt
+                system_instruction, user_prompt = self._prompt_parts(
+                    prompt_text, language, content_type, grade_level, length, subject, kwargs.get("instructions")
+                )
+                enhanced_prompt = f"{system_instruction}\n\n{user_prompt}"
+                
+                logger.debug("Enhanced prompt", extra={
+                    "sample": True,
+                    "prompt_preview": user_prompt[:200],
+                    "prompt_chars": len(enhanced_prompt)
+                })
+                
+                # Generate content using Google AI directly
+                model, contents, prefix_mode = await self._prompt_model(system_instruction, user_prompt)
+                contents = self._with_image(contents, kwargs.get("image"))
+                generation_config = self._request_generation_config(kwargs, length, language, content_type)
+                
+                estimated_tokens = self._estimate_tokens(enhanced_prompt, generation_config, kwargs.get("image"))
+                deadline = Deadline(self._deadline_seconds(content_type, kwargs))
+                
+                async def admit(timeout: float):
+                    # Every attempt is a separate upstream request, so each one needs quota
+                    await self.rate_limiter.acquire(estimated_tokens, priority)
+                
+                async def attempt(timeout: float):
+                    return await self._run_blocking(
+                        model.generate_content,
+                        contents,
+                        priority=priority,
+                        generation_config=generation_config
+                    )
+                
+                upstream_started = time.perf_counter()
+                response = await call_with_resilience(
+                    attempt, self.retry_policy, self.circuit_breaker, deadline, self._resilience_counters,
+                    admit=admit
+                )
+                outcome["upstream_seconds"] = time.perf_counter() - upstream_started
+                
+                if response and response.text:
+                    content = response.text.strip()
+                    prompt_tokens, output_tokens = self._usage_tokens(response, enhanced_prompt, content)
+                    outcome.update(prompt_tokens=prompt_tokens, output_tokens=output_tokens, fallback=False)
+                    self.rate_limiter.settle(estimated_tokens, prompt_tokens + output_tokens)
+                    self._measure_output(response, model, content, length, language, content_type)
+                    self._record_prefix(
+                        system_instruction, user_prompt, prefix_mode, response, outcome["upstream_seconds"]
                     )
                     
-                    print(f"🔍 Enhanced Prompt Preview: {enhanced_prompt[:200]}...")
-                    print(f"📊 Prompt Length: {len(enhanced_prompt)} characters")
+                    logger.info("Generated content", extra={"response_chars": len(content)})
+                    logger.debug("Response preview", extra={"sample": True, "response_preview": content[:100]})
                     
-                    # Generate content using Google AI directly
-                    model = genai.GenerativeModel(self.model_name)
+                    await self._store(prompt_text, cache_key, kwargs, content)
                     
-                    # Configure generation parameters for better quality
-                    generation_config = genai.types.GenerationConfig(
-                        temperature=0.3,      # Lower for more consistent, accurate responses
-                        top_p=0.95,          # High for coherent responses
-                        top_k=40,            # Balanced creativity
-                        max_output_tokens=800,  # Sufficient for educational content
-                        candidate_count=1
-                    )
+                    return content
+                else:
+                    logger.warning("Google AI returned empty response, using educational fallback")
+                    return self._generate_educational_fallback(prompt_text, **kwargs)
                     
+            except QuotaExceededError:
+                raise
+                
+            except Exception as e:
+                logger.error(f"Google AI API error: {str(e)}")
+                
+                if is_quota_error(e):
+                    raise QuotaExceededError(
+                        "API quota exceeded. Please try again later or check your Google AI usage.",
+                        retry_after=QUOTA_WINDOW_SECONDS
+                    )
+                
+                if "api_key" in str(e).lower():
+                    logger.error("API key issue. Please check your Google AI API key configuration.")
+                
+                return self._generate_educational_fallback(prompt_text, **kwargs)
+        
+        else:
+            logger.warning("Google AI not available, using educational fallback")
+            return self._generate_educational_fallback(prompt_text, **kwargs)
+    
+    async def generate_text_stream(self, prompt_text: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream educational content from Google Gemini chunk by chunk.
+        Closing the generator (e.g. on client disconnect) cancels the upstream stream.
+        """
+        language = kwargs.get("language", "en")
+        content_type = kwargs.get("content_type", "explanation")
+        grade_level = kwargs.get("grade_level", "3")
+        subject = kwargs.get("subject", "General")
+        length = kwargs.get("length", "medium")
+        
+        logger.info(f"Streaming: {prompt_text} | {content_type} | Grade {grade_level} | {language}")
+        
+        started = time.perf_counter()
+        cache_key = self._cache_key(
+            prompt_text, language, content_type, grade_level, subject, length,
+            kwargs.get("instructions"), kwargs.get("image"),
+            kwargs.get("max_output_tokens"), kwargs.get("response_mime_type")
+        )
+        if self.cache_enabled:
+            cached_content = await self.response_cache.get(cache_key)
+            if cached_content is not None:
+                self._record_usage(prompt_text, kwargs, "hit", started)
+                yield cached_content
+                return
+        
+        semantic_content = self._semantic_lookup(prompt_text, kwargs)
+        if semantic_content is not None:
+            self._record_usage(prompt_text, kwargs, "hit", started)
+            yield semantic_content
+            return
+        
+        if not self.genkit_available:
+            self._record_usage(prompt_text, kwargs, "miss", started, fallback=True)
+            yield self._generate_educational_fallback(prompt_text, **kwargs)
+            return
+        
+        system_instruction, user_prompt = self._prompt_parts(
+            prompt_text, language, content_type, grade_level, length, subject, kwargs.get("instructions")
+        )
+        enhanced_prompt = f"{system_instruction}\n\n{user_prompt}"
+        model, contents, prefix_mode = await self._prompt_model(system_instruction, user_prompt)
+        contents = self._with_image(contents, kwargs.get("image"))
+        generation_config = self._request_generation_config(kwargs, length, language, content_type)
+        estimated_tokens = self._estimate_tokens(enhanced_prompt, generation_config, kwargs.get("image"))
+        priority = kwargs.get("priority", INTERACTIVE)
+        deadline = Deadline(self._deadline_seconds(content_type, kwargs))
+        loop = asyncio.get_running_loop()
+        
+        def start_stream():
+            """Start one upstream stream on the executor; chunks arrive on the returned queue"""
+            queue: asyncio.Queue = asyncio.Queue()
+            stop = threading.Event()
+            holder = {}
+            
+            def publish(kind, value=None):
+                try:
+                    loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+                except RuntimeError:
+                    pass  # Event loop already closed; nobody is listening
+            
+            def pump():
+                # Runs on the executor: iterating the SDK stream blocks on the network
+                try:
                     response = model.generate_content(
-                        enhanced_prompt,
-                        generation_config=generation_config
+                        contents,
+                        generation_config=generation_config,
+                        stream=True
                     )
-                    
-                    if response and response.text:
-                        content = response.text.strip()
-                        
-                        print(f"✅ Generated content successfully!")
-                        print(f"📏 Response length: {len(content)} characters")
-                        print(f"🔍 Response preview: {content[:100]}...")
-                        print("=" * 60)
-                        
-                        return content
-                    else:
-                        error_msg = "Google AI returned empty response. Please try again."
-                        print(f"⚠️ {error_msg}")
-                        return self._generate_educational_fallback(prompt_text, **kwargs)
-                        
+                    holder["response"] = response
+                    for chunk in response:
+                        if stop.is_set():
+                            break
+                        if chunk.text:
+                            publish("chunk", chunk.text)
+                    publish("done")
                 except Exception as e:
-                    error_msg = f"Google AI generation error: {str(e)}"
-                    print(f"❌ {error_msg}")
-                    logger.error(f"Google AI API error: {str(e)}")
-                    
-                    # Provide helpful error message
-                    if "quota" in str(e).lower():
-                        error_msg = "API quota exceeded. Please try again later or check your Google AI usage."
-                    elif "api_key" in str(e).lower():
-                        error_msg = "API key issue. Please check your Google AI API key configuration."
-                    else:
-                        error_msg = f"AI service temporarily unavailable: {str(e)}"
-                    
-                    print(f"📤 Sending error response to frontend...")
-                    return self._generate_educational_fallback(prompt_text, **kwargs)
+                    publish("error", e)
             
-            else:
-                print("⚠️ Google AI not available, using educational fallback")
-                fallback_response = self._generate_educational_fallback(prompt_text, **kwargs)
-                print(f"📤 Fallback response: {fallback_response[:100]}...")
-                return fallback_response
-                
-        except Exception as e:
-            error_msg = "I'm sorry, I couldn't generate content at this moment. Please try again."
-            logger.error(f"Error generating content: {str(e)}")
-            print(f"❌ Error: {str(e)}")
-            print(f"📤 Sending error response to frontend...")
-            return error_msg
-    
-    def _create_educational_prompt(self, prompt: str, language: str, content_type: str, 
-                                 grade_level: str, timestamp: int, length: str = "medium", 
-                                 subject: str = "General") -> str:
-        """Create educational prompt with enhanced structure"""
+            self._submit_blocking(pump, priority)
+            return queue, stop, holder
         
-        # Define word limits clearly
-        word_limits = {
-            "short": {"min": 100, "max": 150},
-            "medium": {"min": 200, "max": 300}, 
-            "long": {"min": 400, "max": 500}
-        }
+        def abandon(stop, holder):
+            stop.set()
+            self._cancel_stream(holder.get("response"))
         
-        word_count = word_limits.get(length, word_limits["medium"])
+        async def admit(timeout: float):
+            # Every attempt is a separate upstream request, so each one needs quota
+            await self.rate_limiter.acquire(estimated_tokens, priority)
         
-        # Define grade-specific vocabulary and complexity instructions
-        grade_instructions = {
-            "1": "Use very simple words that a 6-7 year old can understand. Use short sentences (5-8 words). Avoid complex concepts. Use familiar examples from daily life.",
-            "2": "Use simple words that a 7-8 year old can understand. Use short to medium sentences (8-12 words). Use basic concepts. Use examples from home and school.",
-            "3": "Use age-appropriate words for 8-9 year olds. Use clear, medium-length sentences (10-15 words). Explain concepts step by step. Use relatable examples.",
-            "4": "Use vocabulary suitable for 9-10 year olds. Use well-structured sentences (12-18 words). Include slightly more complex concepts with explanations.",
-            "5": "Use vocabulary appropriate for 10-11 year olds. Use detailed sentences (15-20 words). Include more advanced concepts with clear explanations and examples."
-        }
+        async def open_stream(timeout: float):
+            # The wait for the first chunk is bounded by the request deadline
+            queue, stop, holder = start_stream()
+            try:
+                first = await queue.get()
+            except BaseException:
+                abandon(stop, holder)
+                raise
+            if first[0] == "error":
+                raise first[1]
+            return (queue, stop, holder), first
         
-        grade_instruction = grade_instructions.get(grade_level, grade_instructions["3"])
+        try:
+            # The breaker is checked before any quota is spent, and failures to
+            # start the stream are retried like any other call
+            (queue, stop, stream_holder), pending = await call_with_resilience(
+                open_stream, self.retry_policy, self.circuit_breaker, deadline, self._resilience_counters,
+                admit=admit
+            )
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            if is_quota_error(e):
+                raise QuotaExceededError(
+                    "API quota exceeded. Please try again later or check your Google AI usage.",
+                    retry_after=QUOTA_WINDOW_SECONDS
+                )
+            logger.warning(f"Streaming skipped: {str(e) or type(e).__name__}")
+            self._record_usage(prompt_text, kwargs, "miss", started, fallback=True)
+            yield self._generate_educational_fallback(prompt_text, **kwargs)
+            return
         
-        # Language-specific prompts with improved Hindi support
-        if language == "hi":
-            enhanced_prompt = f"""
-आप एक अनुभवी हिंदी शिक्षक हैं। कृपया बिल्कुल शुद्ध हिंदी में लिखें।
-
-विषय: {prompt}
-कक्षा: {grade_level}
-शब्द सीमा: {word_count['min']}-{word_count['max']} शब्द
-
-महत्वपूर्ण निर्देश:
-- बिल्कुल सही हिंदी व्याकरण का प्रयोग करें
-- सभी तथ्य पूर्णतः सत्य और सटीक होने चाहिए
-- कक्षा {grade_level} के बच्चों के लिए उपयुक्त भाषा का प्रयोग करें
-- सरल और स्पष्ट वाक्यों में लिखें
-- शिक्षाप्रद और रोचक शैली में लिखें
-
-'{prompt}' के बारे में लिखें:
-"""
+        parts = []
+        words = 0
+        word_limit = self.output_budget.stream_word_limit(length)
+        completed = False
+        stopped_early = False
+        try:
+            while True:
+                kind, value = pending if pending is not None else await queue.get()
+                pending = None
+                if kind == "chunk":
+                    parts.append(value)
+                    words += len(value.split())
+                    yield value
+                    if words > word_limit:
+                        # Well past the requested length: stop paying for more tokens
+                        logger.info("Stopping stream past word limit", extra={
+                            "words": words, "word_limit": word_limit
+                        })
+                        self.output_budget.record_early_stop()
+                        completed = stopped_early = True
+                        self.circuit_breaker.record_success()
+                        break
+                elif kind == "error":
+                    logger.error(f"Google AI streaming error: {str(value)}")
+                    if is_quota_error(value):
+                        self.circuit_breaker.release()
+                        raise QuotaExceededError(
+                            "API quota exceeded. Please try again later or check your Google AI usage.",
+                            retry_after=QUOTA_WINDOW_SECONDS
+                        )
+                    self.circuit_breaker.record_failure()
+                    if parts:
+                        raise value
+                    self._record_usage(prompt_text, kwargs, "miss", started, fallback=True)
+                    yield self._generate_educational_fallback(prompt_text, **kwargs)
+                    return
+                else:
+                    completed = True
+                    self.circuit_breaker.record_success()
+                    break
+        finally:
+            if not completed:
+                self.circuit_breaker.release()
+            if not completed or stopped_early:
+                stop.set()
+                self._cancel_stream(stream_holder.get("response"))
         
-        elif language == "en":
-            enhanced_prompt = f"""
-You are an expert educational content creator with perfect knowledge of facts and grammar.
-
-Topic: {prompt}
-Grade Level: {grade_level}  
-Content Type: {content_type}
-Word Limit: {word_count['min']}-{word_count['max']} words
-
-Critical Requirements:
-- Use perfect grammar and spelling
-- Ensure ALL facts are completely accurate and verified
-- Use simple, clear sentences appropriate for grade {grade_level} students
-- Be educational, engaging, and age-appropriate
-- Stay strictly within the word limit
-- {grade_instruction}
-
-Write about '{prompt}':
-"""
+        content = "".join(parts).strip()
+        if not stopped_early:
+            self._measure_output(stream_holder.get("response"), model, content, length, language, content_type)
+        prompt_tokens, output_tokens = self._usage_tokens(stream_holder.get("response"), enhanced_prompt, content)
+        self.rate_limiter.settle(estimated_tokens, prompt_tokens + output_tokens)
+        self._record_prefix(
+            system_instruction, user_prompt, prefix_mode, stream_holder.get("response"),
+            time.perf_counter() - started
+        )
+        self._record_usage(
+            prompt_text, kwargs, "miss", started,
+            prompt_tokens=prompt_tokens, output_tokens=output_tokens,
+            upstream_seconds=time.perf_counter() - started, fallback=False
+        )
+        if content and not stopped_early:
+            # A stream cut off at the word limit ends mid-sentence; never serve it again
+            await self._store(prompt_text, cache_key, kwargs, content)
+    
+    def _semantic_partition(self, options: Dict[str, Any]) -> tuple:
+        """Requests whose answers are interchangeable; the language comes first"""
+        language = options.get("language", "en")
+        return (
+            language,
+            options.get("grade_level", "3"),
+            options.get("length", "medium"),
+            options.get("content_type", "explanation"),
+            options.get("subject", "General"),
+            PROMPTS.version(self._educational_template(language))
+        )
+    
+    def _semantic_lookup(self, prompt_text: str, options: Dict[str, Any]) -> Optional[str]:
+        if not (self.semantic_cache_enabled and options.get("semantic_cache")):
+            return None
+        hit = self.semantic_cache.lookup(prompt_text, self._semantic_partition(options))
+        if hit is None:
+            return None
+        logger.info("Served from semantic cache", extra={
+            "matched_question": hit.question,
+            "similarity": round(hit.similarity, 3)
+        })
+        return hit.answer
+    
+    async def _store(self, prompt_text: str, cache_key: str, options: Dict[str, Any], content: str):
+        """Cache generated content, unless the caller's `validate` callback rejects it"""
+        validate = options.get("validate")
+        if validate is not None and not validate(content):
+            logger.info("Generated content failed validation, not cached", extra={"response_chars": len(content)})
+            return
+        if self.cache_enabled:
+            await self.response_cache.set(cache_key, content)
+        self._semantic_add(prompt_text, options, content)
+    
+    def _semantic_add(self, prompt_text: str, options: Dict[str, Any], content: str):
+        if self.semantic_cache_enabled and options.get("semantic_cache"):
+            self.semantic_cache.add(prompt_text, self._semantic_partition(options), content)
+    
+    def _cancel_stream(self, response):
+        """Cancel an SDK streaming response so the upstream call stops producing tokens"""
+        # The SDK keeps the underlying gRPC call in a private attribute; it is
+        # the only handle that can abort a stream that is still in flight
+        iterator = getattr(response, "_iterator", None)
+        cancel = getattr(iterator, "cancel", None)
+        if callable(cancel):
+            try:
+                cancel()
+            except Exception as e:
+                logger.debug(f"Could not cancel upstream stream: {e}")
+    
+    def _reported_usage(self, response):
+        """(prompt_tokens, output_tokens) reported by the provider, or Nones"""
+        usage = getattr(response, "usage_metadata", None)
+        return getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None)
+    
+    def _usage_tokens(self, response, prompt: str, content: str):
+        """Prompt and output token counts, from the provider when it reports them"""
+        prompt_tokens, output_tokens = self._reported_usage(response)
+        if prompt_tokens is None or output_tokens is None:
+            return self._estimate_tokens(prompt), len(content) // 4
+        return prompt_tokens, output_tokens
+    
+    def _measure_output(self, response, model, content: str, length: str, language: str, content_type: str):
+        """Feed the output budget: truncations widen it, token counts calibrate it"""
+        if self._hit_token_limit(response):
+            logger.warning("Response cut off by max_output_tokens", extra={
+                "length": length, "language": language, "content_type": content_type
+            })
+            self.output_budget.record_truncation(length, language, content_type)
         
-        else:
-            # For other languages, provide clear instructions
-            enhanced_prompt = f"""
-You are an educational expert. Write accurate and grammatically correct content.
-
-Topic: {prompt}
-Language: {language}
-Grade Level: {grade_level}
-Word Limit: {word_count['min']}-{word_count['max']} words
-
-Requirements:
-- Use correct grammar in {language}
-- Ensure all facts are accurate
-- Use age-appropriate language for grade {grade_level}
-- Stay within word limit
-- Be educational and engaging
-
-Write about '{prompt}' in {language}:
-"""
+        words = len(content.split())
+        output_tokens = self._reported_usage(response)[1]
+        if output_tokens is not None:
+            self.output_budget.observe(language, words, output_tokens)
+        elif random.random() < self.token_calibration_rate and callable(getattr(model, "count_tokens", None)):
+            # Off the request path; count_tokens does not use generation quota
+            self._executor.submit(self._calibrate_tokens, model, content, language, words)
+    
+    def _calibrate_tokens(self, model, content: str, language: str, words: int):
+        try:
+            self.output_budget.observe(language, words, model.count_tokens(content).total_tokens)
+        except Exception as e:
+            logger.debug(f"Token calibration failed: {e}")
+    
+    @staticmethod
+    def _hit_token_limit(response) -> bool:
+        try:
+            candidates = getattr(response, "candidates", None) or []
+            reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        except Exception:
+            return False
+        return getattr(reason, "name", reason) in ("MAX_TOKENS", 2)
+    
+    def _record_usage(self, prompt_text: str, options: Dict[str, Any], cache: str, started: float,
+                      prompt_tokens: int = 0, output_tokens: int = 0,
+                      upstream_seconds: Optional[float] = None, fallback: bool = False):
+        content_type = options.get("content_type", "explanation")
+        self.usage.record(
+            module=CONTENT_TYPE_MODULES.get(content_type, content_type.title()),
+            language=options.get("language", "en"),
+            grade_level=options.get("grade_level", "3"),
+            cache=cache,
+            latency_seconds=time.perf_counter() - started,
+            prompt_tokens=prompt_tokens,
+            output_tokens=output_tokens,
+            upstream_seconds=upstream_seconds,
+            fallback=fallback,
+            topic=prompt_text
+        )
+    
+    def _estimate_tokens(self, prompt: str, generation_config=None, image=None) -> int:
+        """Rough token estimate (about 4 characters per token) plus the output budget"""
+        output_budget = getattr(generation_config, "max_output_tokens", 0) or 0
+        return len(prompt) // 4 + output_budget + (IMAGE_INPUT_TOKENS if image is not None else 0)
+    
+    @staticmethod
+    def _with_image(contents, image):
+        """Request contents with the prepared image first, as Gemini recommends for single-image prompts"""
+        if image is None:
+            return contents
+        return [image.as_part(), contents]
+    
+    def _deadline_seconds(self, content_type: str, options: Dict[str, Any]) -> float:
+        """Time budget for one generation request; callers may pass deadline_seconds"""
+        if options.get("deadline_seconds"):
+            return float(options["deadline_seconds"])
+        return DEADLINE_SECONDS.get(content_type, DEFAULT_DEADLINE_SECONDS)
+    
+    def _model_and_config(self, **overrides):
+        """Gemini model and generation parameters used for educational content"""
+        return self._get_model(self.model_name), self._get_generation_config(**overrides)
+    
+    def _get_model(self, model_name: str, system_instruction: Optional[str] = None):
+        """
+        Reuse one GenerativeModel per model name and system instruction instead
+        of rebuilding it per request; the oldest is dropped past max_cached_models
+        """
+        key = (model_name, system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            with self._registry_lock:
+                model = self._models.get(key)
+                if model is None:
+                    if system_instruction is None:
+                        model = self.provider.create_model(model_name)
+                    else:
+                        model = self.provider.create_model(model_name, system_instruction=system_instruction)
+                    self._models[key] = model
+                    if len(self._models) > self.max_cached_models:
+                        del self._models[next(iter(self._models))]
+        return model
+    
+    async def _prompt_model(self, system_instruction: str, user_prompt: str):
+        """
+        (model, contents, prefix mode) for a split prompt. The static prefix is
+        sent as provider-side cached context when it is large enough, otherwise
+        as the model's system instruction; SDKs without system instructions get
+        the whole prompt inline, exactly as before.
+        """
+        if not (self.system_instruction_enabled and self.provider.supports_system_instruction):
+            return self._get_model(self.model_name), f"{system_instruction}\n\n{user_prompt}", "inline"
+        
+        if self._estimate_tokens(system_instruction) >= self.context_cache_min_tokens:
+            model = await self._context_model(system_instruction)
+            if model is not None:
+                return model, user_prompt, "context_cache"
+        return self._get_model(self.model_name, system_instruction), user_prompt, "system_instruction"
+    
+    async def _context_model(self, system_instruction: str):
+        """Model bound to cached context for this prefix, created once per TTL"""
+        key = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+        entry = self._context_models.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+        
+        async def create():
+            try:
+                model = await self._run_blocking(
+                    self.provider.create_cached_model,
+                    self.model_name, system_instruction, self.context_cache_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(f"Context caching unavailable, using system instruction: {e}")
+                model = None
+            # Refreshed a little before the provider expires it; failures are
+            # not retried until the same point
+            self._context_models[key] = (model, time.time() + self.context_cache_ttl_seconds * 0.9)
+            return model
         
-        return enhanced_prompt.strip()
+        return await self._single_flight.do(f"context:{key}", create)
+    
+    def _record_prefix(self, system_instruction: str, user_prompt: str, mode: str, response,
+                       upstream_seconds: Optional[float]):
+        usage = getattr(response, "usage_metadata", None)
+        self.prefix_reuse.record(
+            system_instruction,
+            mode,
+            prefix_tokens=self._estimate_tokens(system_instruction),
+            suffix_tokens=self._estimate_tokens(user_prompt),
+            upstream_seconds=upstream_seconds,
+            provider_cached_tokens=getattr(usage, "cached_content_token_count", 0) or 0
+        )
+    
+    def _request_generation_config(self, options: Dict[str, Any], length: str, language: str, content_type: str):
+        """
+        Generation config for one request. max_output_tokens comes from the
+        output budget unless the caller passes max_output_tokens (e.g. for
+        several worksheets in one response); response_mime_type asks for JSON
+        output where the SDK supports it.
+        """
+        return self._get_generation_config(
+            max_output_tokens=options.get("max_output_tokens")
+            or self.output_budget.max_output_tokens(length, language, content_type),
+            response_mime_type=options.get("response_mime_type")
+        )
+    
+    def _get_generation_config(self, temperature: float = 0.3, top_p: float = 0.95, top_k: int = 40,
+                               max_output_tokens: int = 800, candidate_count: int = 1,
+                               response_mime_type: Optional[str] = None):
+        """Reuse one GenerationConfig per distinct parameter set"""
+        key = (temperature, top_p, top_k, max_output_tokens, candidate_count, response_mime_type)
+        generation_config = self._generation_configs.get(key)
+        if generation_config is None:
+            with self._registry_lock:
+                generation_config = self._generation_configs.get(key)
+                if generation_config is None:
+                    # Defaults tuned for educational content: low temperature for
+                    # consistent, accurate responses. generate_text sizes
+                    # max_output_tokens per request from the output budget
+                    generation_config = self.provider.create_generation_config(
+                        temperature=temperature,
+                        top_p=top_p,
+                        top_k=top_k,
+                        max_output_tokens=max_output_tokens,
+                        candidate_count=candidate_count,
+                        **({"response_mime_type": response_mime_type} if response_mime_type else {})
+                    )
+                    self._generation_configs[key] = generation_config
+        return generation_config
+    
+    def _submit_blocking(self, func: Callable, priority: str = INTERACTIVE):
+        """Start a blocking SDK call on the executor for `priority` without waiting for it"""
+        executor = self._bulk_executor if priority == BULK else self._executor
+        asyncio.get_running_loop().run_in_executor(executor, functools.partial(self._tracked, priority, func))
+    
+    async def _run_blocking(self, func: Callable, *args, priority: str = INTERACTIVE, **kwargs):
+        """Run a blocking SDK call on the bounded executor for `priority` without stalling the event loop"""
+        executor = self._bulk_executor if priority == BULK else self._executor
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, functools.partial(self._tracked, priority, func, *args, **kwargs)
+        )
+    
+    def _tracked(self, priority: str, func: Callable, *args, **kwargs):
+        with self._blocking_lock:
+            self._blocking_calls[priority] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._blocking_lock:
+                self._blocking_calls[priority] -= 1
+    
+    def _cache_key(self, prompt_text: str, language: str, content_type: str,
+                   grade_level: str, subject: str, length: str, instructions: Optional[str] = None,
+                   image=None, max_output_tokens: Optional[int] = None,
+                   response_mime_type: Optional[str] = None) -> str:
+        """Cache key over everything that shapes the generated text"""
+        extra = {"instructions": instructions} if instructions else {}
+        if image is not None:
+            extra["image"] = image.digest
+        # A smaller budget can truncate and JSON output differs from prose
+        if max_output_tokens:
+            extra["max_output_tokens"] = max_output_tokens
+        if response_mime_type:
+            extra["response_mime_type"] = response_mime_type
+        return ResponseCache.make_key(
+            prompt_text,
+            language=language,
+            content_type=content_type,
+            grade_level=grade_level,
+            subject=subject,
+            length=length,
+            provider=self.provider.name,
+            model=self.model_name,
+            # Editing a template changes its version, which retires cached responses
+            template_version=PROMPTS.version(self._educational_template(language)),
+            **extra
+        )
+    
+    async def is_cached(self, prompt_text: str, **kwargs) -> bool:
+        """Whether generate_text with these arguments would be served from the response cache"""
+        if not self.cache_enabled:
+            return False
+        cache_key = self._cache_key(
+            prompt_text,
+            kwargs.get("language", "en"),
+            kwargs.get("content_type", "explanation"),
+            kwargs.get("grade_level", "3"),
+            kwargs.get("subject", "General"),
+            kwargs.get("length", "medium"),
+            kwargs.get("instructions"),
+            kwargs.get("image"),
+            kwargs.get("max_output_tokens"),
+            kwargs.get("response_mime_type")
+        )
+        return await self.response_cache.get(cache_key) is not None
+    
+    def estimate_request_tokens(self, prompt_text: str, **kwargs) -> int:
+        """Quota tokens one uncached generate_text call is expected to use"""
+        language = kwargs.get("language", "en")
+        content_type = kwargs.get("content_type", "explanation")
+        length = kwargs.get("length", "medium")
+        enhanced_prompt = self._create_educational_prompt(
+            prompt_text, language, content_type, kwargs.get("grade_level", "3"), length,
+            kwargs.get("subject", "General"), kwargs.get("instructions")
+        )
+        image_tokens = IMAGE_INPUT_TOKENS if kwargs.get("image") is not None else 0
+        return len(enhanced_prompt) // 4 + image_tokens + (
+            kwargs.get("max_output_tokens") or self.output_budget.max_output_tokens(length, language, content_type)
+        )
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Runtime counters for the generation pipeline"""
+        return {
+            "model_name": self.model_name,
+            "provider": self.provider.stats(),
+            "max_concurrency": self.max_concurrency,
+            "bulk_max_concurrency": self.bulk_max_concurrency,
+            "blocking_calls": dict(self._blocking_calls),
+            "cache_enabled": self.cache_enabled,
+            "cache": self.response_cache.stats(),
+            "scheduler": self.rate_limiter.stats(),
+            "circuit_breaker": self.circuit_breaker.stats(),
+            "retries": dict(self._resilience_counters),
+            "prompts": PROMPTS.stats(),
+            "single_flight": self._single_flight.stats(),
+            "output_budget": self.output_budget.stats(),
+            "semantic_cache": self.semantic_cache.stats(),
+            "prompt_prefix": self.prefix_reuse.stats()
+        }
+    
+    def _create_educational_prompt(self, prompt: str, language: str, content_type: str, 
+                                 grade_level: str, length: str = "medium", 
+                                 subject: str = "General", instructions: Optional[str] = None) -> str:
+        """Create educational prompt with enhanced structure"""
+        system_instruction, user_prompt = self._prompt_parts(
+            prompt, language, content_type, grade_level, length, subject, instructions
+        )
+        return f"{system_instruction}\n\n{user_prompt}"
+    
+    def _prompt_parts(self, prompt: str, language: str, content_type: str, grade_level: str,
+                      length: str = "medium", subject: str = "General",
+                      instructions: Optional[str] = None) -> Tuple[str, str]:
+        """
+        (system instruction, user prompt): the static persona, grade rules and
+        task instructions, then the short per-request part naming the topic
+        """
+        # Everything except the topic is precompiled once per
+        # (language, content type, grade, length)
+        prefix, user_prompt = _educational_variant(language, content_type, grade_level, length).split(topic=prompt)
+        system_instruction = prefix.strip()
+        if instructions:
+            system_instruction = f"{system_instruction}\n\n{instructions.strip()}"
+        return system_instruction, user_prompt
+    
+    def _educational_template(self, language: str) -> str:
+        """Name of the registered prompt template used for a language"""
+        if language in ("hi", "en"):
+            return f"educational.{language}"
+        return "educational.other"
     
     def _generate_educational_fallback(self, prompt: str, **kwargs) -> str:
         """Generate educational content when Google AI is not available"""
+        if kwargs.get("fallback") is False:
+            raise GenerationFailedError(f"No content generated for '{prompt}'")
+        
         language = kwargs.get("language", "en")
         grade_level = kwargs.get("grade_level", "3")
         
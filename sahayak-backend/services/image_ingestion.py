@@ -0,0 +1,256 @@
+import io
+import os
+import math
+import time
+import base64
+import asyncio
+import binascii
+import hashlib
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Optional
+
+from services.usage_metrics import Histogram
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Stage timings in milliseconds; a 12 MP phone photo decodes in tens of ms
+STAGE_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Gemini 1.5 bills every image as a fixed number of input tokens
+IMAGE_INPUT_TOKENS = 258
+
+# Leading bytes of the formats Gemini accepts, for passing images through without Pillow
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"RIFF", "image/webp"),
+)
+
+# Perceptual hash: the lowest 8x8 DCT frequencies of a 32x32 grayscale thumbnail
+_HASH_SIDE = 32
+_HASH_FREQUENCIES = 8
+_DCT_BASIS = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * _HASH_SIDE)) for x in range(_HASH_SIDE)]
+    for u in range(_HASH_FREQUENCIES)
+]
+
+class ImageIngestionError(ValueError):
+    """The upload is not a decodable image"""
+
+class PreparedImage:
+    """A downscaled, re-encoded image ready to send to the model with every prompt"""
+
+    def __init__(self, data: bytes, mime_type: str, width: int, height: int, original_bytes: int,
+                 timings_ms: Dict[str, float], phash: Optional[int] = None):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.original_bytes = original_bytes
+        self.timings_ms = timings_ms
+        self.digest = hashlib.sha256(data).hexdigest()
+        # Matches re-photographs of the same page; None when Pillow is missing
+        self.phash = phash
+
+    def as_part(self) -> Dict[str, Any]:
+        """Inline data part in the google-generativeai content format"""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "height": self.height,
+            "original_bytes": self.original_bytes,
+            "prepared_bytes": len(self.data),
+            "bytes_saved": self.original_bytes - len(self.data),
+            **{f"{stage}_ms": round(ms, 1) for stage, ms in self.timings_ms.items()}
+        }
+
+def perceptual_hash(image: "Image.Image") -> int:
+    """
+    63-bit DCT hash (pHash) of a decoded image. The sign of each low frequency
+    against the median survives scaling, JPEG re-encoding, lighting and small
+    crops or tilts, so two phone photos of one page differ in a few bits while
+    different pages differ in well over ten.
+    """
+    pixels = list(image.convert("L").resize((_HASH_SIDE, _HASH_SIDE), Image.LANCZOS).getdata())
+    rows = [
+        [sum(c * p for c, p in zip(basis, pixels[y * _HASH_SIDE:(y + 1) * _HASH_SIDE])) for basis in _DCT_BASIS]
+        for y in range(_HASH_SIDE)
+    ]
+    coefficients = [
+        sum(basis[y] * rows[y][v] for y in range(_HASH_SIDE))
+        for basis in _DCT_BASIS for v in range(_HASH_FREQUENCIES)
+    ][1:]  # the DC term is overall brightness
+    median = sorted(coefficients)[len(coefficients) // 2]
+    value = 0
+    for coefficient in coefficients:
+        value = value << 1 | (coefficient > median)
+    return value
+
+def hash_distance(a: int, b: int) -> int:
+    """Number of differing bits between two perceptual hashes"""
+    return (a ^ b).bit_count()
+
+def decode_base64_image(text: str) -> bytes:
+    """Image bytes from a base64 string, with or without a data: URL prefix"""
+    if text.startswith("data:"):
+        text = text.partition(",")[2]
+    try:
+        return base64.b64decode("".join(text.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise ImageIngestionError(f"image is not valid base64: {e}")
+
+class ImageIngestor:
+    """
+    Decodes an upload once, then downscales and re-encodes it as JPEG on a
+    small worker pool, so every grade of a worksheet request sends the same
+    compact image. Pillow releases the GIL while decoding and resampling, so
+    threads run in parallel without copying the photo to another process.
+    """
+
+    def __init__(self, max_side: int = 1024, quality: int = 80, max_workers: int = 2,
+                 max_pixels: int = 50_000_000, recent_uploads: int = 16):
+        self.max_side = max_side
+        self.quality = quality
+        self.max_pixels = max_pixels
+        self.recent_uploads = recent_uploads
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="image")
+        self._lock = threading.Lock()
+        # Prepared images of recent uploads by the SHA-256 taken while they streamed in
+        self._recent: "OrderedDict[str, PreparedImage]" = OrderedDict()
+        self._counters = {"images": 0, "reused": 0, "failed": 0, "original_bytes": 0, "prepared_bytes": 0}
+        self._stages = {
+            stage: Histogram(STAGE_BUCKETS_MS) for stage in ("decode", "resize", "encode", "hash", "total")
+        }
+
+    async def prepare_base64(self, text: str) -> PreparedImage:
+        """Base64 upload to prepared image, entirely off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, lambda: self.prepare(decode_base64_image(text))
+        )
+
+    async def prepare_upload(self, upload) -> PreparedImage:
+        """
+        Streamed upload (services.uploads.StreamedFile) to prepared image. The
+        spooled file is decoded in place; a re-sent upload with the same hash
+        reuses the earlier result.
+        """
+        with self._lock:
+            image = self._recent.get(upload.sha256)
+            if image is not None:
+                self._recent.move_to_end(upload.sha256)
+                self._counters["reused"] += 1
+                return image
+
+        image = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.prepare_file, upload.file, upload.size
+        )
+        with self._lock:
+            self._recent[upload.sha256] = image
+            while len(self._recent) > self.recent_uploads:
+                self._recent.popitem(last=False)
+        return image
+
+    def prepare(self, data: bytes) -> PreparedImage:
+        """Blocking: decode, downscale to `max_side`, re-encode and hash"""
+        return self.prepare_file(io.BytesIO(data), len(data))
+
+    def prepare_file(self, source: BinaryIO, size: int) -> PreparedImage:
+        """Blocking: `prepare` for an open file of `size` bytes, read from its current position"""
+        try:
+            image = self._prepare(source, size) if PIL_AVAILABLE else self._passthrough(source.read(), size)
+        except ImageIngestionError:
+            self._count_failure()
+            raise
+        except Exception as e:
+            self._count_failure()
+            raise ImageIngestionError(f"could not decode image: {e}")
+
+        with self._lock:
+            self._counters["images"] += 1
+            self._counters["original_bytes"] += image.original_bytes
+            self._counters["prepared_bytes"] += len(image.data)
+            for stage, ms in image.timings_ms.items():
+                self._stages[stage].observe(ms)
+        logger.info("Prepared image", extra=image.report())
+        return image
+
+    def _prepare(self, source: BinaryIO, size: int) -> PreparedImage:
+        started = time.perf_counter()
+        image = Image.open(source)
+        if image.width * image.height > self.max_pixels:
+            raise ImageIngestionError(f"image is larger than {self.max_pixels} pixels")
+        # JPEG can decode straight at 1/2, 1/4 or 1/8 scale, skipping most of the work
+        image.draft("RGB", (self.max_side, self.max_side))
+        image.load()
+        decoded = time.perf_counter()
+
+        # Phone cameras store rotation in EXIF instead of rotating the pixels
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        resized = time.perf_counter()
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=self.quality, optimize=True)
+        encoded = time.perf_counter()
+
+        phash = perceptual_hash(image)
+        hashed = time.perf_counter()
+
+        return PreparedImage(output.getvalue(), "image/jpeg", image.width, image.height, size, {
+            "decode": (decoded - started) * 1000,
+            "resize": (resized - decoded) * 1000,
+            "encode": (encoded - resized) * 1000,
+            "hash": (hashed - encoded) * 1000,
+            "total": (hashed - started) * 1000
+        }, phash)
+
+    def _passthrough(self, data: bytes, size: int) -> PreparedImage:
+        for signature, mime_type in _SIGNATURES:
+            if data.startswith(signature):
+                return PreparedImage(data, mime_type, 0, 0, size, {"total": 0.0})
+        raise ImageIngestionError("unsupported image format")
+
+    def _count_failure(self):
+        with self._lock:
+            self._counters["failed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {stage: histogram.to_dict() for stage, histogram in self._stages.items()}
+        return {
+            **counters,
+            "resizing": PIL_AVAILABLE,
+            "max_side": self.max_side,
+            "bytes_saved": counters["original_bytes"] - counters["prepared_bytes"],
+            "size_ratio": round(counters["prepared_bytes"] / counters["original_bytes"], 3)
+            if counters["original_bytes"] else 0.0,
+            "stage_ms": stages
+        }
+
+@functools.lru_cache(maxsize=None)
+def image_ingestor() -> ImageIngestor:
+    """Shared ingestor configured from WORKSHEET_IMAGE_* settings"""
+    if not PIL_AVAILABLE:
+        logger.warning("Pillow not installed; worksheet images are sent without resizing")
+    return ImageIngestor(
+        max_side=int(os.getenv("WORKSHEET_IMAGE_MAX_SIDE", "1024")),
+        quality=int(os.getenv("WORKSHEET_IMAGE_QUALITY", "80")),
+        max_workers=int(os.getenv("WORKSHEET_IMAGE_WORKERS", "2")),
+        max_pixels=int(os.getenv("WORKSHEET_IMAGE_MAX_PIXELS", "50000000")),
+        recent_uploads=int(os.getenv("WORKSHEET_IMAGE_RECENT_UPLOADS", "16"))
+    )
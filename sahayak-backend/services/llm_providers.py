@@ -0,0 +1,299 @@
+import os
+import math
+import time
+import random
+import inspect
+import datetime
+import functools
+import logging
+import threading
+from typing import Dict, Any, Iterator, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+class LLMProvider:
+    """
+    Backend behind GenkitAIService. Models returned by a provider follow the
+    google.generativeai surface: generate_content(prompt, generation_config=...,
+    stream=...) returning an object with `.text`, or an iterable of chunks.
+    """
+
+    name = "base"
+
+    def configure(self) -> bool:
+        """Prepare the backend; returns whether it can serve requests"""
+        raise NotImplementedError
+
+    @property
+    def supports_system_instruction(self) -> bool:
+        """Whether create_model accepts a system instruction kept apart from the prompt"""
+        return False
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None):
+        raise NotImplementedError
+
+    def create_cached_model(self, model_name: str, system_instruction: str, ttl_seconds: float):
+        """Model bound to provider-side cached context, or None when unsupported"""
+        return None
+
+    def create_generation_config(self, **params):
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through the google-generativeai SDK (the default)"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    def configure(self) -> bool:
+        if not self.api_key:
+            logger.warning("Google AI API key not configured; add GOOGLE_AI_API_KEY to .env file")
+            return False
+        genai.configure(api_key=self.api_key)
+        return True
+
+    @property
+    def supports_system_instruction(self) -> bool:
+        return _accepts_system_instruction(genai.GenerativeModel)
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None):
+        if system_instruction is None:
+            return genai.GenerativeModel(model_name)
+        return genai.GenerativeModel(model_name, system_instruction=system_instruction)
+
+    def create_cached_model(self, model_name: str, system_instruction: str, ttl_seconds: float):
+        # Explicit context caching arrived in google-generativeai 0.7 and needs
+        # a versioned model name (e.g. gemini-1.5-flash-001)
+        caching = getattr(genai, "caching", None)
+        if caching is None:
+            return None
+        cached_content = caching.CachedContent.create(
+            model=f"models/{model_name}",
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content)
+
+    def create_generation_config(self, **params):
+        # response_mime_type (JSON mode) needs google-generativeai 0.5 or later
+        if "response_mime_type" in params and not _accepts_parameter(genai.types.GenerationConfig, "response_mime_type"):
+            params.pop("response_mime_type")
+        return genai.types.GenerationConfig(**params)
+
+@functools.lru_cache(maxsize=16)
+def _accepts_parameter(sdk_class, name: str) -> bool:
+    try:
+        return name in inspect.signature(sdk_class).parameters
+    except (TypeError, ValueError):
+        return False
+
+def _accepts_system_instruction(model_class) -> bool:
+    # google-generativeai added system_instruction in 0.5; older SDKs only take the prompt
+    return _accepts_parameter(model_class, "system_instruction")
+
+class OfflineGenerationConfig:
+    def __init__(self, temperature: float = 0.3, top_p: float = 0.95, top_k: int = 40,
+                 max_output_tokens: int = 800, candidate_count: int = 1,
+                 response_mime_type: Optional[str] = None):
+        self.response_mime_type = response_mime_type
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.max_output_tokens = max_output_tokens
+        self.candidate_count = candidate_count
+
+class OfflineResponse:
+    def __init__(self, text: str, finish_reason: str = "STOP"):
+        self.text = text
+        self.candidates = [_OfflineCandidate(finish_reason)]
+
+class _OfflineCandidate:
+    def __init__(self, finish_reason: str):
+        self.finish_reason = finish_reason
+
+class OfflineTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+class _OfflineCall:
+    """Stands in for the SDK's cancellable gRPC call"""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class OfflineStream:
+    """Streams the response in chunks at the configured token throughput"""
+
+    CHUNK_WORDS = 15
+
+    def __init__(self, text: str, first_token_seconds: float, seconds_per_word: float):
+        self._words = text.split(" ")
+        self._first_token_seconds = first_token_seconds
+        self._seconds_per_word = seconds_per_word
+        self._iterator = _OfflineCall()
+
+    def __iter__(self) -> Iterator[OfflineResponse]:
+        time.sleep(self._first_token_seconds)
+        for start in range(0, len(self._words), self.CHUNK_WORDS):
+            if self._iterator.cancelled:
+                return
+            words = self._words[start:start + self.CHUNK_WORDS]
+            time.sleep(len(words) * self._seconds_per_word)
+            yield OfflineResponse(" ".join(words) + (" " if start + self.CHUNK_WORDS < len(self._words) else ""))
+
+class OfflineModel:
+    def __init__(self, model_name: str, provider: "OfflineProvider", system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self._provider = provider
+
+    def generate_content(self, prompt, generation_config=None, stream: bool = False, **kwargs):
+        if isinstance(prompt, list):
+            # Multimodal contents: the stand-in only reads the text parts
+            prompt = "\n".join(part for part in prompt if isinstance(part, str))
+        return self._provider.respond(self.model_name, prompt, generation_config, stream)
+
+    def count_tokens(self, contents) -> OfflineTokenCount:
+        # The stand-in emits about 0.75 words per token
+        return OfflineTokenCount(math.ceil(len(str(contents).split()) / 0.75))
+
+# Vocabulary for the stand-in's filler text
+_FILLER = (
+    "Students observe how this works in everyday life at home and in school.",
+    "A simple example helps the class connect the idea to familiar places in India.",
+    "The teacher can ask the children to explain each step in their own words.",
+    "Key words are repeated so that young learners remember them easily.",
+    "A short activity at the end lets every child practise what they learned.",
+    "Pictures and stories make the concept clear for different grade levels."
+)
+
+class OfflineProvider(LLMProvider):
+    """
+    Deterministic local stand-in for load testing and benchmarks: no network,
+    no quota. Latency, failures and output length come from a seeded RNG, so a
+    run is reproducible; the text for a given prompt is always the same.
+    """
+
+    name = "offline"
+
+    def __init__(self, latency_ms: float = 800, latency_distribution: str = "lognormal",
+                 latency_spread: float = 0.5, error_rate: float = 0.0,
+                 tokens_per_second: float = 200, output_tokens: int = 300, seed: int = 42):
+        self.latency_ms = max(0.0, latency_ms)
+        self.latency_distribution = latency_distribution
+        self.latency_spread = max(0.0, latency_spread)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self.tokens_per_second = max(1.0, tokens_per_second)
+        self.output_tokens = max(1, output_tokens)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "injected_errors": 0, "output_tokens": 0}
+
+    @classmethod
+    def from_env(cls) -> "OfflineProvider":
+        return cls(
+            latency_ms=float(os.getenv("OFFLINE_LLM_LATENCY_MS", "800")),
+            latency_distribution=os.getenv("OFFLINE_LLM_LATENCY_DISTRIBUTION", "lognormal").lower(),
+            latency_spread=float(os.getenv("OFFLINE_LLM_LATENCY_SPREAD", "0.5")),
+            error_rate=float(os.getenv("OFFLINE_LLM_ERROR_RATE", "0")),
+            tokens_per_second=float(os.getenv("OFFLINE_LLM_TOKENS_PER_SECOND", "200")),
+            output_tokens=int(os.getenv("OFFLINE_LLM_OUTPUT_TOKENS", "300")),
+            seed=int(os.getenv("OFFLINE_LLM_SEED", "42"))
+        )
+
+    def configure(self) -> bool:
+        logger.info("Using offline LLM provider", extra={
+            "latency_ms": self.latency_ms,
+            "latency_distribution": self.latency_distribution,
+            "error_rate": self.error_rate,
+            "tokens_per_second": self.tokens_per_second
+        })
+        return True
+
+    @property
+    def supports_system_instruction(self) -> bool:
+        return True
+
+    def create_model(self, model_name: str, system_instruction: Optional[str] = None) -> OfflineModel:
+        return OfflineModel(model_name, self, system_instruction)
+
+    def create_generation_config(self, **params) -> OfflineGenerationConfig:
+        return OfflineGenerationConfig(**params)
+
+    def respond(self, model_name: str, prompt: str, generation_config=None, stream: bool = False):
+        max_tokens = getattr(generation_config, "max_output_tokens", None) or self.output_tokens
+        tokens = min(max_tokens, self.output_tokens)
+        with self._lock:
+            self.counters["calls"] += 1
+            first_token_seconds = self._sample_latency()
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.counters["injected_errors"] += 1
+            else:
+                self.counters["output_tokens"] += tokens
+
+        if failed:
+            time.sleep(first_token_seconds)
+            raise google_exceptions.ServiceUnavailable("Offline provider injected failure")
+
+        text = self._text_for(model_name, prompt, tokens)
+        # About 0.75 words per token
+        seconds_per_word = 1 / (self.tokens_per_second * 0.75)
+        if stream:
+            return OfflineStream(text, first_token_seconds, seconds_per_word)
+        time.sleep(first_token_seconds + len(text.split(" ")) * seconds_per_word)
+        return OfflineResponse(text, "MAX_TOKENS" if max_tokens < self.output_tokens else "STOP")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "latency_ms": self.latency_ms,
+            "latency_distribution": self.latency_distribution,
+            "error_rate": self.error_rate,
+            "tokens_per_second": self.tokens_per_second,
+            **self.counters
+        }
+
+    def _sample_latency(self) -> float:
+        """Time to first token in seconds; latency_ms is the median"""
+        median = self.latency_ms / 1000
+        if self.latency_distribution == "fixed":
+            return median
+        if self.latency_distribution == "uniform":
+            return max(0.0, self._random.uniform(median * (1 - self.latency_spread),
+                                                 median * (1 + self.latency_spread)))
+        if median <= 0:
+            return 0.0
+        return self._random.lognormvariate(math.log(median), self.latency_spread)
+
+    @staticmethod
+    def _text_for(model_name: str, prompt: str, tokens: int) -> str:
+        rng = random.Random(f"{model_name}:{prompt}")
+        topic = " ".join(prompt.strip().split()[:12])
+        sentences = [f"This is offline content for: {topic}."]
+        words = len(sentences[0].split())
+        target_words = max(1, int(tokens * 0.75))
+        while words < target_words:
+            sentence = rng.choice(_FILLER)
+            sentences.append(sentence)
+            words += len(sentence.split())
+        return " ".join(sentences)
+
+def provider_from_env(api_key: Optional[str] = None) -> LLMProvider:
+    """LLM_PROVIDER=gemini (default) or offline"""
+    name = os.getenv("LLM_PROVIDER", "gemini").lower()
+    if name == "offline":
+        return OfflineProvider.from_env()
+    if name != "gemini":
+        logger.warning(f"Unknown LLM_PROVIDER '{name}', using gemini")
+    return GeminiProvider(api_key if api_key is not None else os.getenv("GOOGLE_AI_API_KEY", ""))
@@ -0,0 +1,113 @@
+import math
+import threading
+from typing import Dict, Any, Tuple
+
+# Starting tokens-per-word for Gemini's tokenizer, replaced by measurements as
+# they arrive. Latin-script English is a little over one token per word;
+# Devanagari and the Dravidian scripts split into several tokens per word.
+TOKENS_PER_WORD_PRIORS = {
+    "en": 1.4,
+    "hi": 3.0,
+    "mr": 3.2,
+    "ur": 2.6,
+    "ta": 4.0,
+    "te": 4.0,
+    "kn": 4.2,
+    "ml": 4.5
+}
+DEFAULT_TOKENS_PER_WORD = 3.0
+
+# Output beyond the counted words: markdown headings, numbered questions,
+# answer keys and activity steps
+CONTENT_TYPE_OVERHEAD = {
+    "worksheet": 1.6,
+    "lesson_plan": 1.3,
+    "assessment": 1.3,
+    "visual": 1.2
+}
+DEFAULT_OVERHEAD = 1.15
+
+class OutputBudget:
+    """
+    max_output_tokens per (length, language, content_type), sized from the
+    requested word limit and measured tokens-per-word instead of one fixed
+    budget. A response cut off by the budget widens the budget for its key.
+    """
+
+    def __init__(self, word_limits: Dict[str, Dict[str, int]], slack: float = 1.25,
+                 floor: int = 128, ceiling: int = 2048, step: int = 64,
+                 smoothing: float = 0.2, min_samples: int = 5, stream_stop_factor: float = 1.2):
+        self.word_limits = word_limits
+        self.slack = slack
+        self.floor = floor
+        self.ceiling = max(floor, ceiling)
+        self.step = max(1, step)
+        self.smoothing = smoothing
+        self.min_samples = min_samples
+        self.stream_stop_factor = stream_stop_factor
+        # language -> [ewma tokens per word, samples]
+        self._measured: Dict[str, list] = {}
+        # (length, language, content_type) -> multiplier raised on truncation
+        self._widened: Dict[Tuple[str, str, str], float] = {}
+        self._lock = threading.Lock()
+        self.counters = {"truncated": 0, "streams_stopped_early": 0, "measurements": 0}
+
+    def max_words(self, length: str) -> int:
+        return self.word_limits.get(length, self.word_limits["medium"])["max"]
+
+    def stream_word_limit(self, length: str) -> int:
+        """Word count past which a streamed response has clearly overrun its limit"""
+        return math.ceil(self.max_words(length) * self.stream_stop_factor)
+
+    def tokens_per_word(self, language: str) -> float:
+        measured = self._measured.get(language)
+        if measured and measured[1] >= self.min_samples:
+            return measured[0]
+        return TOKENS_PER_WORD_PRIORS.get(language, DEFAULT_TOKENS_PER_WORD)
+
+    def max_output_tokens(self, length: str, language: str, content_type: str) -> int:
+        tokens = (
+            self.max_words(length)
+            * self.tokens_per_word(language)
+            * CONTENT_TYPE_OVERHEAD.get(content_type, DEFAULT_OVERHEAD)
+            * self.slack
+            * self._widened.get((length, language, content_type), 1.0)
+        )
+        # Round up to a step so nearby budgets share one generation config
+        tokens = math.ceil(tokens / self.step) * self.step
+        return min(self.ceiling, max(self.floor, tokens))
+
+    def observe(self, language: str, words: int, output_tokens: int):
+        """Fold one measured response into the language's tokens-per-word ratio"""
+        if words < 20 or output_tokens <= 0:
+            return
+        ratio = output_tokens / words
+        with self._lock:
+            self.counters["measurements"] += 1
+            measured = self._measured.get(language)
+            if measured is None:
+                self._measured[language] = [ratio, 1]
+            else:
+                measured[0] += self.smoothing * (ratio - measured[0])
+                measured[1] += 1
+
+    def record_truncation(self, length: str, language: str, content_type: str):
+        key = (length, language, content_type)
+        with self._lock:
+            self.counters["truncated"] += 1
+            self._widened[key] = min(2.0, self._widened.get(key, 1.0) * 1.15)
+
+    def record_early_stop(self):
+        with self._lock:
+            self.counters["streams_stopped_early"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "tokens_per_word": {
+                    language: {"ratio": round(ratio, 2), "samples": samples}
+                    for language, (ratio, samples) in self._measured.items()
+                },
+                "widened": {"/".join(key): round(factor, 2) for key, factor in self._widened.items()}
+            }
@@ -0,0 +1,317 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+from services.image_ingestion import PreparedImage, hash_distance
+from services.prompt_templates import PROMPTS
+from services.response_cache import backend_path
+from services.rate_limiter import QuotaExceededError, BULK
+from services.single_flight import SingleFlight
+from services.usage_metrics import Histogram
+from services.worksheet_sets import extract_json
+
+logger = logging.getLogger(__name__)
+
+# Bit distances of near (not identical) hash matches
+DISTANCE_BUCKETS = (1, 2, 4, 6, 8, 12)
+
+class PageAnalysis(BaseModel):
+    """Structured content of one textbook page, extracted once and reused for every grade"""
+
+    title: str = ""
+    summary: str = ""
+    concepts: List[str] = Field(min_length=1)
+    vocabulary: List[str] = Field(default_factory=list)
+    exercises: List[str] = Field(default_factory=list)
+    diagrams: List[str] = Field(default_factory=list)
+
+    @field_validator("vocabulary", mode="before")
+    @classmethod
+    def _vocabulary_text(cls, vocabulary: Any) -> Any:
+        # Terms sometimes come back as {"term", "meaning"}
+        if not isinstance(vocabulary, list):
+            return vocabulary
+        return [
+            f"{item['term']}: {item.get('meaning', '')}".rstrip(": ")
+            if isinstance(item, dict) and "term" in item else item
+            for item in vocabulary
+        ]
+
+    def render(self) -> str:
+        """Plain-text page description used in place of the image in worksheet prompts"""
+        lines = []
+        if self.title:
+            lines.append(f"Page title: {self.title}")
+        if self.summary:
+            lines.append(f"Summary: {self.summary}")
+        for heading, items in (
+            ("Main concepts", self.concepts),
+            ("Key vocabulary", self.vocabulary),
+            ("Exercises on the page", self.exercises),
+            ("Diagrams and illustrations", self.diagrams)
+        ):
+            if items:
+                lines.append(f"{heading}:")
+                lines.extend(f"- {item}" for item in items)
+        return "\n".join(lines)
+
+def parse_page_analysis(text: str) -> Optional[PageAnalysis]:
+    """The analysis in a model response, or None when it is missing or malformed"""
+    try:
+        return PageAnalysis.model_validate(extract_json(text))
+    except (ValueError, ValidationError) as e:
+        logger.debug(f"Invalid page analysis: {e}")
+        return None
+
+class PageAnalysisCache:
+    """
+    Page analyses keyed by the perceptual hash of the page photo. A lookup
+    returns the closest entry within `max_distance` bits, so a page photographed
+    again (by another teacher, for another grade, on a retry) matches. The
+    in-process index is scanned linearly (a few thousand XORs); the SQLite tier
+    is shared with the response cache file and picked up by other workers.
+    """
+
+    def __init__(self, max_distance: int = 8, max_entries: int = 5000, ttl_seconds: float = 30 * 86400,
+                 disk_path: str = ""):
+        self.max_distance = max_distance
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+
+        self._memory: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._synced_rowid = 0
+
+        self.distance = Histogram(DISTANCE_BUCKETS)
+        self.counters = {
+            "lookups": 0,
+            "exact_hits": 0,
+            "near_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "disk_errors": 0
+        }
+
+        if self.disk_path:
+            try:
+                directory = os.path.dirname(self.disk_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = self._connection()
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS page_analyses ("
+                    "phash TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, "
+                    "expires_at REAL NOT NULL)"
+                )
+                connection.commit()
+            except Exception as e:
+                logger.warning(f"Page analysis disk cache disabled, could not open {self.disk_path}: {e}")
+                self.disk_path = ""
+
+    async def get(self, phash: int) -> Optional[Tuple[PageAnalysis, int]]:
+        """Closest cached analysis and its hash distance, or None"""
+        match = self._nearest(phash)
+        if match is None and self.disk_path:
+            # Pages analysed by other workers since the last look
+            await asyncio.to_thread(self._sync_disk)
+            match = self._nearest(phash)
+
+        with self._lock:
+            self.counters["lookups"] += 1
+            if match is None:
+                self.counters["misses"] += 1
+                return None
+            value, distance = match
+            if distance:
+                self.counters["near_hits"] += 1
+                self.distance.observe(distance)
+            else:
+                self.counters["exact_hits"] += 1
+        return PageAnalysis.model_validate_json(value), distance
+
+    async def set(self, phash: int, analysis: PageAnalysis):
+        value = analysis.model_dump_json()
+        now = time.time()
+        self._set_memory(phash, value, now + self.ttl_seconds)
+        with self._lock:
+            self.counters["writes"] += 1
+        if self.disk_path:
+            await asyncio.to_thread(self._set_disk, phash, value, now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            entries = len(self._memory)
+            distance = self.distance.to_dict()
+        hits = counters["exact_hits"] + counters["near_hits"]
+        return {
+            **counters,
+            "hit_ratio": round(hits / counters["lookups"], 3) if counters["lookups"] else 0.0,
+            "entries": entries,
+            "max_distance": self.max_distance,
+            "near_hit_distance": distance,
+            "disk_path": self.disk_path or None
+        }
+
+    def _nearest(self, phash: int) -> Optional[Tuple[str, int]]:
+        now = time.time()
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            for key, (value, expires_at) in self._memory.items():
+                distance = hash_distance(phash, key)
+                if distance < best_distance and expires_at > now:
+                    best, best_distance = key, distance
+            if best is None:
+                return None
+            self._memory.move_to_end(best)
+            return self._memory[best][0], best_distance
+
+    def _set_memory(self, phash: int, value: str, expires_at: float):
+        with self._lock:
+            self._memory[phash] = (value, expires_at)
+            self._memory.move_to_end(phash)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.disk_path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _sync_disk(self):
+        # By rowid, not created_at: SQLite has one writer at a time, so rowids
+        # are handed out in commit order (a replaced row gets a new, larger
+        # one), while a created_at stamped before a slow commit can fall
+        # behind rows other workers committed first
+        try:
+            now = time.time()
+            rows = self._connection().execute(
+                "SELECT rowid, phash, value, expires_at FROM page_analyses "
+                "WHERE rowid > ? AND expires_at > ? ORDER BY rowid DESC LIMIT ?",
+                (self._synced_rowid, now, self.max_entries)
+            ).fetchall()
+        except Exception as e:
+            with self._lock:
+                self.counters["disk_errors"] += 1
+            logger.warning(f"Page analysis disk read failed: {e}")
+            return
+        # Oldest first, so the most recent pages end up most recently used
+        for rowid, phash, value, expires_at in reversed(rows):
+            self._set_memory(int(phash, 16), value, expires_at)
+            self._synced_rowid = max(self._synced_rowid, rowid)
+
+    def _set_disk(self, phash: int, value: str, created_at: float):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO page_analyses (phash, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (f"{phash:016x}", value, created_at, created_at + self.ttl_seconds)
+            )
+            connection.commit()
+        except Exception as e:
+            with self._lock:
+                self.counters["disk_errors"] += 1
+            logger.warning(f"Page analysis disk write failed: {e}")
+
+class PageAnalyzer:
+    """
+    Turns a textbook page photo into a PageAnalysis with one multimodal call,
+    served from PageAnalysisCache when the same page was seen before. Concurrent
+    uploads of one photo share a single call.
+    """
+
+    def __init__(self, cache: PageAnalysisCache):
+        self.cache = cache
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.counters = {"analyses": 0, "failed": 0, "uncacheable": 0}
+        self._analysis_seconds = 0.0
+
+    async def analyze(self, ai_service, image: PreparedImage,
+                      deadline_seconds: Optional[float] = None) -> Optional[PageAnalysis]:
+        """The page's analysis, or None when the model did not return a usable one in time"""
+        if image.phash is None:
+            # Without Pillow there is no normalized image to hash
+            with self._lock:
+                self.counters["uncacheable"] += 1
+            return await self._analyze(ai_service, image, deadline_seconds)
+
+        cached = await self.cache.get(image.phash)
+        if cached is not None:
+            analysis, distance = cached
+            logger.info("Page analysis cache hit", extra={"hash_distance": distance})
+            return analysis
+
+        async def analyze_and_store() -> Optional[PageAnalysis]:
+            analysis = await self._analyze(ai_service, image, deadline_seconds)
+            if analysis is not None:
+                await self.cache.set(image.phash, analysis)
+            return analysis
+
+        return await self._single_flight.do(f"{image.phash:016x}", analyze_and_store)
+
+    async def _analyze(self, ai_service, image: PreparedImage,
+                       deadline_seconds: Optional[float]) -> Optional[PageAnalysis]:
+        started = time.perf_counter()
+        try:
+            response = await ai_service.generate_text(
+                "Textbook page analysis",
+                instructions=PROMPTS.render("worksheet.page_analysis"),
+                language="en",
+                content_type="page_analysis",
+                length="medium",
+                priority=BULK,
+                image=image,
+                response_mime_type="application/json",
+                deadline_seconds=deadline_seconds,
+                fallback=False
+            )
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            logger.warning(f"Page analysis failed: {e}")
+            response = ""
+
+        analysis = parse_page_analysis(response)
+        with self._lock:
+            self.counters["analyses"] += 1
+            self._analysis_seconds += time.perf_counter() - started
+            if analysis is None:
+                self.counters["failed"] += 1
+        return analysis
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            seconds = self._analysis_seconds
+        return {
+            **counters,
+            "avg_analysis_ms": round(seconds * 1000 / counters["analyses"], 1) if counters["analyses"] else 0.0,
+            "coalesced": self._single_flight.counters["coalesced"],
+            "cache": self.cache.stats()
+        }
+
+@functools.lru_cache(maxsize=None)
+def page_analyzer() -> PageAnalyzer:
+    """Shared analyzer configured from WORKSHEET_PAGE_ANALYSIS_* settings"""
+    cache_enabled = os.getenv("GOOGLE_AI_CACHE_ENABLED", "true").lower() == "true"
+    return PageAnalyzer(PageAnalysisCache(
+        max_distance=int(os.getenv("WORKSHEET_PAGE_ANALYSIS_MAX_DISTANCE", "8")),
+        max_entries=int(os.getenv("WORKSHEET_PAGE_ANALYSIS_MAX_ENTRIES", "5000")),
+        ttl_seconds=float(os.getenv("WORKSHEET_PAGE_ANALYSIS_TTL_SECONDS", str(30 * 86400))),
+        disk_path=backend_path(os.getenv("GOOGLE_AI_CACHE_PATH", "cache/responses.sqlite3")) if cache_enabled else ""
+    ))
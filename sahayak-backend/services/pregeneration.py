@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import datetime
+import functools
+import itertools
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+from services.batch import run_bounded
+from services.rate_limiter import QuotaExceededError, BULK
+from services.response_cache import backend_path
+
+logger = logging.getLogger(__name__)
+
+# endpoint name -> (request model, router's generation_args)
+EndpointBuilders = Dict[str, Tuple[Type[BaseModel], Callable[[Any], Tuple[str, Dict[str, Any]]]]]
+
+class TopicTraffic:
+    """
+    Per-day request counts by endpoint and request parameters. Kept in SQLite
+    so a pre-generation run in another process can read the most requested
+    topics of recent days.
+    """
+
+    def __init__(self, path: str, retention_days: int = 90):
+        self.path = path
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._pruned_day = None
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS topic_requests ("
+            "endpoint TEXT NOT NULL, params TEXT NOT NULL, day INTEGER NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (endpoint, params, day))"
+        )
+        connection.commit()
+
+    def record(self, endpoint: str, params: Dict[str, Any]):
+        day = _today()
+        normalized = {
+            name: " ".join(value.split()) if isinstance(value, str) else value for name, value in params.items()
+        }
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT INTO topic_requests (endpoint, params, day, count) VALUES (?, ?, ?, 1) "
+                "ON CONFLICT (endpoint, params, day) DO UPDATE SET count = count + 1",
+                (endpoint, json.dumps(normalized, sort_keys=True, ensure_ascii=False), day)
+            )
+            if self._pruned_day != day:
+                connection.execute("DELETE FROM topic_requests WHERE day < ?", (day - self.retention_days,))
+                self._pruned_day = day
+            connection.commit()
+        except Exception as e:
+            logger.warning(f"Could not record topic request: {e}")
+
+    def top(self, days: int = 14, limit: int = 100) -> List[Tuple[str, Dict[str, Any], int]]:
+        """(endpoint, params, requests) for the most requested topics, busiest first"""
+        rows = self._connection().execute(
+            "SELECT endpoint, params, SUM(count) AS requests FROM topic_requests WHERE day > ? "
+            "GROUP BY endpoint, params ORDER BY requests DESC LIMIT ?",
+            (_today() - days, limit)
+        ).fetchall()
+        return [(endpoint, json.loads(params), requests) for endpoint, params, requests in rows]
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+def _today() -> int:
+    return datetime.date.today().toordinal()
+
+@functools.lru_cache(maxsize=None)
+def topic_traffic() -> Optional[TopicTraffic]:
+    """Shared traffic log; PREGEN_TRAFFIC_PATH= (empty) turns recording off"""
+    path = backend_path(os.getenv("PREGEN_TRAFFIC_PATH", "cache/traffic.sqlite3"))
+    if not path:
+        return None
+    try:
+        return TopicTraffic(path)
+    except Exception as e:
+        logger.warning(f"Topic traffic disabled, could not open {path}: {e}")
+        return None
+
+def record_request(endpoint: str, request: BaseModel):
+    """Count a request toward the most requested topics, off the event loop"""
+    traffic = topic_traffic()
+    if traffic is None:
+        return
+    params = request.model_dump()
+    try:
+        asyncio.get_running_loop().run_in_executor(None, traffic.record, endpoint, params)
+    except RuntimeError:
+        traffic.record(endpoint, params)
+
+def traffic_specs(traffic: TopicTraffic, days: int = 14, limit: int = 100) -> List[Dict[str, Any]]:
+    return [{"endpoint": endpoint, **params} for endpoint, params, _ in traffic.top(days, limit)]
+
+def load_topic_file(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as topic_file:
+        specs = json.load(topic_file)
+    if not isinstance(specs, list):
+        raise ValueError(f"{path}: expected a JSON list of topic specs")
+    return specs
+
+class PregenerationRunner:
+    """
+    Warms the response cache before peak hours. Each topic spec names an
+    endpoint and its request fields; list-valued fields expand to every
+    combination. Specs go through the same generate_text arguments as the
+    routers at bulk priority, cached ones are skipped, and the run stops at
+    the request / token budget, when the quota is exhausted or when the
+    off-peak window closes.
+    """
+
+    def __init__(self, service, endpoints: EndpointBuilders, max_requests: int = 500,
+                 max_tokens: int = 1_000_000, concurrency: int = 2):
+        self.service = service
+        self.endpoints = endpoints
+        self.max_requests = max_requests
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+
+    def expand(self, specs: Iterable[Dict[str, Any]]) -> List[Tuple[str, BaseModel]]:
+        requests = []
+        seen = set()
+        for spec in specs:
+            spec = dict(spec)
+            endpoint = spec.pop("endpoint", "content")
+            if endpoint not in self.endpoints:
+                logger.warning(f"Skipping topic spec for unknown endpoint '{endpoint}'")
+                continue
+            model = self.endpoints[endpoint][0]
+            names = list(spec)
+            choices = [value if isinstance(value, list) else [value] for value in spec.values()]
+            for values in itertools.product(*choices):
+                params = dict(zip(names, values))
+                identity = (endpoint, json.dumps(params, sort_keys=True, ensure_ascii=False))
+                if identity in seen:
+                    continue
+                seen.add(identity)
+                try:
+                    requests.append((endpoint, model(**params)))
+                except ValidationError as e:
+                    logger.warning(f"Skipping invalid {endpoint} topic spec {params}: {e}")
+        return requests
+
+    async def run(self, specs: Iterable[Dict[str, Any]], until: Optional[float] = None) -> Dict[str, Any]:
+        """Generate every uncached spec that fits the budget; `until` is a Unix time"""
+        requests = self.expand(specs)
+        report: Dict[str, Any] = {
+            "planned": len(requests),
+            "generated": 0,
+            "already_cached": 0,
+            "failed": 0,
+            "skipped": 0,
+            "requests_used": 0,
+            "estimated_tokens_used": 0,
+            "stopped": None
+        }
+        started = time.perf_counter()
+
+        async def warm(item: Tuple[str, BaseModel]) -> str:
+            endpoint, request = item
+            if report["stopped"]:
+                return "skipped"
+            if until is not None and time.time() >= until:
+                report["stopped"] = "window_closed"
+                return "skipped"
+
+            prompt, options = self.endpoints[endpoint][1](request)
+            if await self.service.is_cached(prompt, **options):
+                return "already_cached"
+
+            tokens = self.service.estimate_request_tokens(prompt, **options)
+            if (report["requests_used"] >= self.max_requests
+                    or report["estimated_tokens_used"] + tokens > self.max_tokens):
+                report["stopped"] = "budget_exhausted"
+                return "skipped"
+            report["requests_used"] += 1
+            report["estimated_tokens_used"] += tokens
+
+            await self.service.generate_text(prompt, priority=BULK, **options)
+            # Fallback content is never cached, so the cache tells a real answer apart
+            return "generated" if await self.service.is_cached(prompt, **options) else "failed"
+
+        async for index, status, error, _ in run_bounded(requests, warm, self.concurrency):
+            if error is None:
+                report[status] += 1
+                continue
+            report["failed"] += 1
+            if isinstance(error, QuotaExceededError):
+                report["stopped"] = "quota_exhausted"
+            else:
+                logger.warning(f"Pre-generation of spec {index} failed: {error}")
+
+        report["elapsed_seconds"] = round(time.perf_counter() - started, 1)
+        logger.info("Pre-generation finished", extra=report)
+        return report
+
+def next_window(window: str, now: Optional[datetime.datetime] = None) -> Tuple[float, float]:
+    """
+    Start and end (Unix times) of the current or next "HH:MM-HH:MM" local-time
+    window; windows may wrap past midnight
+    """
+    now = now or datetime.datetime.now()
+    start_text, end_text = window.split("-")
+    start_time = datetime.time.fromisoformat(start_text.strip())
+    end_time = datetime.time.fromisoformat(end_text.strip())
+
+    for day_offset in (-1, 0, 1):
+        day = now.date() + datetime.timedelta(days=day_offset)
+        start = datetime.datetime.combine(day, start_time)
+        end = datetime.datetime.combine(day, end_time)
+        if end <= start:
+            end += datetime.timedelta(days=1)
+        if now < end:
+            return max(start, now).timestamp(), end.timestamp()
+    raise ValueError(f"Invalid window '{window}'")
+
+async def run_nightly(runner: PregenerationRunner, load_specs: Callable[[], List[Dict[str, Any]]],
+                      window: str):
+    """Run once inside every off-peak window, forever"""
+    while True:
+        start, end = next_window(window)
+        logger.info("Waiting for pre-generation window", extra={
+            "window": window, "starts_in_seconds": round(start - time.time())
+        })
+        await asyncio.sleep(max(0.0, start - time.time()))
+        try:
+            await runner.run(load_specs(), until=end)
+        except Exception as e:
+            logger.error(f"Pre-generation run failed: {e}")
+        await asyncio.sleep(max(1.0, end - time.time()))
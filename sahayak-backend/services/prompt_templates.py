@@ -0,0 +1,423 @@
+import hashlib
+import threading
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, Any, List, Optional, Tuple
+
+class CompiledPrompt:
+    """
+    A template with its static fields already substituted and adjacent literal
+    text merged, leaving a format string with only the per-request fields, so
+    rendering is one str.format_map call.
+    """
+
+    def __init__(self, name: str, segments: List[Tuple[str, Optional[str]]], counters: Dict[str, int],
+                 lock: threading.Lock):
+        self.name = name
+        self.fields = tuple(field for _, field in segments if field)
+        self._counters = counters
+        self._lock = lock
+        self._format = self._pattern(segments) if self.fields else None
+        self._text = "".join(literal for literal, _ in segments) if not self.fields else None
+
+        # Static prefix: the text up to the line on which the first per-request
+        # field appears. It is identical for every render of this variant, so
+        # it can be sent as a system instruction and reused by the provider.
+        if self.fields:
+            first = segments[0][0]
+            cut = first.rfind("\n") + 1
+            self.prefix = first[:cut]
+            self._suffix = self._pattern([(first[cut:], segments[0][1])] + segments[1:])
+        else:
+            self.prefix = self._text
+            self._suffix = None
+
+    @staticmethod
+    def _pattern(segments) -> str:
+        """Format string for the remaining fields, with literal braces escaped"""
+        return "".join(
+            literal.replace("{", "{{").replace("}", "}}") + ("{" + field + "}" if field else "")
+            for literal, field in segments
+        )
+
+    def _count(self):
+        with self._lock:
+            self._counters[self.name] = self._counters.get(self.name, 0) + 1
+
+    def render(self, **values) -> str:
+        self._count()
+        if self._text is not None:
+            return self._text
+        return self._format.format_map(values)
+
+    def split(self, **values) -> Tuple[str, str]:
+        """(prefix, suffix) with prefix + suffix == render(**values)"""
+        self._count()
+        if self._suffix is None:
+            return self.prefix, ""
+        return self.prefix, self._suffix.format_map(values)
+
+class PromptTemplate:
+    """Prompt source text plus a version hash used in response cache keys"""
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source.strip()
+        self.version = hashlib.sha256(self.source.encode("utf-8")).hexdigest()[:12]
+        self._parsed = list(Formatter().parse(self.source))
+        self.fields = tuple(sorted({field for _, field, _, _ in self._parsed if field}))
+
+    def compile(self, static: Dict[str, Any], counters: Dict[str, int], lock: threading.Lock) -> CompiledPrompt:
+        """Substitute static fields and merge adjacent literal text"""
+        segments: List[Tuple[str, Optional[str]]] = []
+        pending = ""
+        for literal, field, _, _ in self._parsed:
+            pending += literal
+            if field is None:
+                continue
+            if field in static:
+                pending += str(static[field])
+            else:
+                segments.append((pending, field))
+                pending = ""
+        segments.append((pending, None))
+        return CompiledPrompt(self.name, segments, counters, lock)
+
+class PromptRegistry:
+    """
+    Templates loaded once at startup and precompiled per combination of static
+    parameters (module, language, grade, length, ...); only the per-request
+    values such as the topic are filled in at render time
+    """
+
+    def __init__(self, max_compiled: int = 1024):
+        self._templates: Dict[str, PromptTemplate] = {}
+        self._renders: Dict[str, int] = {}
+        self._compiles: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.variant = lru_cache(maxsize=max_compiled)(self._compile)
+
+    def register(self, name: str, source: str) -> PromptTemplate:
+        template = PromptTemplate(name, source)
+        self._templates[name] = template
+        self.variant.cache_clear()
+        return template
+
+    def version(self, name: str) -> str:
+        return self._templates[name].version
+
+    def render(self, name: str, static: Optional[Dict[str, Any]] = None, /, **values) -> str:
+        """Render `name`, compiling the variant for `static` on first use"""
+        return self.variant(name, **(static or {})).render(**values)
+
+    def _compile(self, name: str, /, **static) -> CompiledPrompt:
+        with self._lock:
+            self._compiles[name] = self._compiles.get(name, 0) + 1
+        return self._templates[name].compile(static, self._renders, self._lock)
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            renders = list(self._renders.items())
+        hot = sorted(renders, key=lambda item: item[1], reverse=True)[:top]
+        cache_info = self.variant.cache_info()
+        return {
+            "templates": len(self._templates),
+            "compiled_variants": cache_info.currsize,
+            "variant_hits": cache_info.hits,
+            "variant_misses": cache_info.misses,
+            "hot_templates": [
+                {
+                    "name": name,
+                    "renders": renders,
+                    "compiled_variants": self._compiles.get(name, 0),
+                    "version": self._templates[name].version
+                }
+                for name, renders in hot
+            ]
+        }
+
+PROMPTS = PromptRegistry()
+
+# ---- GENKIT AI SERVICE (Content, Lessons, Knowledge Base) ----
+# The topic comes last: everything above it is the cacheable system instruction
+
+PROMPTS.register("educational.hi", """
+आप एक अनुभवी हिंदी शिक्षक हैं। कृपया बिल्कुल शुद्ध हिंदी में लिखें।
+
+कक्षा: {grade_level}
+शब्द सीमा: {min_words}-{max_words} शब्द
+
+महत्वपूर्ण निर्देश:
+- बिल्कुल सही हिंदी व्याकरण का प्रयोग करें
+- सभी तथ्य पूर्णतः सत्य और सटीक होने चाहिए
+- कक्षा {grade_level} के बच्चों के लिए उपयुक्त भाषा का प्रयोग करें
+- सरल और स्पष्ट वाक्यों में लिखें
+- शिक्षाप्रद और रोचक शैली में लिखें
+
+'{topic}' के बारे में लिखें:
+""")
+
+PROMPTS.register("educational.en", """
+You are an expert educational content creator with perfect knowledge of facts and grammar.
+
+Grade Level: {grade_level}
+Content Type: {content_type}
+Word Limit: {min_words}-{max_words} words
+
+Critical Requirements:
+- Use perfect grammar and spelling
+- Ensure ALL facts are completely accurate and verified
+- Use simple, clear sentences appropriate for grade {grade_level} students
+- Be educational, engaging, and age-appropriate
+- Stay strictly within the word limit
+- {grade_instruction}
+
+Write about '{topic}':
+""")
+
+PROMPTS.register("educational.other", """
+You are an educational expert. Write accurate and grammatically correct content.
+
+Language: {language}
+Grade Level: {grade_level}
+Word Limit: {min_words}-{max_words} words
+
+Requirements:
+- Use correct grammar in {language}
+- Ensure all facts are accurate
+- Use age-appropriate language for grade {grade_level}
+- Stay within word limit
+- Be educational and engaging
+
+Write about '{topic}' in {language}:
+""")
+
+# ---- WORKSHEETS ----
+
+PROMPTS.register("worksheet.standard", """
+Create a comprehensive worksheet for grade {grade} students in {subject}.
+
+Requirements:
+- Adapt the difficulty level appropriately for grade {grade}
+- Include 6-10 varied questions/exercises
+- Mix different question types: fill-in-the-blank, short answer, match the following, multiple choice
+- Make it suitable for Indian curriculum standards
+- Include clear instructions for students
+- Add educational value and learning objectives
+- Structure it as a complete, ready-to-use worksheet
+
+Grade Level: {grade}
+Subject: {subject}
+
+Format the output as a well-structured worksheet with:
+1. Header with grade and subject
+2. Clear instructions
+3. Varied question types
+4. Appropriate difficulty level
+5. Educational objectives
+""")
+
+PROMPTS.register("worksheet.vision", """
+You are an expert Indian educator creating worksheets. Analyze the provided textbook page image carefully and create a comprehensive worksheet for Grade {grade} students in {subject}.
+
+Please examine the image and identify:
+1. Main concepts, topics, and learning objectives
+2. Text content, examples, and explanations
+3. Diagrams, illustrations, or visual elements
+4. Any exercises or activities shown
+5. Key vocabulary and terms
+
+Based on your analysis, create a Grade {grade} worksheet that includes:
+
+WORKSHEET STRUCTURE:
+- Clear header with grade and subject
+- Learning objectives based on image content
+- 8-12 varied questions directly related to the image content
+- Multiple question types: fill-in-the-blank, short answer, match the following, true/false, multiple choice
+- Questions that test comprehension, application, and analysis
+- Difficulty appropriate for Grade {grade} Indian curriculum
+- Clear instructions for each section
+
+QUESTION TYPES TO INCLUDE:
+1. Vocabulary questions (key terms from the image)
+2. Comprehension questions (understanding main concepts)
+3. Application questions (using the knowledge)
+4. Analysis questions (comparing, contrasting, explaining)
+5. Visual interpretation (if diagrams are present)
+
+REQUIREMENTS:
+- Align with Indian curriculum standards for Grade {grade}
+- Use age-appropriate language
+- Include both recall and higher-order thinking questions
+- Make it engaging and educational
+- Ensure questions directly relate to image content
+- Add bonus questions for advanced learners
+
+Subject: {subject}
+Grade Level: {grade}
+
+Create a complete, ready-to-print worksheet.
+""")
+
+PROMPTS.register("worksheet.multi_grade", """
+You are an expert Indian educator creating differentiated worksheets for a multi-grade classroom. Study the provided textbook page (its image, or the analysis of it given below) and create one worksheet in {subject} for each of these grades: {grades}.
+
+Base every worksheet on the same page: its main concepts, key vocabulary, examples and any diagrams. Differentiate by grade:
+- Lower grades: recall, key vocabulary, fill-in-the-blank and true/false questions in simple words
+- Higher grades: more application and analysis questions that need longer answers
+- 8-12 questions per worksheet, grouped in sections by question type (fill-in-the-blank, short answer, match the following, true/false, multiple choice)
+- Align each worksheet with Indian curriculum standards for its grade and use age-appropriate language
+- The word limit applies to each worksheet, not to the whole response
+
+Grade-specific instructions:
+{grade_guidance}
+
+Respond with JSON only, without markdown, in exactly this shape:
+{{"worksheets": [{{"grade": "<grade>", "title": "...", "objectives": ["..."], "sections": [{{"heading": "...", "instructions": "...", "questions": ["..."]}}], "answer_key": ["..."]}}]}}
+
+Include exactly one worksheet object for every grade listed above.
+""")
+
+PROMPTS.register("worksheet.page_analysis", """
+You are an expert Indian educator preparing to write worksheets for several grades. Analyze the provided textbook page image carefully and record everything a worksheet writer needs, without seeing the page again:
+- title: the chapter or page heading
+- summary: two or three sentences on what the page teaches
+- concepts: the main concepts and learning objectives, with the facts and examples the page uses for them
+- vocabulary: key terms with their meaning as given on the page
+- exercises: the exercises, activities or questions printed on the page, word for word
+- diagrams: each diagram or illustration, what it shows and its labels
+
+Respond with JSON only, without markdown, in exactly this shape:
+{{"title": "...", "summary": "...", "concepts": ["..."], "vocabulary": ["term: meaning"], "exercises": ["..."], "diagrams": ["..."]}}
+""")
+
+PROMPTS.register("worksheet.from_analysis", """
+You are an expert Indian educator creating worksheets. Create a comprehensive worksheet for Grade {grade} students in {subject} from the textbook page described below.
+
+WORKSHEET STRUCTURE:
+- Clear header with grade and subject
+- Learning objectives based on the page content
+- 8-12 varied questions directly related to the page content
+- Multiple question types: fill-in-the-blank, short answer, match the following, true/false, multiple choice
+- Vocabulary, comprehension, application and analysis questions, and visual interpretation questions if the page has diagrams
+- Difficulty appropriate for Grade {grade} Indian curriculum, in age-appropriate language
+- Clear instructions for each section and bonus questions for advanced learners
+
+Create a complete, ready-to-print worksheet.
+
+TEXTBOOK PAGE:
+{page}
+""")
+
+PROMPTS.register("worksheet.bank_top_up", """
+You are an expert Indian educator adding questions to a question bank for Grade {grade} students in {subject}. Write new questions about the textbook page or topic below, at the difficulty of the Grade {grade} Indian curriculum and in age-appropriate language. Every question must stand on its own and must not repeat a question already on the worksheet.
+
+Question types:
+- multiple_choice: a question with four options
+- fill_in_the_blank: a sentence with one blank written as ____
+- true_false: a statement to be marked True or False
+- short_answer: a question answered in one or two sentences
+- long_answer: a question answered in a few sentences
+
+Respond with JSON only, without markdown, in exactly this shape:
+{{"questions": [{{"type": "<question type>", "question": "...", "options": ["..."], "answer": "..."}}]}}
+Give "options" only for multiple_choice questions.
+
+TEXTBOOK PAGE:
+{page}
+
+QUESTIONS NEEDED:
+{needed}
+
+QUESTIONS ALREADY ON THE WORKSHEET:
+{existing}
+""")
+
+PROMPTS.register("worksheet.text", """
+Create a comprehensive educational worksheet for Grade {grade} students in {subject}.
+
+Make it engaging and appropriate for Indian curriculum standards with:
+- 8-10 varied questions
+- Multiple question types (fill-in-the-blank, short answer, true/false, multiple choice)
+- Clear instructions
+- Educational value
+- Grade-appropriate difficulty
+
+Grade: {grade}
+Subject: {subject}
+""")
+
+PROMPTS.register("worksheet.fallback", """
+Create a basic educational worksheet for Grade {grade} in {subject}.
+Include 5-7 simple questions appropriate for the grade level.
+Make it educational and engaging for Indian students.
+""")
+
+# ---- READING ASSESSMENT ----
+
+PROMPTS.register("assessment.feedback", """
+Analyze this reading assessment for a Grade {grade_level} student:
+
+Original Text: {original_text}
+Student's Reading (transcribed): {transcription}
+Language: {language}
+
+Basic Analysis:
+- Accuracy: {accuracy}%
+- Correct Words: {correct_words}/{total_words}
+
+Please provide specific, constructive feedback in {language} that:
+1. Acknowledges what the student did well
+2. Identifies specific areas for improvement
+3. Gives practical tips for better reading
+4. Is encouraging and age-appropriate for grade {grade_level}
+
+Keep the feedback concise but helpful (2-3 sentences).
+""")
+
+PROMPTS.register("assessment.reading_passage", """
+Generate a {difficulty_level} reading passage for Grade {grade_level} students in {language}.
+
+Requirements:
+- Use {complexity}
+- Length: {target_length}
+- Educational content (science, nature, friendship, family values)
+- Include Indian cultural context and familiar scenarios
+- Make it engaging and age-appropriate
+- Use proper grammar and punctuation
+
+If the language is Hindi or Marathi, write completely in that script.
+
+Create a story or informational text that would be interesting for children to read aloud.
+""")
+
+# ---- VISUAL AIDS ----
+
+PROMPTS.register("visual.description", """
+{style_description} about: {topic}
+
+Requirements:
+- {subject_context}
+- Suitable for elementary/primary school students
+- Educationally valuable and engaging
+- Clear, bright, and visually appealing
+- Include specific visual elements that would help students understand the concept
+- Describe colors, layout, and key educational components
+- Make it appropriate for Indian educational context
+
+Style: {style_title}
+Subject: {subject_title}
+Topic: {topic}
+
+Provide a detailed visual description that an illustrator could use to create the actual image.
+""")
+
+PROMPTS.register("visual.simple", """
+Create a detailed description for an educational visual about: {topic}
+
+Make it:
+- Suitable for school children
+- Educationally valuable
+- Clear and engaging
+- Appropriate for classroom use
+""")
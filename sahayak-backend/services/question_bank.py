@@ -0,0 +1,427 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import functools
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pydantic import BaseModel, ValidationError, field_validator, model_validator
+
+from services.response_cache import backend_path
+from services.semantic_cache import SemanticQuestionIndex
+from services.worksheet_sets import GradeWorksheet, WorksheetSection, extract_json, question_with_options
+
+logger = logging.getLogger(__name__)
+
+# Banked question types: section heading and instructions used when assembling
+QUESTION_TYPES = {
+    "multiple_choice": ("Multiple Choice", "Choose the correct answer."),
+    "fill_in_the_blank": ("Fill in the Blanks", "Fill in each blank with the correct word."),
+    "true_false": ("True or False", "Write True or False for each statement."),
+    "short_answer": ("Short Answer", "Answer in one or two sentences."),
+    "long_answer": ("Long Answer", "Answer in a few sentences.")
+}
+
+# Questions per type of an assembled worksheet
+DEFAULT_BLUEPRINT = {"multiple_choice": 3, "fill_in_the_blank": 3, "true_false": 2, "short_answer": 2}
+
+# Section heading keywords, checked in order. "skip" sections hold no bankable
+# questions (match-the-following pairs are split over several lines); the
+# answer key ends the questions
+_HEADING_TYPES = (
+    (("answer key", "key to", "solutions"), "stop"),
+    (("match",), "skip"),
+    (("multiple choice", "mcq", "choose the correct", "tick the correct", "select the correct"), "multiple_choice"),
+    (("fill in", "blank"), "fill_in_the_blank"),
+    (("true or false", "true/false", "true false", "true-false"), "true_false"),
+    (("long answer", "essay", "in detail"), "long_answer"),
+    (("short answer", "question", "answer the following", "comprehension", "application", "analysis",
+      "vocabulary", "think", "bonus", "section", "part"), "short_answer"),
+    (("objective", "instruction", "learning outcome"), "skip")
+)
+
+_NUMBERED = re.compile(r"^(?:q(?:uestion)?\s*)?(\d{1,2})\s*[.):]\s+(.+)$", re.IGNORECASE)
+_OPTION = re.compile(r"^\(?[a-d]\s*[.)]\s+\S", re.IGNORECASE)
+_INLINE_OPTIONS = re.compile(r"\(a\).*\(b\)|\ba\).*\bb\)", re.IGNORECASE)
+_BLANK = re.compile(r"_{3,}|\.{5,}")
+_MARKUP = re.compile(r"[*#`]+")
+# Heading-shaped lines: bold or markdown headings, "Section B ..." / "Part 2 ..."
+_BOLD_LINE = re.compile(r"^[-•\s]*(?:\*\*.+\*\*|#+\s.+):?$")
+_SECTION_PREFIX = re.compile(r"^(?:section|part)\s+(?:[a-z]|\d{1,2}|[ivx]{1,4})\b", re.IGNORECASE)
+_ANSWER_KEY = re.compile(r"^(?:answer key|answers|solutions)$", re.IGNORECASE)
+
+class BankedQuestion(BaseModel):
+    """One question of the bank; multiple choice options are part of the text"""
+
+    type: str
+    question: str
+    answer: str = ""
+
+    @model_validator(mode="before")
+    @classmethod
+    def _options_in_text(cls, value: Any) -> Any:
+        # Generated questions come as {"question", "options", "answer"}
+        if isinstance(value, dict) and value.get("options") and isinstance(value.get("question"), str):
+            value = dict(value)
+            value["question"] = question_with_options(value["question"], value.pop("options"))
+        return value
+
+    @field_validator("type", mode="before")
+    @classmethod
+    def _type_name(cls, question_type: Any) -> Any:
+        if isinstance(question_type, str):
+            question_type = question_type.strip().lower().replace("-", "_").replace(" ", "_")
+        if question_type not in QUESTION_TYPES:
+            raise ValueError(f"unknown question type {question_type!r}")
+        return question_type
+
+    @field_validator("question", "answer", mode="before")
+    @classmethod
+    def _text(cls, text: Any) -> Any:
+        return str(text).strip() if isinstance(text, (int, float, str)) else text
+
+def heading_type(line: str) -> Optional[str]:
+    """Question type, "skip" or "stop" for a section heading; None when the line names no section"""
+    heading = line.casefold()
+    if heading == "answers":
+        return "stop"
+    for keywords, question_type in _HEADING_TYPES:
+        if any(keyword in heading for keyword in keywords):
+            return question_type
+    return None
+
+def is_heading(raw: str, line: str) -> bool:
+    """Whether a non-numbered worksheet line is shaped like a section heading"""
+    return (
+        len(line) <= 80
+        and (bool(_BOLD_LINE.match(raw.strip())) or line.endswith(":") or line.isupper()
+             or bool(_SECTION_PREFIX.match(line)) or bool(_ANSWER_KEY.match(line)))
+    )
+
+def classify_question(question: str, section_type: Optional[str]) -> Optional[str]:
+    """Type of a question from its shape, else from the section it appeared in"""
+    text = question.casefold()
+    if _BLANK.search(question):
+        return "fill_in_the_blank"
+    if "\n" in question or _INLINE_OPTIONS.search(question):
+        return "multiple_choice"
+    if "true or false" in text or "(t/f)" in text:
+        return "true_false"
+    if section_type and section_type != "skip":
+        return section_type
+    return "short_answer" if text.rstrip().endswith("?") else None
+
+def parse_worksheet_questions(text: str) -> List[BankedQuestion]:
+    """
+    Numbered questions of a plain-text worksheet, typed by their section
+    heading and shape. Only heading-shaped lines (see is_heading) start a
+    section, so an instruction that mentions a "question" does not retype
+    the questions after it. Objectives, match-the-following sections and
+    everything from the answer key on are left out.
+    """
+    questions: List[BankedQuestion] = []
+    section_type: Optional[str] = None
+    current: Optional[List[str]] = None
+
+    def finish():
+        if current is None:
+            return
+        question = current[0] + ("\n   " + "   ".join(current[1:]) if len(current) > 1 else "")
+        question_type = classify_question(question, section_type)
+        if question_type and 8 <= len(current[0]) <= 400:
+            questions.append(BankedQuestion(type=question_type, question=question))
+
+    for raw in text.splitlines():
+        line = _MARKUP.sub("", raw).strip().lstrip("-• ").strip()
+        if not line:
+            continue
+        numbered = _NUMBERED.match(line)
+        if numbered:
+            finish()
+            current = [numbered.group(2).strip()] if section_type != "skip" else None
+            continue
+        if _OPTION.match(line):
+            if current is not None:
+                current.append(line)
+            continue
+        finish()
+        current = None
+        if is_heading(raw, line):
+            found = heading_type(line.rstrip(":"))
+            if found == "stop":
+                return questions
+            # A heading that names no question type: go by question shape
+            section_type = found
+    finish()
+    return questions
+
+def parse_question_list(text: str) -> List[BankedQuestion]:
+    """Questions of a top-up response ({"questions": [...]}); malformed items are dropped"""
+    try:
+        items = extract_json(text).get("questions")
+        if not isinstance(items, list):
+            raise ValueError("'questions' is not a list")
+    except (ValueError, AttributeError) as e:
+        logger.debug(f"Invalid question list: {e}")
+        return []
+    questions = []
+    for item in items:
+        try:
+            questions.append(BankedQuestion.model_validate(item))
+        except ValidationError as e:
+            logger.debug(f"Invalid banked question: {e}")
+    return [question for question in questions if question.question]
+
+def bank_key(text: str) -> str:
+    """Case-, punctuation- and spacing-insensitive form of a subject, grade or topic"""
+    cleaned = "".join(char if unicodedata.category(char)[0] in "LMN" else " " for char in text.casefold())
+    return " ".join(cleaned.split())[:80]
+
+def render_questions(grade: str, title: str, questions: List[BankedQuestion]) -> str:
+    """Worksheet text with one section per question type, in QUESTION_TYPES order"""
+    order = list(QUESTION_TYPES)
+    questions = sorted(questions, key=lambda question: order.index(question.type))
+    sections = []
+    for question_type, (heading, instructions) in QUESTION_TYPES.items():
+        texts = [question.question for question in questions if question.type == question_type]
+        if texts:
+            sections.append(WorksheetSection(heading=heading, instructions=instructions, questions=texts))
+    # A partial key would not line up with the question numbers
+    answer_key = [question.answer for question in questions] if all(q.answer for q in questions) else []
+    return GradeWorksheet(grade=grade, title=title, sections=sections, answer_key=answer_key).render()
+
+class QuestionBank:
+    """
+    Questions harvested from generated worksheets, stored in SQLite and
+    indexed by (subject, grade, topic, type), so a worksheet for a page or
+    topic seen before is assembled with a few indexed reads. New questions
+    are checked against the bank's MinHash index (SemanticQuestionIndex) and
+    near-duplicates of a banked question in the same subject, grade and topic
+    are dropped. Assembly serves the least-served questions first, so repeat
+    requests rotate through the bank.
+    """
+
+    def __init__(self, path: str, dedup_threshold: float = 0.8, max_indexed: int = 50000):
+        self.path = path
+        self.index = SemanticQuestionIndex(
+            threshold=dedup_threshold, max_entries=max_indexed, ttl_seconds=float("inf"), audit_rate=0.05
+        )
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._synced_id = 0
+        self._own_ids: Set[int] = set()
+        self._assembly_seconds = 0.0
+        self.counters = {
+            "harvested": 0,
+            "added": 0,
+            "duplicates": 0,
+            "assemblies": 0,
+            "questions_served": 0,
+            "shortfall": 0,
+            "disk_errors": 0
+        }
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id INTEGER PRIMARY KEY, subject TEXT NOT NULL, grade TEXT NOT NULL, topic TEXT NOT NULL, "
+            "type TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+            "source TEXT NOT NULL, created_at REAL NOT NULL, served INTEGER NOT NULL DEFAULT 0, "
+            "last_served_at REAL);"
+            "CREATE UNIQUE INDEX IF NOT EXISTS questions_fingerprint "
+            "ON questions (subject, grade, topic, fingerprint);"
+            "CREATE INDEX IF NOT EXISTS questions_key ON questions (subject, grade, topic, type, served);"
+        )
+        connection.commit()
+
+    async def add(self, subject: str, grade: str, topic: str, questions: List[BankedQuestion],
+                  source: str) -> List[BankedQuestion]:
+        """Bank `questions`; returns the ones that were not near-duplicates of banked questions"""
+        return await asyncio.to_thread(self._add, bank_key(subject), bank_key(grade), bank_key(topic),
+                                       questions, source)
+
+    async def assemble(self, subject: str, grade: str, topic: str,
+                       blueprint: Dict[str, int]) -> Tuple[List[BankedQuestion], Dict[str, int]]:
+        """
+        Up to blueprint[type] banked questions of each type, least served
+        first, and the number still missing per type. Nothing is marked
+        served until mark_served is called for the questions actually used.
+        """
+        return await asyncio.to_thread(self._assemble, bank_key(subject), bank_key(grade), bank_key(topic),
+                                       blueprint)
+
+    async def mark_served(self, subject: str, grade: str, topic: str, questions: List[BankedQuestion]):
+        """Count `questions` as served in a returned worksheet, so the next assembly rotates past them"""
+        await asyncio.to_thread(self._mark_served, bank_key(subject), bank_key(grade), bank_key(topic),
+                                questions)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+            seconds = self._assembly_seconds
+        try:
+            rows = self._connection().execute(
+                "SELECT type, COUNT(*) FROM questions GROUP BY type"
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Question bank read failed: {e}")
+            rows = []
+        return {
+            **counters,
+            "avg_assembly_ms": round(seconds * 1000 / counters["assemblies"], 3) if counters["assemblies"] else 0.0,
+            "questions": {question_type: count for question_type, count in rows},
+            "dedup": self.index.stats(include_samples=True),
+            "path": self.path
+        }
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _fingerprint(self, question: str) -> str:
+        return hashlib.sha256(" ".join(self.index.normalize(question, "en")).encode("utf-8")).hexdigest()[:32]
+
+    def _sync_index(self, connection: sqlite3.Connection):
+        # Questions banked by other workers since the last look. Ids are
+        # handed out in commit order (one SQLite writer at a time, rows are
+        # never deleted); created_at is stamped before a possibly slow commit
+        rows = connection.execute(
+            "SELECT id, subject, grade, topic, question FROM questions WHERE id > ? ORDER BY id",
+            (self._synced_id,)
+        ).fetchall()
+        for question_id, subject, grade, topic, question in rows:
+            if question_id not in self._own_ids:
+                self.index.add(question, ("en", subject, grade, topic), "")
+            self._synced_id = question_id
+        self._own_ids.clear()
+
+    def _add(self, subject: str, grade: str, topic: str, questions: List[BankedQuestion],
+             source: str) -> List[BankedQuestion]:
+        partition = ("en", subject, grade, topic)
+        added = []
+        try:
+            connection = self._connection()
+            with self._lock:
+                self._sync_index(connection)
+                now = time.time()
+                own_ids = []
+                for question in questions:
+                    if self.index.lookup(question.question, partition) is not None:
+                        continue
+                    cursor = connection.execute(
+                        "INSERT OR IGNORE INTO questions (subject, grade, topic, type, question, answer, "
+                        "fingerprint, source, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (subject, grade, topic, question.type, question.question, question.answer,
+                         self._fingerprint(question.question), source, now)
+                    )
+                    self.index.add(question.question, partition, "")
+                    if cursor.rowcount:
+                        added.append(question)
+                        own_ids.append(cursor.lastrowid)
+                connection.commit()
+                # Already indexed; the next sync skips them but not rows other workers committed meanwhile
+                self._own_ids.update(own_ids)
+                self.counters["harvested"] += len(questions)
+                self.counters["added"] += len(added)
+                self.counters["duplicates"] += len(questions) - len(added)
+        except sqlite3.Error as e:
+            with self._lock:
+                self.counters["disk_errors"] += 1
+            logger.warning(f"Question bank write failed: {e}")
+        return added
+
+    def _assemble(self, subject: str, grade: str, topic: str,
+                  blueprint: Dict[str, int]) -> Tuple[List[BankedQuestion], Dict[str, int]]:
+        started = time.perf_counter()
+        questions: List[BankedQuestion] = []
+        shortfall: Dict[str, int] = {}
+        try:
+            connection = self._connection()
+            for question_type, count in blueprint.items():
+                rows = connection.execute(
+                    "SELECT question, answer FROM questions WHERE subject = ? AND grade = ? AND topic = ? "
+                    "AND type = ? ORDER BY served, id LIMIT ?",
+                    (subject, grade, topic, question_type, count)
+                ).fetchall()
+                questions.extend(BankedQuestion(type=question_type, question=question, answer=answer)
+                                 for question, answer in rows)
+                if len(rows) < count:
+                    shortfall[question_type] = count - len(rows)
+        except sqlite3.Error as e:
+            with self._lock:
+                self.counters["disk_errors"] += 1
+            logger.warning(f"Question bank read failed: {e}")
+            questions, shortfall = [], {t: n for t, n in blueprint.items() if n > 0}
+
+        with self._lock:
+            self.counters["assemblies"] += 1
+            self.counters["shortfall"] += sum(shortfall.values())
+            self._assembly_seconds += time.perf_counter() - started
+        return questions, shortfall
+
+    def _mark_served(self, subject: str, grade: str, topic: str, questions: List[BankedQuestion]):
+        if not questions:
+            return
+        now = time.time()
+        try:
+            connection = self._connection()
+            cursor = connection.executemany(
+                "UPDATE questions SET served = served + 1, last_served_at = ? "
+                "WHERE subject = ? AND grade = ? AND topic = ? AND fingerprint = ?",
+                [(now, subject, grade, topic, self._fingerprint(question.question)) for question in questions]
+            )
+            connection.commit()
+        except sqlite3.Error as e:
+            with self._lock:
+                self.counters["disk_errors"] += 1
+            logger.warning(f"Question bank write failed: {e}")
+            return
+        with self._lock:
+            self.counters["questions_served"] += cursor.rowcount
+
+def parse_blueprint(text: str) -> Dict[str, int]:
+    """
+    "type:count,type:count" (WORKSHEET_BANK_BLUEPRINT) to {type: count}; a
+    malformed value is logged and gives {}, so the default blueprint applies
+    """
+    blueprint = {}
+    try:
+        for item in filter(None, (item.strip() for item in text.split(","))):
+            question_type, _, count = item.partition(":")
+            question_type = question_type.strip()
+            if question_type not in QUESTION_TYPES:
+                raise ValueError(f"unknown question type {question_type!r}")
+            blueprint[question_type] = int(count)
+            if blueprint[question_type] < 0:
+                raise ValueError(f"negative count for {question_type!r}")
+    except ValueError as e:
+        logger.warning(f"Ignoring invalid question bank blueprint {text!r}: {e}")
+        return {}
+    return blueprint
+
+@functools.lru_cache(maxsize=None)
+def question_bank() -> Optional[QuestionBank]:
+    """Shared bank configured from WORKSHEET_BANK_* settings; None when WORKSHEET_BANK_PATH is empty"""
+    path = backend_path(os.getenv("WORKSHEET_BANK_PATH", "cache/question_bank.sqlite3"))
+    if not path:
+        return None
+    try:
+        return QuestionBank(
+            path,
+            dedup_threshold=float(os.getenv("WORKSHEET_BANK_DEDUP_THRESHOLD", "0.8")),
+            max_indexed=int(os.getenv("WORKSHEET_BANK_MAX_INDEXED", "50000"))
+        )
+    except Exception as e:
+        logger.warning(f"Question bank disabled, could not open {path}: {e}")
+        return None
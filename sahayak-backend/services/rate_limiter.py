@@ -0,0 +1,258 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+class QuotaExceededError(Exception):
+    """Raised when a request cannot be served within the Gemini quota budget"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+# Priority classes: live teacher requests vs. multi-grade / batch / background work
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+class _Waiter:
+    def __init__(self, tokens: int, future: asyncio.Future, priority: str):
+        self.tokens = tokens
+        self.future = future
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+
+class _Lane:
+    """Queue and counters for one priority class"""
+
+    def __init__(self, max_wait_seconds: float):
+        self.max_wait_seconds = max_wait_seconds
+        self.queue: Deque[_Waiter] = deque()
+        self.recent_waits: Deque[float] = deque(maxlen=256)
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "timed_out": 0
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+        return {
+            **self.counters,
+            "queue_depth": len(self.queue),
+            "max_wait_seconds": self.max_wait_seconds,
+            "wait_p50_seconds": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_p95_seconds": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0
+        }
+
+class GeminiRateLimiter:
+    """
+    Token-bucket scheduler enforcing requests-per-minute and tokens-per-minute
+    budgets. Requests that cannot start immediately wait in a per-priority FIFO
+    queue; if the expected wait exceeds the bound they are rejected with a retry
+    hint. Interactive requests are granted ahead of queued bulk work, except that
+    bulk is guaranteed `bulk_min_share` of grants while both lanes are waiting.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float,
+                 max_wait_seconds: float = 10, max_queue_depth: int = 100,
+                 bulk_max_wait_seconds: Optional[float] = None, bulk_min_share: float = 0.2):
+        self.requests_per_minute = max(1.0, requests_per_minute)
+        self.tokens_per_minute = max(1.0, tokens_per_minute)
+        self.max_wait_seconds = max_wait_seconds
+        self.max_queue_depth = max_queue_depth
+        self.bulk_min_share = min(1.0, max(0.0, bulk_min_share))
+
+        # Buckets start full so a cold server can absorb one minute's burst
+        self._request_bucket = self.requests_per_minute
+        self._token_bucket = self.tokens_per_minute
+        self._refilled_at = time.monotonic()
+
+        self._lanes = {
+            INTERACTIVE: _Lane(max_wait_seconds),
+            BULK: _Lane(bulk_max_wait_seconds if bulk_max_wait_seconds is not None else max_wait_seconds)
+        }
+        # Interactive grants since the last bulk grant while bulk was waiting
+        self._interactive_streak = 0
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._recent_waits: Deque[float] = deque(maxlen=256)
+
+        self.counters = {
+            "admitted": 0,
+            "queued": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "total_wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    async def acquire(self, tokens: int, priority: str = INTERACTIVE) -> float:
+        """Wait for quota for one request of roughly `tokens` tokens; returns seconds waited"""
+        lane = self._lanes.get(priority)
+        if lane is None:
+            raise ValueError(f"Unknown priority class: {priority}")
+        tokens = min(max(1, int(tokens)), int(self.tokens_per_minute))
+        self._refill()
+
+        if self._may_skip_queue(priority) and self._has_capacity(tokens):
+            self._consume(tokens, priority)
+            self._record_wait(0.0, lane)
+            return 0.0
+
+        expected_wait = self._expected_wait(tokens, priority)
+        if len(lane.queue) >= self.max_queue_depth or expected_wait > lane.max_wait_seconds:
+            self.counters["rejected"] += 1
+            lane.counters["rejected"] += 1
+            raise QuotaExceededError(
+                "Gemini quota exhausted, please retry shortly",
+                retry_after=expected_wait
+            )
+
+        waiter = _Waiter(tokens, asyncio.get_running_loop().create_future(), priority)
+        lane.queue.append(waiter)
+        self.counters["queued"] += 1
+        lane.counters["queued"] += 1
+        self._ensure_dispatcher()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=lane.max_wait_seconds)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.counters["timed_out"] += 1
+            lane.counters["timed_out"] += 1
+            raise QuotaExceededError(
+                "Timed out waiting for Gemini quota, please retry shortly",
+                retry_after=self._expected_wait(tokens, priority)
+            )
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        waited = time.monotonic() - waiter.enqueued_at
+        self._record_wait(waited, lane)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Return unused token budget once the real usage of a call is known"""
+        unused = int(estimated_tokens) - int(actual_tokens)
+        if unused > 0:
+            self._refill()
+            self._token_bucket = min(self.tokens_per_minute, self._token_bucket + unused)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        waits = sorted(self._recent_waits)
+        return {
+            **self.counters,
+            "queue_depth": sum(len(lane.queue) for lane in self._lanes.values()),
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "available_requests": round(self._request_bucket, 2),
+            "available_tokens": int(self._token_bucket),
+            "wait_p50_seconds": round(waits[len(waits) // 2], 3) if waits else 0.0,
+            "wait_p95_seconds": round(waits[int(len(waits) * 0.95)], 3) if waits else 0.0,
+            "bulk_min_share": self.bulk_min_share,
+            "lanes": {priority: lane.stats() for priority, lane in self._lanes.items()}
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._refilled_at
+        self._refilled_at = now
+        self._request_bucket = min(self.requests_per_minute,
+                                   self._request_bucket + elapsed * self.requests_per_minute / 60)
+        self._token_bucket = min(self.tokens_per_minute,
+                                 self._token_bucket + elapsed * self.tokens_per_minute / 60)
+
+    def _has_capacity(self, tokens: int) -> bool:
+        return self._request_bucket >= 1 and self._token_bucket >= tokens
+
+    def _consume(self, tokens: int, priority: str):
+        self._request_bucket -= 1
+        self._token_bucket -= tokens
+        self.counters["admitted"] += 1
+        self._lanes[priority].counters["admitted"] += 1
+        if priority == BULK or not self._lanes[BULK].queue:
+            self._interactive_streak = 0
+        else:
+            self._interactive_streak += 1
+
+    def _bulk_is_due(self) -> bool:
+        """True when waiting bulk work has gone without its minimum share of grants"""
+        if not self._lanes[BULK].queue or self.bulk_min_share <= 0:
+            return False
+        if self.bulk_min_share >= 1:
+            return True
+        return self._interactive_streak >= round((1 - self.bulk_min_share) / self.bulk_min_share)
+
+    def _may_skip_queue(self, priority: str) -> bool:
+        # Interactive work starts ahead of queued bulk work unless bulk is owed its share
+        if priority == INTERACTIVE:
+            return not self._lanes[INTERACTIVE].queue and not self._bulk_is_due()
+        return not self._lanes[INTERACTIVE].queue and not self._lanes[BULK].queue
+
+    def _next_lane(self) -> Optional[_Lane]:
+        interactive, bulk = self._lanes[INTERACTIVE], self._lanes[BULK]
+        if interactive.queue and not self._bulk_is_due():
+            return interactive
+        if bulk.queue:
+            return bulk
+        return interactive if interactive.queue else None
+
+    def _time_until_capacity(self, requests: float, tokens: float) -> float:
+        request_wait = max(0.0, requests - self._request_bucket) * 60 / self.requests_per_minute
+        token_wait = max(0.0, tokens - self._token_bucket) * 60 / self.tokens_per_minute
+        return max(request_wait, token_wait)
+
+    def _expected_wait(self, tokens: int, priority: str = INTERACTIVE) -> float:
+        # Everything already queued in the same or a higher class is served first;
+        # interactive work also yields the guaranteed bulk share
+        ahead = list(self._lanes[INTERACTIVE].queue)
+        if priority == BULK:
+            ahead += list(self._lanes[BULK].queue)
+        elif self._lanes[BULK].queue and self.bulk_min_share > 0:
+            owed = int(len(ahead) * self.bulk_min_share / max(1e-9, 1 - self.bulk_min_share)) + 1
+            ahead += list(self._lanes[BULK].queue)[:owed]
+        queued_tokens = sum(waiter.tokens for waiter in ahead)
+        return self._time_until_capacity(len(ahead) + 1, queued_tokens + tokens)
+
+    def _abandon(self, waiter: _Waiter):
+        try:
+            self._lanes[waiter.priority].queue.remove(waiter)
+        except ValueError:
+            # Already granted: hand the slot back
+            self._request_bucket = min(self.requests_per_minute, self._request_bucket + 1)
+            self._token_bucket = min(self.tokens_per_minute, self._token_bucket + waiter.tokens)
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        """Grant queued requests by priority as the buckets refill"""
+        while True:
+            lane = self._next_lane()
+            if lane is None:
+                return
+            self._refill()
+            head = lane.queue[0]
+            if head.future.done():
+                lane.queue.popleft()
+                continue
+            if self._has_capacity(head.tokens):
+                lane.queue.popleft()
+                self._consume(head.tokens, head.priority)
+                head.future.set_result(True)
+                continue
+            await asyncio.sleep(max(0.01, self._time_until_capacity(1, head.tokens)))
+
+    def _record_wait(self, waited: float, lane: _Lane):
+        self._recent_waits.append(waited)
+        lane.recent_waits.append(waited)
+        self.counters["total_wait_seconds"] = round(self.counters["total_wait_seconds"] + waited, 3)
+        self.counters["max_wait_seconds"] = round(max(self.counters["max_wait_seconds"], waited), 3)
@@ -0,0 +1,217 @@
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Any, Optional, TypeVar
+from google.api_core import exceptions as google_exceptions
+from services.rate_limiter import QuotaExceededError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Transient provider failures worth another attempt
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,      # 429
+    google_exceptions.TooManyRequests,        # 429
+    google_exceptions.InternalServerError,    # 500
+    google_exceptions.BadGateway,             # 502
+    google_exceptions.ServiceUnavailable,     # 503
+    google_exceptions.GatewayTimeout,         # 504
+    google_exceptions.DeadlineExceeded,
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError
+)
+
+# Failures that will not go away by retrying (bad key, bad request, or our
+# own scheduler deciding there is no quota left)
+FATAL_ERRORS = (
+    google_exceptions.Unauthenticated,
+    google_exceptions.PermissionDenied,
+    google_exceptions.InvalidArgument,
+    QuotaExceededError
+)
+
+def is_retryable(error: BaseException) -> bool:
+    """Classify a provider error: retry 429/5xx/timeouts, never auth or request errors"""
+    if isinstance(error, FATAL_ERRORS):
+        return False
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    message = str(error).lower()
+    if "api_key" in message or "api key" in message or "permission" in message:
+        return False
+    return any(marker in message for marker in ("429", "500", "503", "unavailable", "timeout", "quota"))
+
+def is_quota_error(error: BaseException) -> bool:
+    """Upstream quota rejections mean the provider is up, just busy"""
+    return isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)) \
+        or "quota" in str(error).lower()
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+class DeadlineExceededError(asyncio.TimeoutError):
+    """The per-request time budget ran out before the provider answered"""
+
+class GenerationFailedError(Exception):
+    """No usable content from the provider, for callers that handle their own fallback"""
+
+class Deadline:
+    """Absolute time budget for one request, shared by all of its attempts"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before the attempt following `attempt` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive provider failures and fails fast
+    for `recovery_seconds`; then lets a single probe call through (half-open)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30):
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self.counters = {
+            "opened": 0,
+            "short_circuited": 0
+        }
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.recovery_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            else:
+                self.counters["short_circuited"] += 1
+                raise CircuitOpenError("Google AI is temporarily unavailable (circuit open)")
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.counters["short_circuited"] += 1
+                raise CircuitOpenError("Google AI is recovering (probe in progress)")
+            self._probe_in_flight = True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.counters["opened"] += 1
+                logger.warning(f"Circuit breaker opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Forget an in-flight probe that ended without a provider verdict"""
+        self._probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = round(max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at)), 1)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_seconds": self.recovery_seconds,
+            "retry_in_seconds": retry_in,
+            **self.counters
+        }
+
+async def call_with_resilience(attempt: Callable[[float], Awaitable[T]], policy: RetryPolicy,
+                               breaker: CircuitBreaker, deadline: Deadline,
+                               counters: Optional[Dict[str, int]] = None,
+                               admit: Optional[Callable[[float], Awaitable[Any]]] = None) -> T:
+    """
+    Run `attempt(timeout)` with classified retries, jittered backoff, the request
+    deadline as an upper bound on every attempt, and the circuit breaker in front.
+    `admit(timeout)` runs before each attempt (e.g. to wait for local quota); its
+    time counts against the deadline but its failures never count against the breaker.
+    """
+    counters = counters if counters is not None else {}
+    breaker.before_call()
+
+    attempt_number = 0
+    while True:
+        attempt_number += 1
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            breaker.release()
+            raise DeadlineExceededError(f"Request deadline of {deadline.seconds}s exceeded")
+
+        if admit is not None:
+            try:
+                await asyncio.wait_for(admit(remaining), timeout=remaining)
+            except asyncio.TimeoutError as e:
+                breaker.release()
+                counters["admission_timeouts"] = counters.get("admission_timeouts", 0) + 1
+                raise DeadlineExceededError(f"Request deadline of {deadline.seconds}s exceeded") from e
+            except BaseException:
+                breaker.release()
+                raise
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                breaker.release()
+                raise DeadlineExceededError(f"Request deadline of {deadline.seconds}s exceeded")
+
+        try:
+            result = await asyncio.wait_for(attempt(remaining), timeout=remaining)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and deadline.expired():
+                breaker.record_failure()
+                counters["timeouts"] = counters.get("timeouts", 0) + 1
+                raise DeadlineExceededError(f"Request deadline of {deadline.seconds}s exceeded") from e
+            if not is_retryable(e):
+                breaker.release()
+                raise
+            if is_quota_error(e):
+                breaker.release()
+            else:
+                breaker.record_failure()
+
+            delay = policy.backoff(attempt_number)
+            if attempt_number >= policy.max_attempts or breaker.state == CircuitBreaker.OPEN \
+                    or delay >= deadline.remaining():
+                raise
+
+            counters["retries"] = counters.get("retries", 0) + 1
+            logger.warning(f"Retrying Google AI call in {delay:.2f}s after: {str(e)}")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
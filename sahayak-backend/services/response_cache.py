@@ -0,0 +1,195 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Relative cache paths live under the backend directory, wherever the server is started from
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def backend_path(path: str) -> str:
+    """`path` resolved against the backend directory; an empty path (tier disabled) stays empty"""
+    return os.path.join(BACKEND_DIR, path) if path and not os.path.isabs(path) else path
+
+class ResponseCache:
+    """
+    Two-tier cache for generated content: an in-process LRU with TTL in front of
+    an SQLite file that survives restarts and can be shared by several workers.
+    Expired disk rows are purged on open and every `purge_every` disk writes,
+    not only when they are read again.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 86400, disk_path: str = "",
+                 purge_every: int = 256):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.purge_every = max(1, purge_every)
+        self._disk_writes = 0
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "disk_errors": 0
+        }
+
+        if self.disk_path:
+            try:
+                directory = os.path.dirname(self.disk_path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                connection = self._connection()
+                connection.executescript(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL);"
+                    "CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires_at);"
+                )
+                connection.commit()
+                self._purge_expired(connection)
+            except Exception as e:
+                logger.warning(f"Disk cache disabled, could not open {self.disk_path}: {e}")
+                self.disk_path = ""
+
+    @staticmethod
+    def make_key(prompt: str, **params) -> str:
+        """Build a stable key from the normalized prompt and generation parameters"""
+        normalized = {"prompt": " ".join(str(prompt).split()).casefold()}
+        for name, value in params.items():
+            normalized[name] = " ".join(str(value).split()).casefold() if value is not None else ""
+        encoded = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a cached response, promoting disk hits into memory"""
+        value = self._get_memory(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        if self.disk_path:
+            entry = await asyncio.to_thread(self._get_disk, key)
+            if entry is not None:
+                value, expires_at = entry
+                self._set_memory(key, value, expires_at)
+                self._count("disk_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    async def set(self, key: str, value: str):
+        """Store a response in both tiers"""
+        expires_at = time.time() + self.ttl_seconds
+        self._set_memory(key, value, expires_at)
+        self._count("writes")
+
+        if self.disk_path:
+            await asyncio.to_thread(self._set_disk, key, value, expires_at)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and tier sizes"""
+        with self._lock:
+            counters = dict(self.counters)
+            memory_entries = len(self._memory)
+
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": memory_entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "disk_path": self.disk_path or None
+        }
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._memory[key]
+                self.counters["expirations"] += 1
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _set_memory(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets several worker processes read while one writes
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.disk_path, timeout=5)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _get_disk(self, key: str) -> Optional[tuple]:
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= time.time():
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self._count("expirations")
+                return None
+            return row[0], row[1]
+        except Exception as e:
+            self._count("disk_errors")
+            logger.warning(f"Disk cache read failed: {e}")
+            return None
+
+    def _set_disk(self, key: str, value: str, expires_at: float):
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+            connection.commit()
+            with self._lock:
+                self._disk_writes += 1
+                purge = self._disk_writes % self.purge_every == 0
+            if purge:
+                self._purge_expired(connection)
+        except Exception as e:
+            self._count("disk_errors")
+            logger.warning(f"Disk cache write failed: {e}")
+
+    def _purge_expired(self, connection: sqlite3.Connection):
+        cursor = connection.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        connection.commit()
+        if cursor.rowcount:
+            self._count("expirations", cursor.rowcount)
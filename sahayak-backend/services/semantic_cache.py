@@ -0,0 +1,233 @@
+import time
+import random
+import hashlib
+import itertools
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Any, FrozenSet, Hashable, List, Optional, Set, Tuple
+
+from services.usage_metrics import Histogram
+
+# Function words that do not change what is being asked. Question words
+# that do (why, how, क्यों, कैसे) are kept.
+STOPWORDS = {
+    "en": frozenset((
+        "a an the is are was were be been am do does did of to in on at for by with "
+        "and or it its this that these those there please tell me us can could you "
+        "would will should i we my our your they their them so very what about explain describe"
+    ).split()),
+    "hi": frozenset((
+        "है हैं था थी थे हो होता होती होते का की के में से को पर और या यह वह ये वो "
+        "एक ही भी तो ने कि कृपया मुझे हमें बताइए बताओ बताएं समझाइए समझाओ"
+    ).split())
+}
+
+SIMILARITY_BUCKETS = (0.8, 0.85, 0.9, 0.95, 0.99, 1.0)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+class SemanticHit:
+    def __init__(self, answer: str, question: str, similarity: float):
+        self.answer = answer
+        self.question = question
+        self.similarity = similarity
+
+class _Entry:
+    __slots__ = ("question", "shingles", "numbers", "bands", "answer", "expires_at")
+
+    def __init__(self, question: str, shingles: FrozenSet[str], numbers: Tuple[str, ...], bands: List[Hashable],
+                 answer: str, expires_at: float):
+        self.question = question
+        self.shingles = shingles
+        self.numbers = numbers
+        self.bands = bands
+        self.answer = answer
+        self.expires_at = expires_at
+
+class SemanticQuestionIndex:
+    """
+    CPU-only near-duplicate index over answered questions. Questions are
+    reduced to character n-grams of their content words plus adjacent word
+    pairs, which keep the word order; MinHash signatures with LSH banding
+    find candidates, and the exact Jaccard similarity of the shingle sets
+    decides a hit among candidates asking about the same numbers in the same
+    order. Entries are partitioned (language, complexity,
+    length, ...) so an answer is only reused for an equivalent request.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 5000, ttl_seconds: float = 86400,
+                 ngram: int = 3, num_perm: int = 64, bands: int = 16,
+                 audit_rate: float = 0.2, audit_samples: int = 50, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.ngram = max(2, ngram)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.audit_rate = audit_rate
+
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)
+        ]
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._buckets: Dict[Hashable, Set[int]] = {}
+        self._ids = itertools.count()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.similarity = Histogram(SIMILARITY_BUCKETS)
+        self._audit: Deque[Dict[str, Any]] = deque(maxlen=audit_samples)
+        self._lookup_seconds = 0.0
+        self.counters = {
+            "lookups": 0,
+            "hits": 0,
+            "exact_hits": 0,
+            "misses": 0,
+            "additions": 0,
+            "evictions": 0,
+            "expirations": 0
+        }
+
+    def lookup(self, question: str, partition: Tuple) -> Optional[SemanticHit]:
+        started = time.perf_counter()
+        shingles, numbers = self._features(question, partition[0])
+        signature = self._signature(shingles)
+        now = time.time()
+
+        with self._lock:
+            self.counters["lookups"] += 1
+            best_id, best_similarity = None, 0.0
+            candidates: Set[int] = set()
+            for band in self._band_keys(signature, partition):
+                candidates |= self._buckets.get(band, set())
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if entry.expires_at <= now or entry.numbers != numbers:
+                    continue
+                similarity = len(shingles & entry.shingles) / len(shingles | entry.shingles)
+                if similarity > best_similarity:
+                    best_id, best_similarity = entry_id, similarity
+
+            self._lookup_seconds += time.perf_counter() - started
+            if best_id is None or best_similarity < self.threshold:
+                self.counters["misses"] += 1
+                return None
+
+            entry = self._entries[best_id]
+            self._entries.move_to_end(best_id)
+            self.counters["hits"] += 1
+            self.similarity.observe(best_similarity)
+            if best_similarity >= 1.0:
+                self.counters["exact_hits"] += 1
+            elif best_similarity < self.threshold + 0.05 or self._random.random() < self.audit_rate:
+                # Near-threshold hits are the likeliest false hits, so all of them are kept
+                self._audit.append({
+                    "question": question,
+                    "matched_question": entry.question,
+                    "similarity": round(best_similarity, 3),
+                    "partition": [str(part) for part in partition],
+                    "at": round(now)
+                })
+            return SemanticHit(entry.answer, entry.question, best_similarity)
+
+    def add(self, question: str, partition: Tuple, answer: str):
+        shingles, numbers = self._features(question, partition[0])
+        if not shingles:
+            return
+        bands = self._band_keys(self._signature(shingles), partition)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = _Entry(
+                question, shingles, numbers, bands, answer, time.time() + self.ttl_seconds
+            )
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(entry_id)
+            self.counters["additions"] += 1
+            self._expire()
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.counters["evictions"] += 1
+
+    def stats(self, include_samples: bool = False) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["lookups"]
+            stats = {
+                **self.counters,
+                "entries": len(self._entries),
+                "threshold": self.threshold,
+                "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+                "avg_lookup_ms": round(self._lookup_seconds * 1000 / lookups, 3) if lookups else 0.0,
+                "hit_similarity": self.similarity.to_dict()
+            }
+            if include_samples:
+                stats["audit_samples"] = list(self._audit)
+            return stats
+
+    def normalize(self, question: str, language: str) -> List[str]:
+        """Content words of a question: case-folded, punctuation and function words removed"""
+        # Keep letters, combining marks (Indic vowel signs) and digits
+        cleaned = "".join(
+            char if unicodedata.category(char)[0] in "LMN" else " " for char in question.casefold()
+        )
+        words = cleaned.split()
+        stopwords = STOPWORDS.get(language, frozenset())
+        content_words = [word for word in words if word not in stopwords]
+        return content_words or words
+
+    def _features(self, question: str, language: str) -> Tuple[FrozenSet[str], Tuple[str, ...]]:
+        """Shingles of a question and its numbers in the order they are asked"""
+        shingles = set()
+        words = self.normalize(question, language)
+        for word in words:
+            padded = f"^{word}$"
+            if len(padded) <= self.ngram:
+                shingles.add(padded)
+            else:
+                shingles.update(padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1))
+        # Word pairs carry the word order ("sky blue" vs "blue sky"); n-grams
+        # never contain a space, so the two kinds cannot collide. Stray letters
+        # such as the "s" of "why's" are left out of the pairs
+        paired = [word for word in words if len(word) > 1 or word.isdigit()]
+        shingles.update(f"{first} {second}" for first, second in zip(paired, paired[1:]))
+        # A swapped operand changes the answer however similar the rest is
+        numbers = tuple(word for word in words if word.isdigit())
+        return frozenset(shingles), numbers
+
+    def _signature(self, shingles: FrozenSet[str]) -> List[int]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in shingles
+        ]
+        if not hashes:
+            return [0] * len(self._permutations)
+        return [min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in self._permutations]
+
+    def _band_keys(self, signature: List[int], partition: Tuple) -> List[Hashable]:
+        return [
+            (partition, band, tuple(signature[band * self.rows:(band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _remove(self, entry_id: int):
+        entry = self._entries.pop(entry_id)
+        for band in entry.bands:
+            members = self._buckets.get(band)
+            if members is not None:
+                members.discard(entry_id)
+                if not members:
+                    del self._buckets[band]
+
+    def _expire(self):
+        now = time.time()
+        # Entries share one TTL, so insertion order is expiry order for all but
+        # recently re-used ones; stop at the first entry still alive
+        while self._entries:
+            entry_id, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._remove(entry_id)
+            self.counters["expirations"] += 1
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key so only one of them does the work;
+    every caller receives the same result (or exception)
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {
+            "executions": 0,
+            "coalesced": 0
+        }
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None and not task.done():
+            self.counters["coalesced"] += 1
+        else:
+            self.counters["executions"] += 1
+            # The shared work runs as its own task so a disconnecting caller
+            # does not cancel the result everyone else is waiting for
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda finished: self._finish(key, finished))
+
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Coalesced call failed: {task.exception()}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "calls_saved": self.counters["coalesced"],
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,50 @@
+import json
+import logging
+from typing import AsyncIterator, Callable, Dict, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from services.rate_limiter import QuotaExceededError
+
+logger = logging.getLogger(__name__)
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def sse_generation_events(chunks: AsyncIterator[str],
+                                build_final: Callable[[str], BaseModel]) -> AsyncIterator[str]:
+    """
+    Relay text chunks as `chunk` events, then send a `done` event carrying the
+    same fields as the endpoint's regular JSON response
+    """
+    parts = []
+    try:
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield sse_event("chunk", {"text": chunk})
+
+        final = build_final("".join(parts).strip())
+        yield sse_event("done", final.model_dump())
+
+    except QuotaExceededError as e:
+        yield sse_event("error", {"detail": str(e), "status_code": 429, "retry_after": e.retry_after})
+
+    except Exception as e:
+        logger.error(f"Error while streaming generated content: {str(e)}")
+        yield sse_event("error", {"detail": f"Failed to stream content: {str(e)}"})
+
+    finally:
+        # Closing the source generator cancels the upstream Gemini stream when
+        # the client disconnects before the end
+        await chunks.aclose()
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an event generator in a streaming response with proxy buffering disabled"""
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,158 @@
+import os
+import json
+import uuid
+import queue
+import atexit
+import random
+import zlib
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+# Correlates every log line written while serving one HTTP request
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# LogRecord attributes that are not user-supplied fields
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+def bind_request_id(request_id: Optional[str] = None) -> str:
+    """Attach a request ID to the current context (and every task spawned from it)"""
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    return request_id
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """Structured fields passed via `extra=`, minus the sampling flag"""
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in _RESERVED and key != "sample"
+    }
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps verbose records (logged with extra={"sample": True}, e.g. prompt and
+    response previews) for a fraction of requests. The decision is made per
+    request ID, so a sampled request keeps all of its previews.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = max(0.0, min(1.0, rate))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sample", False):
+            return True
+        if self.rate >= 1.0:
+            return True
+        if self.rate <= 0.0:
+            return False
+        request_id = getattr(record, "request_id", None)
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode("utf-8")) % 10000 < self.rate * 10000
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request ID and fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None)
+        }
+        payload.update(record_fields(record))
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc_info"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development, with fields as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = record_fields(record)
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            fields = {"request_id": request_id, **fields}
+        if fields:
+            line += " | " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record as-is; formatting happens on the listener thread"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on log I/O; drop the record instead
+            pass
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None,
+                      sample_rate: Optional[float] = None, max_queue: Optional[int] = None):
+    """
+    Route all logging through a bounded in-memory queue drained by a background
+    thread, so request handlers never wait on terminal or file I/O
+    """
+    global _listener
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+    sample_rate = sample_rate if sample_rate is not None else float(os.getenv("LOG_PREVIEW_SAMPLE_RATE", "0.1"))
+    max_queue = max_queue if max_queue is not None else int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    if _listener is not None:
+        _listener.stop()
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+    handler = _StructuredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records; registered with atexit"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,276 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl
+from starlette.requests import Request
+
+try:
+    import multipart
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import parse_options_header
+    MULTIPART_AVAILABLE = True
+except ImportError:
+    MULTIPART_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+class UploadError(ValueError):
+    """The request body is not a usable multipart or urlencoded form"""
+
+class UploadTooLargeError(UploadError):
+    """A file part is over the configured size cap"""
+
+class StreamedFile:
+    """
+    One uploaded file, written chunk by chunk as it arrives: kept in memory
+    up to `spool_bytes`, then rolled over to a temporary file on disk, and
+    hashed on the way in so the bytes never need a second pass.
+    """
+
+    def __init__(self, field_name: str, filename: str, content_type: str, spool_bytes: int):
+        self.field_name = field_name
+        self.filename = filename
+        self.content_type = content_type
+        self.file = SpooledTemporaryFile(max_size=spool_bytes)
+        self.size = 0
+        self.on_disk = False
+        self._spool_bytes = spool_bytes
+        self._written = 0
+        self._hash = hashlib.sha256()
+        self._pending: List[bytes] = []
+
+    @property
+    def sha256(self) -> str:
+        return self._hash.hexdigest()
+
+    def _receive(self, data: bytes):
+        self.size += len(data)
+        self._hash.update(data)
+        self._pending.append(data)
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        data = b"".join(self._pending)
+        self._pending.clear()
+        if not self.on_disk and self._written + len(data) <= self._spool_bytes:
+            self.file.write(data)
+        else:
+            # Rolling over and every later write touch the disk, so they leave the event loop
+            await asyncio.to_thread(self._write_to_disk, data)
+            self.on_disk = True
+        self._written += len(data)
+
+    def _write_to_disk(self, data: bytes):
+        if not self.on_disk:
+            self.file.rollover()
+        self.file.write(data)
+
+    def close(self):
+        self.file.close()
+
+class StreamedForm:
+    """Text fields and streamed files of a multipart request; close() removes spooled files"""
+
+    def __init__(self):
+        self.fields: Dict[str, List[str]] = {}
+        self.files: Dict[str, StreamedFile] = {}
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        values = self.fields.get(name)
+        return values[0] if values else default
+
+    def getlist(self, name: str) -> List[str]:
+        return list(self.fields.get(name, []))
+
+    def close(self):
+        for upload in self.files.values():
+            upload.close()
+
+class _PartCollector:
+    """python-multipart callbacks that route each part to a text field or a StreamedFile"""
+
+    def __init__(self, form: StreamedForm, file_fields: Iterable[str], max_file_bytes: int,
+                 spool_bytes: int, max_field_bytes: int, max_parts: int):
+        self.form = form
+        self.file_fields = set(file_fields)
+        self.max_file_bytes = max_file_bytes
+        self.spool_bytes = spool_bytes
+        self.max_field_bytes = max_field_bytes
+        self.max_parts = max_parts
+        self.parts = 0
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._name = ""
+        self._data = bytearray()
+        self._file: Optional[StreamedFile] = None
+
+    def callbacks(self) -> Dict[str, object]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end
+        }
+
+    def on_part_begin(self):
+        self.parts += 1
+        if self.parts > self.max_parts:
+            raise UploadError(f"more than {self.max_parts} form parts")
+        self._headers = {}
+        self._data = bytearray()
+        self._file = None
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name, self._header_value = b"", b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise UploadError("form part without a name")
+        self._name = options[b"name"].decode("utf-8", "replace")
+        # Parts named in file_fields are streamed even when sent as plain text
+        # (older clients post the image as a base64 form field)
+        if self._name in self.file_fields:
+            if self._name in self.form.files:
+                raise UploadError(f"more than one '{self._name}' part")
+            self._file = StreamedFile(
+                self._name,
+                options.get(b"filename", b"").decode("utf-8", "replace"),
+                self._headers.get(b"content-type", b"").decode("latin-1"),
+                self.spool_bytes
+            )
+            self.form.files[self._name] = self._file
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is not None:
+            if self._file.size + (end - start) > self.max_file_bytes:
+                raise UploadTooLargeError(f"'{self._name}' is larger than {self.max_file_bytes} bytes")
+            self._file._receive(data[start:end])
+            return
+        if len(self._data) + (end - start) > self.max_field_bytes:
+            raise UploadTooLargeError(f"form field '{self._name}' is larger than {self.max_field_bytes} bytes")
+        self._data += data[start:end]
+
+    def on_part_end(self):
+        if self._file is None:
+            self.form.fields.setdefault(self._name, []).append(self._data.decode("utf-8", "replace"))
+
+async def read_streamed_form(request: Request, file_fields: Iterable[str] = ("image",),
+                             max_file_bytes: int = 20 * 1024 * 1024, spool_bytes: int = 1024 * 1024,
+                             max_field_bytes: int = 64 * 1024, max_parts: int = 64) -> StreamedForm:
+    """
+    Parse a multipart/form-data body as it streams in. Memory per request
+    stays around one network chunk plus `spool_bytes` per file, however big
+    the upload; a file over `max_file_bytes` stops the read at that point.
+    URL-encoded forms, which older clients post with a base64 image field,
+    are still accepted but read whole (see _read_urlencoded_form).
+    The caller owns the returned form and must close() it.
+    """
+    if not MULTIPART_AVAILABLE:
+        raise UploadError("python-multipart is not installed")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    urlencoded = content_type == b"application/x-www-form-urlencoded"
+    if not urlencoded and (content_type != b"multipart/form-data" or b"boundary" not in params):
+        raise UploadError("expected a multipart/form-data or application/x-www-form-urlencoded body")
+
+    file_fields = tuple(file_fields)
+    # URL-encoded file fields are base64 text, with "+", "/" and "=" percent-escaped
+    file_body_bytes = max_file_bytes * 3 // 2 if urlencoded else max_file_bytes
+    limit = file_body_bytes * len(file_fields) + max_field_bytes * max_parts
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise UploadTooLargeError(f"request body is larger than {limit} bytes")
+    if urlencoded:
+        return await _read_urlencoded_form(request, file_fields, max_file_bytes, spool_bytes,
+                                           max_field_bytes, max_parts, limit)
+
+    form = StreamedForm()
+    collector = _PartCollector(form, file_fields, max_file_bytes, spool_bytes, max_field_bytes, max_parts)
+    parser = multipart.MultipartParser(params[b"boundary"], collector.callbacks())
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for upload in form.files.values():
+                await upload._flush()
+        parser.finalize()
+    except MultipartParseError as e:
+        form.close()
+        raise UploadError(f"malformed multipart body: {e}")
+    except BaseException:
+        form.close()
+        raise
+
+    for upload in form.files.values():
+        upload.file.seek(0)
+        logger.info("Streamed upload", extra={
+            "field": upload.field_name,
+            "upload_bytes": upload.size,
+            "spooled_to_disk": upload.on_disk,
+            "sha256": upload.sha256[:16]
+        })
+    return form
+
+async def _read_urlencoded_form(request: Request, file_fields: Iterable[str], max_file_bytes: int,
+                                spool_bytes: int, max_field_bytes: int, max_parts: int,
+                                limit: int) -> StreamedForm:
+    """
+    An application/x-www-form-urlencoded body, into the same StreamedForm.
+    Percent-encoding cannot be decoded part by part, so the body is read
+    whole, up to `limit` bytes. File fields carry base64 (optionally as a
+    data: URL) and end up decoded in StreamedFiles.
+    """
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise UploadTooLargeError(f"request body is larger than {limit} bytes")
+
+    pairs = parse_qsl(body.decode("latin-1"), keep_blank_values=True, encoding="utf-8", errors="replace")
+    if len(pairs) > max_parts:
+        raise UploadError(f"more than {max_parts} form parts")
+    form = StreamedForm()
+    try:
+        for name, value in pairs:
+            if name in file_fields:
+                if name in form.files:
+                    raise UploadError(f"more than one '{name}' part")
+                data = _decode_base64_field(name, value)
+                if len(data) > max_file_bytes:
+                    raise UploadTooLargeError(f"'{name}' is larger than {max_file_bytes} bytes")
+                upload = StreamedFile(name, "", "", spool_bytes)
+                form.files[name] = upload
+                upload._receive(data)
+                await upload._flush()
+                upload.file.seek(0)
+            elif len(value.encode("utf-8")) > max_field_bytes:
+                raise UploadTooLargeError(f"form field '{name}' is larger than {max_field_bytes} bytes")
+            else:
+                form.fields.setdefault(name, []).append(value)
+    except BaseException:
+        form.close()
+        raise
+    return form
+
+def _decode_base64_field(name: str, value: str) -> bytes:
+    if value.startswith("data:"):
+        value = value.partition(",")[2]
+    try:
+        return base64.b64decode("".join(value.split()), validate=True)
+    except (binascii.Error, ValueError) as e:
+        raise UploadError(f"'{name}' is not valid base64: {e}")
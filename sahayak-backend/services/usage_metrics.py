@@ -0,0 +1,290 @@
+import time
+import bisect
+import hashlib
+import heapq
+import itertools
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Any, List, Optional, Tuple
+
+# Histogram bucket upper bounds; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 5000, 10000, 20000, 45000)
+TOKEN_BUCKETS = (50, 100, 200, 400, 800, 1600, 3200)
+
+CACHE_STATUSES = ("hit", "miss", "coalesced")
+
+class Histogram:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def merge(self, other: "Histogram"):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None for the open bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else None
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"le_{bound}" for bound in self.bounds] + [f"gt_{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 1) if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+class _Aggregate:
+    """Counters for one (module, language) pair within one time bucket"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cache = dict.fromkeys(CACHE_STATUSES, 0)
+        self.fallbacks = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.upstream_latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.output_token_histogram = Histogram(TOKEN_BUCKETS)
+
+    def merge(self, other: "_Aggregate"):
+        self.calls += other.calls
+        for status, count in other.cache.items():
+            self.cache[status] += count
+        self.fallbacks += other.fallbacks
+        self.prompt_tokens += other.prompt_tokens
+        self.output_tokens += other.output_tokens
+        self.latency_ms.merge(other.latency_ms)
+        self.upstream_latency_ms.merge(other.upstream_latency_ms)
+        self.output_token_histogram.merge(other.output_token_histogram)
+
+class UsageRecorder:
+    """
+    Rolling per-module, per-language accounting of generation calls: tokens,
+    latency, cache status, fallbacks and estimated cost. Data is kept in
+    one-minute buckets for `window_minutes`; the most expensive prompts in the
+    window are kept for inspection.
+    """
+
+    def __init__(self, window_minutes: int = 60, input_price_per_mtok: float = 0.075,
+                 output_price_per_mtok: float = 0.30, top_prompts: int = 10):
+        self.window_minutes = max(1, window_minutes)
+        self.input_price_per_mtok = input_price_per_mtok
+        self.output_price_per_mtok = output_price_per_mtok
+        self.top_prompts = top_prompts
+        self._buckets: Deque[Tuple[int, Dict[Tuple[str, str], _Aggregate]]] = deque()
+        # (total_tokens, sequence, details) min-heap per minute bucket
+        self._expensive: Deque[Tuple[int, List[tuple]]] = deque()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def record(self, module: str, language: str, grade_level: str, cache: str,
+               latency_seconds: float, prompt_tokens: int = 0, output_tokens: int = 0,
+               upstream_seconds: Optional[float] = None, fallback: bool = False,
+               topic: str = ""):
+        minute = int(time.time() // 60)
+        with self._lock:
+            aggregate = self._bucket(minute).setdefault((module, language), _Aggregate())
+            aggregate.calls += 1
+            aggregate.cache[cache] = aggregate.cache.get(cache, 0) + 1
+            aggregate.fallbacks += int(fallback)
+            aggregate.prompt_tokens += prompt_tokens
+            aggregate.output_tokens += output_tokens
+            aggregate.latency_ms.observe(latency_seconds * 1000)
+            if upstream_seconds is not None:
+                aggregate.upstream_latency_ms.observe(upstream_seconds * 1000)
+                aggregate.output_token_histogram.observe(output_tokens)
+
+            if prompt_tokens or output_tokens:
+                heap = self._expensive_bucket(minute)
+                entry = (prompt_tokens + output_tokens, next(self._sequence), {
+                    "module": module,
+                    "language": language,
+                    "grade_level": grade_level,
+                    "topic": topic[:120],
+                    "prompt_tokens": prompt_tokens,
+                    "output_tokens": output_tokens,
+                    "cost_usd": round(self._cost(prompt_tokens, output_tokens), 6),
+                    "latency_ms": round(latency_seconds * 1000)
+                })
+                if len(heap) < self.top_prompts:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+
+    def snapshot(self, window_minutes: Optional[int] = None) -> Dict[str, Any]:
+        """Aggregates over the last `window_minutes` (default: the whole window)"""
+        window = min(self.window_minutes, window_minutes or self.window_minutes)
+        oldest = int(time.time() // 60) - window + 1
+        with self._lock:
+            self._expire()
+            merged: Dict[Tuple[str, str], _Aggregate] = {}
+            for minute, aggregates in self._buckets:
+                if minute < oldest:
+                    continue
+                for key, aggregate in aggregates.items():
+                    merged.setdefault(key, _Aggregate()).merge(aggregate)
+            expensive = [
+                entry for minute, heap in self._expensive if minute >= oldest for entry in heap
+            ]
+
+        modules: Dict[str, Dict[str, Any]] = {}
+        totals = _Aggregate()
+        for (module, language), aggregate in sorted(merged.items()):
+            totals.merge(aggregate)
+            modules.setdefault(module, {})[language] = self._describe(aggregate)
+
+        return {
+            "window_minutes": window,
+            "prices_per_million_tokens": {
+                "input": self.input_price_per_mtok,
+                "output": self.output_price_per_mtok
+            },
+            "totals": self._describe(totals),
+            "modules": modules,
+            "most_expensive_prompts": [
+                details for _, _, details in heapq.nlargest(self.top_prompts, expensive, key=lambda e: e[:2])
+            ]
+        }
+
+    def _describe(self, aggregate: _Aggregate) -> Dict[str, Any]:
+        upstream_calls = aggregate.cache["miss"]
+        return {
+            "calls": aggregate.calls,
+            "cache": dict(aggregate.cache),
+            "cache_hit_ratio": round((aggregate.cache["hit"] + aggregate.cache["coalesced"]) / aggregate.calls, 3)
+            if aggregate.calls else 0.0,
+            "fallbacks": aggregate.fallbacks,
+            "prompt_tokens": aggregate.prompt_tokens,
+            "output_tokens": aggregate.output_tokens,
+            "avg_tokens_per_upstream_call": round(
+                (aggregate.prompt_tokens + aggregate.output_tokens) / upstream_calls, 1
+            ) if upstream_calls else 0.0,
+            "cost_usd": round(self._cost(aggregate.prompt_tokens, aggregate.output_tokens), 6),
+            "latency_ms": aggregate.latency_ms.to_dict(),
+            "upstream_latency_ms": aggregate.upstream_latency_ms.to_dict(),
+            "output_tokens_histogram": aggregate.output_token_histogram.to_dict()
+        }
+
+    def _cost(self, prompt_tokens: int, output_tokens: int) -> float:
+        return (prompt_tokens * self.input_price_per_mtok + output_tokens * self.output_price_per_mtok) / 1_000_000
+
+    def _bucket(self, minute: int) -> Dict[Tuple[str, str], _Aggregate]:
+        if not self._buckets or self._buckets[-1][0] != minute:
+            self._buckets.append((minute, {}))
+            self._expire()
+        return self._buckets[-1][1]
+
+    def _expensive_bucket(self, minute: int) -> List[tuple]:
+        if not self._expensive or self._expensive[-1][0] != minute:
+            self._expensive.append((minute, []))
+        return self._expensive[-1][1]
+
+    def _expire(self):
+        oldest = int(time.time() // 60) - self.window_minutes + 1
+        while self._buckets and self._buckets[0][0] < oldest:
+            self._buckets.popleft()
+        while self._expensive and self._expensive[0][0] < oldest:
+            self._expensive.popleft()
+
+class PrefixReuseTracker:
+    """
+    Measures how much of the prompt input is a static prefix (the system
+    instruction) that was already sent within `window_seconds`, the span over
+    which the provider can reuse it. Counts calls by prefix mode
+    (system_instruction, context_cache or inline) and compares upstream
+    latency of calls with a reused prefix against first uses. Inline prefixes
+    are part of the prompt text, which the provider never reuses, so they
+    are reported separately and never count as reuse.
+    """
+
+    REUSABLE_MODES = ("system_instruction", "context_cache")
+
+    def __init__(self, window_seconds: float = 3600, max_prefixes: int = 1024):
+        self.window_seconds = window_seconds
+        self.max_prefixes = max_prefixes
+        self._last_sent: "OrderedDict[str, float]" = OrderedDict()
+        self._modes: Dict[str, int] = {}
+        self._counters = {
+            "calls": 0,
+            "prefix_reused": 0,
+            "prefix_tokens": 0,
+            "reused_prefix_tokens": 0,
+            "suffix_tokens": 0,
+            "provider_cached_tokens": 0,
+            "inline_calls": 0,
+            "inline_prefix_tokens": 0
+        }
+        self._upstream_ms = {
+            "reused": Histogram(LATENCY_BUCKETS_MS),
+            "first_use": Histogram(LATENCY_BUCKETS_MS),
+            "inline": Histogram(LATENCY_BUCKETS_MS)
+        }
+        self._lock = threading.Lock()
+
+    def record(self, prefix: str, mode: str, prefix_tokens: int, suffix_tokens: int,
+               upstream_seconds: Optional[float] = None, provider_cached_tokens: int = 0):
+        reusable = mode in self.REUSABLE_MODES
+        digest = hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        with self._lock:
+            reused = False
+            if reusable:
+                last_sent = self._last_sent.pop(digest, None)
+                reused = last_sent is not None and now - last_sent <= self.window_seconds
+                self._last_sent[digest] = now
+                if len(self._last_sent) > self.max_prefixes:
+                    self._last_sent.popitem(last=False)
+            else:
+                self._counters["inline_calls"] += 1
+                self._counters["inline_prefix_tokens"] += prefix_tokens
+
+            self._counters["calls"] += 1
+            self._counters["prefix_reused"] += int(reused)
+            self._counters["prefix_tokens"] += prefix_tokens
+            self._counters["reused_prefix_tokens"] += prefix_tokens if reused else 0
+            self._counters["suffix_tokens"] += suffix_tokens
+            self._counters["provider_cached_tokens"] += provider_cached_tokens
+            self._modes[mode] = self._modes.get(mode, 0) + 1
+            if upstream_seconds is not None:
+                histogram = "inline" if not reusable else "reused" if reused else "first_use"
+                self._upstream_ms[histogram].observe(upstream_seconds * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            modes = dict(self._modes)
+            upstream = {name: histogram.to_dict() for name, histogram in self._upstream_ms.items()}
+            distinct = len(self._last_sent)
+        input_tokens = counters["prefix_tokens"] + counters["suffix_tokens"]
+        reusable_calls = counters["calls"] - counters["inline_calls"]
+        return {
+            **counters,
+            "distinct_prefixes": distinct,
+            # Among calls that send the prefix in a form the provider can reuse
+            "reuse_rate": round(counters["prefix_reused"] / reusable_calls, 3) if reusable_calls else 0.0,
+            # Share of all input tokens that repeat a recently sent prefix
+            "reused_token_share": round(counters["reused_prefix_tokens"] / input_tokens, 3)
+            if input_tokens else 0.0,
+            "modes": modes,
+            "upstream_latency_ms": upstream
+        }
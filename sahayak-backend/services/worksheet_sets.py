@@ -0,0 +1,121 @@
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+logger = logging.getLogger(__name__)
+
+# A worksheet with fewer questions is treated as incomplete and regenerated alone
+MIN_QUESTIONS = 5
+
+def question_with_options(question: Any, options: List[Any]) -> str:
+    """Multiple choice question text with its options on an indented line"""
+    return str(question) + (
+        "\n   " + "   ".join(f"({chr(97 + i)}) {option}" for i, option in enumerate(options))
+        if options else ""
+    )
+
+class WorksheetSection(BaseModel):
+    heading: str = ""
+    instructions: str = ""
+    questions: List[str] = Field(default_factory=list)
+
+    @field_validator("questions", mode="before")
+    @classmethod
+    def _question_text(cls, questions: Any) -> Any:
+        # Multiple choice questions sometimes come back as {"question", "options"}
+        if not isinstance(questions, list):
+            return questions
+        flattened = []
+        for question in questions:
+            if isinstance(question, dict) and "question" in question:
+                question = question_with_options(question["question"], question.get("options") or [])
+            flattened.append(question)
+        return flattened
+
+class GradeWorksheet(BaseModel):
+    """One grade's worksheet from a multi-grade structured response"""
+
+    grade: str
+    title: str = ""
+    objectives: List[str] = Field(default_factory=list)
+    sections: List[WorksheetSection] = Field(min_length=1)
+    answer_key: List[str] = Field(default_factory=list)
+
+    @field_validator("grade", mode="before")
+    @classmethod
+    def _grade_text(cls, grade: Any) -> Any:
+        return str(grade).strip() if isinstance(grade, (int, str)) else grade
+
+    @property
+    def question_count(self) -> int:
+        return sum(len([q for q in section.questions if q.strip()]) for section in self.sections)
+
+    def render(self) -> str:
+        """Plain-text worksheet in the layout of the per-grade worksheets"""
+        lines = [self.title or f"Grade {self.grade} Worksheet", ""]
+        if self.objectives:
+            lines.append("Learning objectives:")
+            lines.extend(f"- {objective}" for objective in self.objectives)
+            lines.append("")
+
+        number = 0
+        for section in self.sections:
+            if section.heading:
+                lines.append(section.heading)
+            if section.instructions:
+                lines.append(section.instructions)
+            for question in section.questions:
+                if question.strip():
+                    number += 1
+                    lines.append(f"{number}. {question.strip()}")
+            lines.append("")
+
+        if self.answer_key:
+            lines.append("Answer key:")
+            lines.extend(f"{index}. {answer}" for index, answer in enumerate(self.answer_key, 1))
+        return "\n".join(lines).strip()
+
+def extract_json(text: str) -> Any:
+    """JSON value in a model response, tolerating markdown fences and surrounding prose"""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in response")
+    return json.loads(text[start:end + 1])
+
+def parse_worksheet_set(text: str, grades: List[str],
+                        min_questions: int = MIN_QUESTIONS) -> Tuple[Dict[str, GradeWorksheet], Dict[str, str]]:
+    """
+    Split a multi-grade response into ({grade: worksheet}, {grade: reason}).
+    Every requested grade is in exactly one of the two; a grade fails when it
+    is missing, malformed, duplicated or has fewer than `min_questions`.
+    """
+    valid: Dict[str, GradeWorksheet] = {}
+    invalid: Dict[str, str] = {}
+    try:
+        items = extract_json(text).get("worksheets")
+        if not isinstance(items, list):
+            raise ValueError("'worksheets' is not a list")
+    except (ValueError, AttributeError) as e:
+        return {}, {grade: f"unparseable response: {e}" for grade in grades}
+
+    for item in items:
+        try:
+            worksheet = GradeWorksheet.model_validate(item)
+        except ValidationError as e:
+            logger.debug(f"Invalid worksheet in multi-grade response: {e}")
+            continue
+        if worksheet.grade not in grades or worksheet.grade in invalid:
+            continue
+        if worksheet.grade in valid:
+            invalid[worksheet.grade] = "duplicate worksheet"
+            del valid[worksheet.grade]
+        elif worksheet.question_count < min_questions:
+            invalid[worksheet.grade] = f"{worksheet.question_count} questions"
+        else:
+            valid[worksheet.grade] = worksheet
+
+    for grade in grades:
+        if grade not in valid and grade not in invalid:
+            invalid[grade] = "missing or malformed"
+    return valid, invalid
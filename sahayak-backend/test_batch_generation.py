@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the batch content endpoint: bounded fan-out, per-item SSE results, cache reuse
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from test_fakes import fake_gemini, fake_model
+
+SLOW_CALL_SECONDS = 0.2
+DISTINCT_TOPICS = 12
+
+
+CountingSlowModel = fake_model(
+    lambda call: f"Generated content for prompt of {len(call.prompt)} characters", delay=SLOW_CALL_SECONDS
+)
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def spec(index):
+    return {
+        "topic": f"water cycle part {index}",
+        "gradeLevel": "3",
+        "contentType": "content",
+        "language": "en",
+        "length": "short",
+    }
+
+
+def test_batch_streams_every_item_and_reuses_cache():
+    cache_dir = tempfile.mkdtemp()
+
+    async def run():
+        from main import app
+
+        # Every topic twice: duplicates must be served without another upstream call
+        items = [spec(index % DISTINCT_TOPICS) for index in range(DISTINCT_TOPICS * 2)]
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            started = time.perf_counter()
+            response = await client.post("/content/generate/batch", json={"items": items})
+            return response, time.perf_counter() - started
+
+    with fake_gemini(CountingSlowModel, GOOGLE_AI_CACHE_ENABLED="true", GOOGLE_AI_RPM="1000",
+                     GOOGLE_AI_CACHE_PATH=os.path.join(cache_dir, "responses.sqlite3")):
+        response, elapsed = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    items = [data for name, data in events if name == "item"]
+    assert events[-1][0] == "done"
+    assert events[-1][1]["total"] == DISTINCT_TOPICS * 2
+    assert events[-1][1]["succeeded"] == DISTINCT_TOPICS * 2
+    assert sorted(item["index"] for item in items) == list(range(DISTINCT_TOPICS * 2))
+    assert all(item["status"] == "ok" and item["content"].startswith("Generated content") for item in items)
+
+    assert len(CountingSlowModel.calls) == DISTINCT_TOPICS
+    sequential = DISTINCT_TOPICS * SLOW_CALL_SECONDS
+    print(f"   batch of {DISTINCT_TOPICS * 2}: {elapsed:.2f}s (sequential upstream time {sequential:.2f}s)")
+    assert elapsed < sequential / 2
+
+
+def fail_part_one(call):
+    if "part 1" in call.prompt:
+        raise ValueError("Request contains an invalid argument")
+    return "Generated content for the water cycle"
+
+
+PartlyFailingModel = fake_model(fail_part_one)
+
+
+def test_failed_items_are_reported_as_errors():
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.post("/content/generate/batch", json={"items": [spec(index) for index in range(3)]})
+
+    with fake_gemini(PartlyFailingModel, GOOGLE_AI_RPM="1000"):
+        response = asyncio.run(run())
+
+    events = parse_events(response.text)
+    items = {data["index"]: data for name, data in events if name == "item"}
+    assert items[1]["status"] == "error" and items[1]["status_code"] == 502
+    assert "content" not in items[1]
+    assert items[0]["status"] == items[2]["status"] == "ok"
+    assert events[-1][1]["succeeded"] == 2 and events[-1][1]["failed"] == 1
+
+
+def test_batch_rejects_empty_request():
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.post("/content/generate/batch", json={"items": []})
+
+    assert asyncio.run(run()).status_code == 422
+
+
+if __name__ == "__main__":
+    test_batch_streams_every_item_and_reuses_cache()
+    test_failed_items_are_reported_as_errors()
+    test_batch_rejects_empty_request()
+    print("✅ Batch generation tests passed")
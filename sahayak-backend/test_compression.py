@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Test negotiated gzip/brotli response compression, including SSE streams
+"""
+import asyncio
+import json
+import sys
+import os
+import zlib
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+from services.compression import BROTLI_AVAILABLE, CompressionMiddleware, negotiate_encoding
+
+if BROTLI_AVAILABLE:
+    import brotli
+
+# Without the optional brotli package every client gets gzip
+ENCODINGS = ("br", "gzip") if BROTLI_AVAILABLE else ("gzip",)
+PREFERRED = ENCODINGS[0]
+from services.sse import sse_event, sse_response
+
+HINDI_LESSON = "जल चक्र में पानी भाप बनकर ऊपर जाता है और बादल बनते हैं। " * 60
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/lesson")
+    async def lesson():
+        return {"lesson_plan": HINDI_LESSON, "language": "hi"}
+
+    @app.get("/small")
+    async def small():
+        return {"status": "healthy"}
+
+    @app.get("/image")
+    async def image():
+        return Response(os.urandom(4096), media_type="image/png")
+
+    @app.get("/stream")
+    async def stream():
+        async def events():
+            for index in range(5):
+                yield sse_event("chunk", {"text": f"भाग {index}: {HINDI_LESSON[:200]}"})
+            yield sse_event("done", {"lesson_plan": "..."})
+        return sse_response(events())
+
+    return app
+
+
+def test_negotiation_honours_q_values():
+    assert negotiate_encoding("gzip, deflate, br") == PREFERRED
+    assert negotiate_encoding("br;q=0.5, gzip") == "gzip"
+    assert negotiate_encoding("br;q=0, gzip;q=0.1") == "gzip"
+    assert negotiate_encoding("*") == PREFERRED
+    assert negotiate_encoding("gzip, br", ("gzip", "br")) == "gzip"
+    assert negotiate_encoding("br", ("gzip", "br")) == PREFERRED
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("") is None
+
+
+def test_large_json_is_compressed_and_small_is_not():
+    async def run():
+        async with httpx.AsyncClient(app=build_app(), base_url="http://test") as client:
+            results = {}
+            for encoding in ENCODINGS + ("identity",):
+                results[encoding] = await client.get("/lesson", headers={"Accept-Encoding": encoding})
+            results["small"] = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+            results["image"] = await client.get("/image", headers={"Accept-Encoding": "gzip"})
+            return results
+
+    results = asyncio.run(run())
+    identity_size = results["identity"].num_bytes_downloaded
+    for encoding in ENCODINGS:
+        response = results[encoding]
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == response.num_bytes_downloaded
+        assert response.num_bytes_downloaded < identity_size / 5
+        assert response.json()["lesson_plan"] == HINDI_LESSON
+    assert "content-encoding" not in results["identity"].headers
+    assert "content-encoding" not in results["small"].headers
+    assert "content-encoding" not in results["image"].headers
+
+
+def test_sse_chunks_are_flushed_individually():
+    decompressors = {"gzip": lambda: zlib.decompressobj(31), "br": lambda: brotli.Decompressor()}
+    for encoding in ENCODINGS:
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async def receive():
+            # The client stays connected until the stream ends
+            await asyncio.sleep(3600)
+
+        scope = {
+            "type": "http", "method": "GET", "path": "/stream", "raw_path": b"/stream",
+            "query_string": b"", "root_path": "", "scheme": "http", "server": ("test", 80),
+            "headers": [(b"accept-encoding", encoding.encode())]
+        }
+        asyncio.run(build_app()(scope, receive, send))
+
+        start = messages[0]
+        headers = {name.decode(): value.decode() for name, value in start["headers"]}
+        assert headers["content-encoding"] == encoding
+        assert "content-length" not in headers
+
+        # Every compressed chunk decodes on its own to whole SSE events
+        decoder = decompressors[encoding]()
+        decode = decoder.decompress if encoding == "gzip" else decoder.process
+        events = []
+        for message in messages[1:]:
+            if message["body"]:
+                text = decode(message["body"]).decode("utf-8")
+                if message.get("more_body"):
+                    assert text.endswith("\n\n")
+                events.extend(block for block in text.split("\n\n") if block)
+        assert [block.split("\n")[0] for block in events] == ["event: chunk"] * 5 + ["event: done"]
+        assert json.loads(events[0].split("data: ", 1)[1])["text"].startswith("भाग 0")
+
+
+if __name__ == "__main__":
+    test_negotiation_honours_q_values()
+    test_large_json_is_compressed_and_small_is_not()
+    test_sse_chunks_are_flushed_individually()
+    print("✅ Compression tests passed")
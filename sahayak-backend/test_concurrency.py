@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test that concurrent /content/generate calls do not block each other or the event loop
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from test_fakes import fake_gemini, fake_model
+
+SLOW_CALL_SECONDS = 0.3
+CONCURRENT_REQUESTS = 50
+
+
+# Stand-in for genai.GenerativeModel whose blocking call takes a fixed time
+SlowModel = fake_model(
+    lambda call: f"Generated content for prompt of {len(call.prompt)} characters", delay=SLOW_CALL_SECONDS
+)
+
+
+async def run_concurrent_requests():
+    from main import app
+
+    def payload(index):
+        # Distinct topics so every request is a real upstream call
+        return {
+            "topic": f"water cycle part {index}",
+            "gradeLevel": "3",
+            "contentType": "content",
+            "language": "en",
+            "length": "short",
+        }
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        started = time.perf_counter()
+        generation = asyncio.gather(*[
+            client.post("/content/generate", json=payload(i)) for i in range(CONCURRENT_REQUESTS)
+        ])
+
+        # The health check must be answered while generation is still in flight
+        await asyncio.sleep(SLOW_CALL_SECONDS / 3)
+        health_started = time.perf_counter()
+        health = await client.get("/health")
+        health_latency = time.perf_counter() - health_started
+
+        responses = await generation
+        elapsed = time.perf_counter() - started
+
+    return responses, elapsed, health, health_latency
+
+
+def test_concurrent_generation_does_not_serialize():
+    # A fresh singleton so the executor picks up the concurrency cap
+    with fake_gemini(SlowModel, GOOGLE_AI_MAX_CONCURRENCY=str(CONCURRENT_REQUESTS), GOOGLE_AI_RPM="1000"):
+        responses, elapsed, health, health_latency = asyncio.run(run_concurrent_requests())
+
+    assert all(r.status_code == 200 for r in responses)
+    assert all("Generated content" in r.json()["content"] for r in responses)
+    assert health.status_code == 200
+    assert health_latency < SLOW_CALL_SECONDS
+
+    # 50 slow calls should take about as long as one, not fifty
+    print(f"{CONCURRENT_REQUESTS} requests finished in {elapsed:.2f}s "
+          f"(one call: {SLOW_CALL_SECONDS:.2f}s, serial: {SLOW_CALL_SECONDS * CONCURRENT_REQUESTS:.2f}s)")
+    assert elapsed < SLOW_CALL_SECONDS * 5
+
+
+if __name__ == "__main__":
+    test_concurrent_generation_does_not_serialize()
+    print("✅ Concurrent generation test passed")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Shared Gemini stand-ins for the backend tests: a model factory that records
+every call, so each test only supplies its response logic, and a context
+manager that installs the model on a fresh GenkitAIService
+"""
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, NamedTuple, Optional
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import google.generativeai as genai
+
+from services.genkit_ai_service import GenkitAIService
+from services.image_ingestion import image_ingestor
+from services.page_analysis import page_analyzer
+from services.pregeneration import topic_traffic
+from services.question_bank import question_bank
+
+
+class FakeResponse:
+    """Mimics the SDK's GenerateContentResponse"""
+
+    def __init__(self, text: str, candidates=(), usage_metadata=None):
+        self.text = text
+        self.candidates = list(candidates)
+        self.usage_metadata = usage_metadata
+
+
+class FakeCall(NamedTuple):
+    """One generate_content call as the model saw it"""
+
+    model: Any
+    contents: Any
+    prompt: str
+    generation_config: Any
+    kwargs: dict
+
+
+def prompt_text(contents) -> str:
+    """The text parts of a prompt, without any images"""
+    if isinstance(contents, list):
+        return "\n".join(part for part in contents if isinstance(part, str))
+    return contents
+
+
+class _FakeModel:
+    respond: Callable[[FakeCall], Any]
+    delay = 0.0
+    calls: list
+    created: list
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.system_instruction = None
+        type(self).created.append(self)
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        call = FakeCall(self, contents, prompt_text(contents), generation_config, kwargs)
+        type(self).calls.append(call)
+        if self.delay:
+            time.sleep(self.delay)
+        response = self.respond(call)
+        return FakeResponse(response) if isinstance(response, str) else response
+
+    @classmethod
+    def prompts(cls):
+        return [call.prompt for call in cls.calls]
+
+
+class _InstructedFakeModel(_FakeModel):
+    def __init__(self, model_name, system_instruction=None):
+        super().__init__(model_name)
+        self.system_instruction = system_instruction
+
+
+def fake_model(respond: Callable[[FakeCall], Any], delay: float = 0.0,
+               system_instruction: bool = False) -> type:
+    """
+    A genai.GenerativeModel stand-in whose generate_content sleeps `delay`
+    seconds and returns respond(call), wrapping plain strings in a
+    FakeResponse; exceptions raised by respond reach the service unchanged.
+    Calls and constructed models are recorded on the class. Models only take
+    a system_instruction when asked to, like SDKs older than 0.5.
+    """
+    base = _InstructedFakeModel if system_instruction else _FakeModel
+    return type("FakeModel", (base,), {
+        "respond": staticmethod(respond), "delay": delay, "calls": [], "created": []
+    })
+
+
+def _clear_singletons():
+    for singleton in (image_ingestor, page_analyzer, question_bank, topic_traffic):
+        singleton.cache_clear()
+
+
+@contextmanager
+def fake_gemini(model: type, **env: Optional[str]):
+    """
+    Run against a fresh GenkitAIService backed by `model`, with the calls it
+    recorded so far cleared. The response cache is off, and the topic traffic
+    log and question bank live in a temporary directory unless `env` says
+    otherwise, so tests never write to the real cache files; `env` values of
+    None unset a variable. Everything is restored on exit.
+    """
+    scratch = tempfile.TemporaryDirectory(ignore_cleanup_errors=True)
+    settings = {
+        "GOOGLE_AI_CACHE_ENABLED": "false",
+        "PREGEN_TRAFFIC_PATH": os.path.join(scratch.name, "traffic.sqlite3"),
+        "WORKSHEET_BANK_PATH": os.path.join(scratch.name, "question_bank.sqlite3"),
+        **env
+    }
+    original_model = genai.GenerativeModel
+    original_instance = GenkitAIService._instance
+    original_env = {name: os.environ.get(name) for name in settings}
+    try:
+        for name, value in settings.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        _clear_singletons()
+        GenkitAIService._instance = None
+        service = GenkitAIService()
+        service.genkit_available = True
+        genai.GenerativeModel = model
+        model.calls.clear()
+        model.created.clear()
+        yield service
+    finally:
+        genai.GenerativeModel = original_model
+        GenkitAIService._instance = original_instance
+        _clear_singletons()
+        for name, value in original_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        scratch.cleanup()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test the deadline-aware worksheet fallback cascade: tiers are skipped or cut
+short by the request deadline and the static template needs no provider call
+"""
+import asyncio
+import base64
+import io
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from PIL import Image
+
+from services.fallback_cascade import FallbackCascade
+from services.rate_limiter import QuotaExceededError
+from services.resilience import Deadline
+from test_fakes import fake_gemini, fake_model
+
+
+def test_cascade_checks_remaining_time_before_each_tier():
+    cascade = FallbackCascade()
+    calls = []
+
+    async def failing(timeout):
+        calls.append(("failing", round(timeout, 1)))
+        raise RuntimeError("upstream error")
+
+    async def slow(timeout):
+        calls.append(("slow", round(timeout, 1)))
+        await asyncio.sleep(10)
+
+    async def fast(timeout):
+        calls.append(("fast", round(timeout, 1)))
+        return "generated"
+
+    async def run():
+        # A failing tier falls through to the next one
+        first = await cascade.run([("a", 0.1, failing), ("b", 0.1, fast)], lambda: "static", Deadline(5))
+
+        # A slow tier is cut off at the deadline; nothing is left for the next AI tier
+        started = time.perf_counter()
+        second = await cascade.run([("c", 0.1, slow), ("b", 0.1, fast)], lambda: "static", Deadline(0.3))
+        elapsed = time.perf_counter() - started
+
+        # Not enough time left to start at all
+        third = await cascade.run([("b", 1.0, fast)], lambda: "static", Deadline(0.5))
+
+        async def quota(timeout):
+            raise QuotaExceededError("quota", retry_after=60)
+
+        try:
+            await cascade.run([("q", 0.1, quota)], lambda: "static", Deadline(5))
+            assert False, "expected QuotaExceededError"
+        except QuotaExceededError:
+            pass
+        return first, second, third, elapsed
+
+    first, second, third, elapsed = asyncio.run(run())
+    assert (first, second, third) == ("generated", "static", "static")
+    assert 0.25 < elapsed < 0.6
+    assert [name for name, _ in calls] == ["failing", "fast", "slow"]
+    assert calls[2][1] <= 0.3
+
+    stats = cascade.stats()
+    assert stats["a"] == {"served": 0, "failed": 1, "skipped": 0}
+    assert stats["b"] == {"served": 1, "failed": 0, "skipped": 2}
+    assert stats["c"]["failed"] == 1 and "q" not in stats
+    assert stats["static"]["served"] == 2
+
+
+def broken(call):
+    raise ValueError("Request contains an invalid argument")
+
+
+HangingModel = fake_model(lambda call: "1. A worksheet question that arrived too late.", delay=2)
+BrokenModel = fake_model(broken)
+
+
+def page_photo(shade):
+    output = io.BytesIO()
+    image = Image.new("RGB", (600, 800), "white")
+    image.paste((shade, shade, shade), (0, 0, 300, 400))
+    image.save(output, format="JPEG")
+    return base64.b64encode(output.getvalue()).decode("ascii")
+
+
+def test_worksheet_request_is_bounded_by_deadline():
+    from routers import worksheets
+
+    original_limits = (worksheets.WORKSHEET_DEADLINE_SECONDS, worksheets.WORKSHEET_TIER_MIN_SECONDS)
+    settings = {"GOOGLE_AI_RPM": "1000", "GOOGLE_AI_BREAKER_FAILURE_THRESHOLD": "1000"}
+
+    async def run(shade):
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=30) as client:
+            started = time.perf_counter()
+            response = await client.post("/worksheets/generate-with-vision", json={
+                "image": page_photo(shade), "grades": ["1", "2", "3", "4", "5"], "subject": "Science"
+            })
+            return response, time.perf_counter() - started
+
+    try:
+        worksheets.WORKSHEET_DEADLINE_SECONDS = 1.0
+        worksheets.WORKSHEET_TIER_MIN_SECONDS = 0.3
+        with fake_gemini(HangingModel, **settings) as service:
+            hanging, hanging_seconds = asyncio.run(run(0))
+            blocking_calls = service.get_stats()["blocking_calls"]
+        with fake_gemini(BrokenModel, **settings):
+            broken, broken_seconds = asyncio.run(run(128))
+    finally:
+        worksheets.WORKSHEET_DEADLINE_SECONDS, worksheets.WORKSHEET_TIER_MIN_SECONDS = original_limits
+
+    # A provider that never answers in time: the page analysis is cut off with
+    # time reserved for the grades, whose calls time out too; every grade gets
+    # the static template and the request stays at ~1 s
+    assert hanging.status_code == 200
+    assert list(hanging.json()["worksheets"]) == ["1", "2", "3", "4", "5"]
+    assert all("standard template" in text for text in hanging.json()["worksheets"].values())
+    assert hanging_seconds < 1.5
+    assert len(HangingModel.calls) <= 1 + 5
+    # The abandoned calls still hold threads, but only in the bulk pool
+    assert blocking_calls["interactive"] == 0 and 1 <= blocking_calls["bulk"] <= service.bulk_max_concurrency
+
+    # A provider that fails at once: each grade tries vision, then the short
+    # worksheet, then the static template -- at most two calls per grade
+    assert broken.status_code == 200
+    assert all("standard template" in text for text in broken.json()["worksheets"].values())
+    assert broken_seconds < 1.5
+    assert len(BrokenModel.calls) == 1 + 2 * 5
+
+    stats = worksheets.WORKSHEET_CASCADE.stats()
+    assert stats["static"]["served"] >= 10
+    assert stats["page_analysis"]["failed"] == 2
+    assert stats["vision"]["failed"] >= 5 and stats["short"]["failed"] >= 5
+
+
+def test_pipeline_error_is_reported_and_counted():
+    from routers import worksheets
+
+    original_topic = worksheets.bank_topic
+
+    def broken_topic(request, analysis):
+        raise RuntimeError("question bank misconfigured")
+
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.post("/worksheets/generate-with-vision", json={
+                "image": "", "grades": ["3", "4"], "subject": "Science"
+            })
+
+    try:
+        with fake_gemini(BrokenModel):
+            worksheets.bank_topic = broken_topic
+            before = worksheets.WORKSHEET_CASCADE.stats()
+            response = asyncio.run(run())
+            after = worksheets.WORKSHEET_CASCADE.stats()
+    finally:
+        worksheets.bank_topic = original_topic
+
+    # Still usable worksheets, but not passed off as generated ones
+    assert response.status_code == 200
+    body = response.json()
+    assert body["success"] is False and "failed" in body["message"]
+    assert all("standard template" in text for text in body["worksheets"].values())
+    assert after["pipeline"]["failed"] == before.get("pipeline", {}).get("failed", 0) + 1
+    assert after["static"]["served"] == before.get("static", {}).get("served", 0) + 2
+
+
+if __name__ == "__main__":
+    test_cascade_checks_remaining_time_before_each_tier()
+    test_worksheet_request_is_bounded_by_deadline()
+    test_pipeline_error_is_reported_and_counted()
+    print("✅ Fallback cascade tests passed")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test the textbook page image pipeline: decode once, downscale, send with every grade
+"""
+import asyncio
+import base64
+import io
+import random
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from PIL import Image, ImageDraw
+
+from services.image_ingestion import ImageIngestionError, ImageIngestor
+from test_fakes import fake_gemini, fake_model
+
+
+def phone_photo(width=4000, height=3000, orientation=6):
+    """A noisy landscape JPEG with lines of 'text', stored rotated like a phone camera does"""
+    rng = random.Random(7)
+    image = Image.effect_noise((width, height), 40).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for line in range(40):
+        y = 100 + line * 70
+        draw.rectangle((200, y, 200 + rng.randint(1500, 3500), y + 30), fill=(20, 20, 20))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=92, exif=exif)
+    return output.getvalue()
+
+
+def test_photo_is_downscaled_and_rotated():
+    ingestor = ImageIngestor(max_side=1024, quality=80)
+    original = phone_photo()
+    prepared = ingestor.prepare(original)
+
+    # Orientation 6 means "rotate 90°": the portrait page comes out upright
+    assert (prepared.width, prepared.height) == (768, 1024)
+    assert prepared.mime_type == "image/jpeg"
+    assert len(prepared.data) < len(original) / 10
+    assert Image.open(io.BytesIO(prepared.data)).size == (768, 1024)
+
+    report = prepared.report()
+    assert report["bytes_saved"] == len(original) - len(prepared.data)
+    assert report["decode_ms"] > 0 and report["resize_ms"] > 0
+
+    stats = ingestor.stats()
+    assert stats["images"] == 1 and stats["bytes_saved"] == report["bytes_saved"]
+
+    try:
+        ingestor.prepare(b"not an image")
+        assert False, "expected ImageIngestionError"
+    except ImageIngestionError:
+        pass
+    assert ingestor.stats()["failed"] == 1
+
+
+MultimodalModel = fake_model(lambda call: "1. Name the parts of the plant shown on the page.")
+
+
+def test_one_prepared_image_sent_for_every_grade():
+    photo = base64.b64encode(phone_photo()).decode("ascii")
+
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=60) as client:
+            ok = await client.post("/worksheets/generate-with-vision", json={
+                "image": "data:image/jpeg;base64," + photo, "grades": ["3", "4", "5"], "subject": "Science"
+            })
+            invalid = await client.post("/worksheets/generate-with-vision", json={
+                "image": "bm90IGFuIGltYWdl", "grades": ["3"], "subject": "Science"
+            })
+            stats = await client.get("/worksheets/image-stats")
+            return ok, invalid, stats
+
+    with fake_gemini(MultimodalModel, GOOGLE_AI_RPM="1000"):
+        ok, invalid, stats = asyncio.run(run())
+
+    assert ok.status_code == 200
+    assert list(ok.json()["worksheets"]) == ["3", "4", "5"]
+    assert invalid.status_code == 400
+
+    # The page analysis came back unusable, so every grade got the same
+    # prepared image ahead of its own prompt
+    sent = [call.contents for call in MultimodalModel.calls]
+    assert len(sent) == 4
+    parts = [contents[0] for contents in sent]
+    assert all(part["mime_type"] == "image/jpeg" for part in parts)
+    assert all(part["data"] is parts[0]["data"] for part in parts)
+    assert sorted(contents[1].rsplit("'", 2)[1] for contents in sent) == [
+        "Grade 3 Science worksheet", "Grade 4 Science worksheet", "Grade 5 Science worksheet",
+        "Textbook page analysis"
+    ]
+
+    stats = stats.json()
+    assert stats["images"] == 1 and stats["failed"] == 1
+    assert stats["bytes_saved"] > 0
+
+
+if __name__ == "__main__":
+    test_photo_is_downscaled_and_rotated()
+    test_one_prepared_image_sent_for_every_grade()
+    print("✅ Image ingestion tests passed")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test adaptive max_output_tokens and early stop of over-long streams
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.genkit_ai_service import WORD_LIMITS
+from services.output_budget import OutputBudget
+from test_fakes import fake_gemini, fake_model
+
+
+def test_budget_follows_length_language_and_measurements():
+    budget = OutputBudget(WORD_LIMITS, min_samples=3)
+
+    short_en = budget.max_output_tokens("short", "en", "answer")
+    long_en = budget.max_output_tokens("long", "en", "answer")
+    short_hi = budget.max_output_tokens("short", "hi", "answer")
+    assert short_en < 800 < long_en * 1.5
+    assert short_en < long_en
+    assert short_hi > short_en * 1.5
+    assert budget.max_output_tokens("long", "en", "worksheet") > long_en
+    assert budget.max_output_tokens("long", "ml", "worksheet") == budget.ceiling
+
+    # Measured ratios replace the prior once there are enough samples
+    for _ in range(3):
+        budget.observe("hi", words=200, output_tokens=400)
+    assert budget.tokens_per_word("hi") == 2.0
+    assert budget.max_output_tokens("short", "hi", "answer") < short_hi
+
+    budget.record_truncation("short", "en", "answer")
+    assert budget.max_output_tokens("short", "en", "answer") > short_en
+    assert budget.stats()["truncated"] == 1
+
+
+RecordingModel = fake_model(lambda call: "A short answer about the water cycle.")
+
+
+def test_generation_config_is_sized_per_request():
+    async def run():
+        await service.generate_text("What is rain?", language="en", length="short", content_type="answer")
+        await service.generate_text("What is rain?", language="hi", length="long", content_type="answer")
+
+    with fake_gemini(RecordingModel) as service:
+        asyncio.run(run())
+
+    short_en, long_hi = [call.generation_config.max_output_tokens for call in RecordingModel.calls]
+    assert short_en == service.output_budget.max_output_tokens("short", "en", "answer")
+    assert long_hi == service.output_budget.max_output_tokens("long", "hi", "answer")
+    assert short_en < 800 < long_hi
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class Call:
+    cancelled = False
+
+    def cancel(self):
+        Call.cancelled = True
+
+
+class EndlessStream:
+    """Keeps producing 20-word chunks until cancelled"""
+
+    produced = 0
+
+    def __init__(self):
+        self._iterator = Call()
+
+    def __iter__(self):
+        for _ in range(200):
+            if Call.cancelled:
+                return
+            EndlessStream.produced += 1
+            time.sleep(0.005)
+            yield Chunk("word " * 20)
+
+
+StreamingModel = fake_model(lambda call: EndlessStream())
+
+
+def test_stream_stops_once_word_limit_is_clearly_exceeded():
+    async def run():
+        return [chunk async for chunk in service.generate_text_stream(
+            "Explain rain", language="en", length="short", content_type="answer"
+        )]
+
+    Call.cancelled = False
+    EndlessStream.produced = 0
+    with fake_gemini(StreamingModel) as service:
+        chunks = asyncio.run(run())
+
+    words = sum(len(chunk.split()) for chunk in chunks)
+    limit = service.output_budget.stream_word_limit("short")
+    assert limit < words <= limit + 20
+    assert Call.cancelled
+    assert EndlessStream.produced < 200
+    assert service.output_budget.stats()["streams_stopped_early"] == 1
+    assert service.circuit_breaker.stats()["state"] == "closed"
+
+
+def stream_or_answer(call):
+    if call.kwargs.get("stream"):
+        return EndlessStream()
+    return "Rain falls when droplets in clouds grow heavy."
+
+
+StreamOrAnswerModel = fake_model(stream_or_answer)
+
+
+def test_early_stopped_stream_is_not_cached():
+    options = dict(language="en", length="short", content_type="answer")
+
+    async def run():
+        streamed = [chunk async for chunk in service.generate_text_stream("Explain rain", **options)]
+        return streamed, await service.generate_text("Explain rain", **options)
+
+    Call.cancelled = False
+    with tempfile.TemporaryDirectory() as directory, \
+            fake_gemini(StreamOrAnswerModel, GOOGLE_AI_CACHE_ENABLED="true",
+                        GOOGLE_AI_CACHE_PATH=os.path.join(directory, "responses.sqlite3")) as service:
+        streamed, answer = asyncio.run(run())
+
+    assert Call.cancelled and len(streamed) > 1
+    assert answer == "Rain falls when droplets in clouds grow heavy."
+    assert [bool(call.kwargs.get("stream")) for call in StreamOrAnswerModel.calls] == [True, False]
+
+
+if __name__ == "__main__":
+    test_budget_follows_length_language_and_measurements()
+    test_generation_config_is_sized_per_request()
+    test_stream_stops_once_word_limit_is_clearly_exceeded()
+    test_early_stopped_stream_is_not_cached()
+    print("✅ Output budget tests passed")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test the textbook page analysis cache: perceptual hashing of re-photographed
+pages and worksheet prompts built from a cached analysis instead of the image
+"""
+import asyncio
+import base64
+import io
+import json
+import random
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from PIL import Image, ImageDraw, ImageEnhance
+
+from services.image_ingestion import ImageIngestor, hash_distance
+from services.page_analysis import PageAnalysis, PageAnalysisCache
+from test_fakes import fake_gemini, fake_model
+
+
+def textbook_page(seed):
+    """A page of 'text' lines and the odd diagram, in a layout that depends on `seed`"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (3000, 4000), (235, 230, 220))
+    draw = ImageDraw.Draw(image)
+    y = 150
+    while y < 3800:
+        if rng.random() < 0.15:
+            height = rng.randint(300, 900)
+            x = rng.randint(200, 1500)
+            draw.ellipse((x, y, x + rng.randint(400, 1300), y + height), outline=(30, 30, 30), width=12)
+            y += height + 80
+        else:
+            draw.rectangle((200, y, 200 + rng.randint(1500, 2600), y + 30), fill=(20, 20, 20))
+            y += 90
+    return image
+
+
+def photograph(page, crop=0.0, tilt=0.0, brightness=1.0, size=(3000, 4000), quality=90):
+    """JPEG bytes of `page` as another phone would take it"""
+    width, height = page.size
+    image = page.crop((int(width * crop), int(height * crop), int(width * (1 - crop)), int(height * (1 - crop))))
+    image = ImageEnhance.Brightness(image.resize(size)).enhance(brightness)
+    image = image.rotate(tilt, fillcolor="white")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+ANALYSIS = {
+    "title": "Food and Photosynthesis",
+    "summary": "Green leaves make food for the plant using sunlight, water and air.",
+    "concepts": ["Photosynthesis happens in green leaves", "Chlorophyll gives leaves their colour"],
+    "vocabulary": [{"term": "chlorophyll", "meaning": "green pigment in leaves"}, "stomata: tiny pores"],
+    "exercises": ["Why are leaves called the food factories of a plant?"],
+    "diagrams": ["A leaf with arrows for sunlight, water and carbon dioxide"]
+}
+
+
+def test_rephotographed_page_matches_within_threshold():
+    ingestor = ImageIngestor()
+    page = textbook_page(1)
+    original = ingestor.prepare(photograph(page))
+    retake = ingestor.prepare(photograph(page, crop=0.01, tilt=0.5, brightness=1.2, size=(2400, 3200), quality=60))
+    others = [ingestor.prepare(photograph(textbook_page(seed))) for seed in range(2, 8)]
+
+    # Different bytes, nearly the same perceptual hash
+    assert original.digest != retake.digest
+    assert hash_distance(original.phash, retake.phash) <= 8
+    assert all(hash_distance(original.phash, other.phash) > 8 for other in others)
+    assert original.report()["hash_ms"] > 0
+
+    # A second worker finds the analysis through the shared SQLite file
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "responses.sqlite3")
+        analysis = PageAnalysis.model_validate(ANALYSIS)
+        asyncio.run(PageAnalysisCache(disk_path=path).set(original.phash, analysis))
+
+        other_worker = PageAnalysisCache(disk_path=path)
+        found, distance = asyncio.run(other_worker.get(retake.phash))
+        assert found == analysis and distance == hash_distance(original.phash, retake.phash)
+        assert asyncio.run(other_worker.get(others[0].phash)) is None
+        assert other_worker.stats()["near_hits"] + other_worker.stats()["exact_hits"] == 1
+
+    assert analysis.vocabulary[0] == "chlorophyll: green pigment in leaves"
+    assert "Key vocabulary:\n- chlorophyll: green pigment in leaves\n- stomata: tiny pores" in analysis.render()
+
+
+def test_late_commits_from_other_workers_are_synced():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "responses.sqlite3")
+        analysis = PageAnalysis.model_validate(ANALYSIS)
+        writer, reader = PageAnalysisCache(disk_path=path), PageAnalysisCache(disk_path=path)
+        first_page, second_page = 0, (1 << 64) - 1
+
+        asyncio.run(writer.set(first_page, analysis))
+        assert asyncio.run(reader.get(first_page)) == (analysis, 0)
+
+        # Stamped before the reader's last sync but committed after it
+        writer._set_disk(second_page, analysis.model_dump_json(), time.time() - 60)
+        assert asyncio.run(reader.get(second_page)) == (analysis, 0)
+
+
+def answer_analysis_prompt(call):
+    if "Textbook page analysis" in call.prompt:
+        return json.dumps(ANALYSIS)
+    return "1. Which part of the plant makes its food?"
+
+
+AnalysisModel = fake_model(answer_analysis_prompt)
+
+
+def test_cached_analysis_replaces_image_for_every_grade():
+    page = textbook_page(1)
+    first_photo = base64.b64encode(photograph(page)).decode("ascii")
+    second_photo = base64.b64encode(photograph(page, crop=0.01, brightness=0.9, quality=70)).decode("ascii")
+
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=60) as client:
+            first = await client.post("/worksheets/generate-with-vision", json={
+                "image": first_photo, "grades": ["3", "4", "5"], "subject": "Science"
+            })
+            calls_after_first = len(AnalysisModel.calls)
+            # Another teacher photographs the same page for other grades
+            second = await client.post("/worksheets/generate-with-vision", json={
+                "image": second_photo, "grades": ["4", "6"], "subject": "Science"
+            })
+            stats = await client.get("/worksheets/page-analysis-stats")
+            return first, second, calls_after_first, stats
+
+    with fake_gemini(AnalysisModel, GOOGLE_AI_RPM="1000"):
+        first, second, calls_after_first, stats = asyncio.run(run())
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert list(first.json()["worksheets"]) == ["3", "4", "5"]
+    assert list(second.json()["worksheets"]) == ["4", "6"]
+
+    # One multimodal call for the analysis, then text-only prompts built from it
+    first_calls, second_calls = AnalysisModel.calls[:calls_after_first], AnalysisModel.calls[calls_after_first:]
+    assert [isinstance(call.contents, list) for call in first_calls] == [True, False, False, False]
+    assert [isinstance(call.contents, list) for call in second_calls] == [False, False]
+    assert all("Page title: Food and Photosynthesis" in call.prompt for call in first_calls[1:] + second_calls)
+
+    stats = stats.json()
+    assert stats["analyses"] == 1 and stats["failed"] == 0
+    assert stats["cache"]["misses"] == 1
+    assert stats["cache"]["exact_hits"] + stats["cache"]["near_hits"] == 1
+
+
+if __name__ == "__main__":
+    test_rephotographed_page_matches_within_threshold()
+    test_late_commits_from_other_workers_are_synced()
+    test_cached_analysis_replaces_image_for_every_grade()
+    print("✅ Page analysis tests passed")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Test the cache pre-generation runner, its budget and the topic traffic log
+"""
+import asyncio
+import datetime
+import sys
+import os
+import tempfile
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from services.pregeneration import PregenerationRunner, TopicTraffic, next_window, topic_traffic
+from services.response_cache import backend_path
+from pregenerate import ENDPOINTS
+from test_fakes import fake_gemini, fake_model
+
+SPECS = [
+    {"endpoint": "content", "topic": ["Water cycle", "Photosynthesis"], "grade_level": "3", "language": "en"},
+    {"endpoint": "lessons", "topic": "Fractions", "subject": "Mathematics", "grade_level": "4", "language": "hi"},
+    {"endpoint": "assessment", "grade_level": ["2", "3"], "language": "en", "difficulty": "easy"},
+]
+
+
+CountingModel = fake_model(lambda call: "Pre-generated classroom content.")
+
+
+def with_service(run, max_requests=500):
+    cache_dir = tempfile.mkdtemp()
+    with fake_gemini(CountingModel, GOOGLE_AI_CACHE_ENABLED="true",
+                     GOOGLE_AI_CACHE_PATH=os.path.join(cache_dir, "responses.sqlite3"),
+                     PREGEN_TRAFFIC_PATH=os.path.join(cache_dir, "traffic.sqlite3")) as service:
+        runner = PregenerationRunner(service, ENDPOINTS, max_requests=max_requests, concurrency=1)
+        return asyncio.run(run(runner))
+
+
+def test_specs_expand_to_every_combination():
+    runner = PregenerationRunner(None, ENDPOINTS)
+    requests = runner.expand(SPECS + [
+        {"endpoint": "content", "topic": "Water cycle", "grade_level": "3", "language": "en"},  # duplicate
+        {"endpoint": "lessons", "topic": "Missing subject", "grade_level": "4", "language": "en"},  # invalid
+        {"endpoint": "visuals", "topic": "Unknown endpoint"}
+    ])
+    assert [endpoint for endpoint, _ in requests] == ["content", "content", "lessons", "assessment", "assessment"]
+    assert {request.grade_level for endpoint, request in requests if endpoint == "assessment"} == {"2", "3"}
+
+
+def test_pregenerated_specs_are_served_from_cache():
+    async def run(runner):
+        from main import app
+
+        first = await runner.run(SPECS)
+        upstream_after_warmup = len(CountingModel.calls)
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            responses = [
+                await client.post("/content/generate", json={
+                    "topic": "Photosynthesis", "gradeLevel": "3", "language": "en"
+                }),
+                await client.post("/lessons/generate", json={
+                    "topic": "Fractions", "subject": "Mathematics", "grade_level": "4", "language": "hi"
+                }),
+                await client.post("/assessment/generate-text", json={
+                    "grade_level": "2", "language": "en", "difficulty": "easy"
+                }),
+            ]
+        second = await runner.run(SPECS)
+        return first, second, upstream_after_warmup, responses
+
+    first, second, upstream_after_warmup, responses = with_service(run)
+
+    assert first["generated"] == 5
+    assert first["stopped"] is None
+    assert upstream_after_warmup == 5
+    assert all(response.status_code == 200 for response in responses)
+    assert "Pre-generated classroom content." in responses[0].json()["content"]
+    # Every classroom request and the second nightly run hit the cache
+    assert len(CountingModel.calls) == 5
+    assert second["already_cached"] == 5
+    assert second["generated"] == 0
+
+
+def test_run_stops_at_request_budget():
+    report = with_service(lambda runner: runner.run(SPECS), max_requests=2)
+
+    assert report["generated"] == 2
+    assert report["requests_used"] == 2
+    assert report["stopped"] == "budget_exhausted"
+    assert report["skipped"] == 3
+    assert len(CountingModel.calls) == 2
+
+
+def test_test_requests_stay_out_of_the_real_traffic_log():
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            await client.post("/content/generate", json={
+                "topic": "Test-only topic", "gradeLevel": "3", "language": "en"
+            })
+        await asyncio.sleep(0.1)  # recorded off the event loop
+        return topic_traffic()
+
+    with fake_gemini(CountingModel):
+        traffic = asyncio.run(run())
+        recorded = traffic.top(days=1)
+
+    assert not traffic.path.startswith(backend_path("cache"))
+    assert [params["topic"] for _, params, _ in recorded] == ["Test-only topic"]
+
+
+def test_traffic_log_ranks_topics():
+    traffic = TopicTraffic(os.path.join(tempfile.mkdtemp(), "traffic.sqlite3"))
+    for _ in range(3):
+        traffic.record("content", {"topic": "Water  cycle", "grade_level": "3"})
+    traffic.record("content", {"topic": "Rainbows", "grade_level": "3"})
+    traffic.record("lessons", {"topic": "Fractions", "grade_level": "4"})
+    traffic.record("lessons", {"topic": "Fractions", "grade_level": "4"})
+
+    top = traffic.top(days=7, limit=2)
+    assert top == [
+        ("content", {"topic": "Water cycle", "grade_level": "3"}, 3),
+        ("lessons", {"topic": "Fractions", "grade_level": "4"}, 2)
+    ]
+
+
+def test_off_peak_window():
+    evening = datetime.datetime(2024, 6, 1, 21, 0)
+    start, end = next_window("22:00-04:00", evening)
+    assert datetime.datetime.fromtimestamp(start) == datetime.datetime(2024, 6, 1, 22, 0)
+    assert datetime.datetime.fromtimestamp(end) == datetime.datetime(2024, 6, 2, 4, 0)
+
+    inside = datetime.datetime(2024, 6, 2, 2, 30)
+    start, end = next_window("22:00-04:00", inside)
+    assert datetime.datetime.fromtimestamp(start) == inside
+    assert datetime.datetime.fromtimestamp(end) == datetime.datetime(2024, 6, 2, 4, 0)
+
+
+if __name__ == "__main__":
+    test_specs_expand_to_every_combination()
+    test_pregenerated_specs_are_served_from_cache()
+    test_run_stops_at_request_budget()
+    test_test_requests_stay_out_of_the_real_traffic_log()
+    test_traffic_log_ranks_topics()
+    test_off_peak_window()
+    print("✅ Pre-generation tests passed")
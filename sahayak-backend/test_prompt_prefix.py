@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test the split of prompts into a static system instruction and a per-request suffix
+"""
+import asyncio
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.prompt_templates import PromptRegistry
+from test_fakes import fake_gemini, fake_model
+
+
+def test_split_matches_render():
+    registry = PromptRegistry()
+    registry.register("lesson", "Teach grade {grade}.\nUse local examples.\n\nTopic: {topic} for grade {grade}")
+
+    variant = registry.variant("lesson", grade=4)
+    prefix, suffix = variant.split(topic="rivers")
+    assert prefix == "Teach grade 4.\nUse local examples.\n\n"
+    assert suffix == "Topic: rivers for grade 4"
+    assert prefix + suffix == variant.render(topic="rivers")
+    assert variant.split(topic="{x}")[0] == prefix
+
+    # Without per-request fields the whole text is the prefix
+    assert registry.variant("lesson", grade=4, topic="rivers").split() == (
+        "Teach grade 4.\nUse local examples.\n\nTopic: rivers for grade 4", ""
+    )
+    assert registry.stats()["hot_templates"][0]["renders"] == 4
+
+
+def explain_rivers(call):
+    return "Rivers carry water from the hills to the sea."
+
+
+InstructedModel = fake_model(explain_rivers, system_instruction=True)
+PlainModel = fake_model(explain_rivers)
+
+
+def _generate(model_class, calls):
+    async def run():
+        for topic, options in calls:
+            await service.generate_text(topic, **options)
+
+    with fake_gemini(model_class) as service:
+        asyncio.run(run())
+        return service
+
+
+def test_static_prefix_sent_as_system_instruction():
+    grade_3 = dict(language="en", grade_level="3", content_type="content", length="short")
+    service = _generate(InstructedModel, [
+        ("rivers", grade_3),
+        ("mountains", grade_3),
+        ("forests", grade_3),
+        ("rivers", dict(grade_3, grade_level="4"))
+    ])
+
+    # One model per distinct instruction, built once and reused
+    instructions = [model.system_instruction for model in InstructedModel.created]
+    assert len(instructions) == 2
+    assert "grade 3 students" in instructions[0]
+    assert "mountains" not in instructions[0]
+    assert InstructedModel.calls[1].contents == "Write about 'mountains':"
+
+    stats = service.get_stats()["prompt_prefix"]
+    assert stats["calls"] == 4
+    assert stats["prefix_reused"] == 2
+    assert stats["reuse_rate"] == 0.5
+    assert stats["modes"] == {"system_instruction": 4}
+    assert stats["distinct_prefixes"] == 2
+    assert 0.4 < stats["reused_token_share"] < 0.5
+
+
+def test_instructions_and_inline_fallback():
+    service = _generate(PlainModel, [
+        ("Grade 4 Science worksheet", dict(
+            language="en", grade_level="4", content_type="worksheet", length="long",
+            instructions="Create 8-12 questions from the textbook page."
+        ))
+    ])
+
+    # An SDK without system instructions gets the whole prompt, instructions before the topic
+    prompt = PlainModel.calls[0].contents
+    assert [model.system_instruction for model in PlainModel.created] == [None]
+    assert prompt.index("8-12 questions") < prompt.index("Write about 'Grade 4 Science worksheet':")
+    assert service.get_stats()["prompt_prefix"]["modes"] == {"inline": 1}
+
+    params = dict(language="en", content_type="worksheet", grade_level="4", subject="Science", length="long")
+    assert service._cache_key("worksheet", **params) != service._cache_key(
+        "worksheet", **params, instructions="Create 8-12 questions."
+    )
+
+
+def test_inline_prefixes_are_not_reported_as_reuse():
+    grade_3 = dict(language="en", grade_level="3", content_type="content", length="short")
+    service = _generate(PlainModel, [("rivers", grade_3), ("mountains", grade_3), ("forests", grade_3)])
+
+    # The provider sees the prefix as plain prompt text every time
+    stats = service.get_stats()["prompt_prefix"]
+    assert stats["inline_calls"] == 3 and stats["inline_prefix_tokens"] == stats["prefix_tokens"]
+    assert stats["prefix_reused"] == 0
+    assert stats["reuse_rate"] == 0.0 and stats["reused_token_share"] == 0.0
+    assert stats["upstream_latency_ms"]["inline"]["count"] == 3
+
+
+if __name__ == "__main__":
+    test_split_matches_render()
+    test_static_prefix_sent_as_system_instruction()
+    test_instructions_and_inline_fallback()
+    test_inline_prefixes_are_not_reported_as_reuse()
+    print("✅ Prompt prefix tests passed")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test the compiled, versioned prompt template registry
+"""
+import sys
+import os
+import threading
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.prompt_templates import PromptRegistry, PROMPTS
+from test_fakes import fake_gemini, fake_model
+
+# The prompt tests never generate; the service just needs to stay off the real cache files
+IdleModel = fake_model(lambda call: "")
+
+
+def test_render_matches_format():
+    registry = PromptRegistry()
+    registry.register("greeting", "Hello {name}, welcome to grade {grade}. Bye {name}!")
+
+    rendered = registry.render("greeting", {"grade": 4}, name="Asha")
+    assert rendered == "Hello Asha, welcome to grade 4. Bye Asha!"
+
+    # Braces in values are inserted verbatim, never re-parsed
+    assert registry.render("greeting", {"grade": "{x}"}, name="{name}") == \
+        "Hello {name}, welcome to grade {x}. Bye {name}!"
+
+
+def test_variants_compiled_once():
+    registry = PromptRegistry()
+    registry.register("worksheet", "Grade {grade} worksheet on {subject}")
+
+    for _ in range(5):
+        registry.render("worksheet", {"grade": "3", "subject": "Science"})
+    registry.render("worksheet", {"grade": "4", "subject": "Science"})
+
+    stats = registry.stats()
+    assert stats["compiled_variants"] == 2
+    assert stats["hot_templates"][0] == {
+        "name": "worksheet",
+        "renders": 6,
+        "compiled_variants": 2,
+        "version": registry.version("worksheet")
+    }
+
+
+def test_render_counts_are_exact_across_threads():
+    registry = PromptRegistry()
+    registry.register("question", "Question for {name}: {{literal}} braces stay")
+
+    def render_many():
+        for _ in range(2000):
+            registry.variant("question").split(name="Asha")
+
+    threads = [threading.Thread(target=render_many) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.render("question", name="Ravi") == "Question for Ravi: {literal} braces stay"
+    assert registry.stats()["hot_templates"][0]["renders"] == 8 * 2000 + 1
+
+
+def test_version_tracks_template_text():
+    registry = PromptRegistry()
+    first = registry.register("passage", "Write about {topic}").version
+    assert registry.register("passage", "\n  Write about {topic}\n").version == first
+    assert registry.register("passage", "Write a story about {topic}").version != first
+
+
+def test_cache_key_includes_template_version():
+    params = dict(language="en", content_type="content", grade_level="3", subject="Science", length="short")
+    with fake_gemini(IdleModel) as service:
+        key = service._cache_key("water cycle", **params)
+
+        original = PROMPTS._templates["educational.en"]
+        try:
+            PROMPTS.register("educational.en", original.source + "\nUse Indian examples.")
+            assert service._cache_key("water cycle", **params) != key
+        finally:
+            PROMPTS._templates["educational.en"] = original
+
+        assert service._cache_key("water cycle", **params) == key
+
+
+def test_educational_prompt_renders_topic():
+    with fake_gemini(IdleModel) as service:
+        prompt = service._create_educational_prompt("photosynthesis", "en", "story", "2", "short")
+
+    # The topic appears once, at the very end, after the static instructions
+    assert prompt.count("photosynthesis") == 1
+    assert "Content Type: story" in prompt
+    assert "Word Limit: 100-150 words" in prompt
+    assert prompt.endswith("Write about 'photosynthesis':")
+
+
+def test_reregistered_template_replaces_served_variant():
+    original = PROMPTS._templates["educational.other"].source
+    with fake_gemini(IdleModel) as service:
+        before = service._create_educational_prompt("rivers", "ta", "story", "3", "short")
+        try:
+            PROMPTS.register("educational.other", "Revised instructions in {language} for grade {grade_level}.")
+            after = service._create_educational_prompt("rivers", "ta", "story", "3", "short")
+        finally:
+            PROMPTS.register("educational.other", original)
+        restored = service._create_educational_prompt("rivers", "ta", "story", "3", "short")
+
+    assert "Revised instructions in ta for grade 3." in after and after != before
+    assert restored == before
+
+
+if __name__ == "__main__":
+    test_render_matches_format()
+    test_variants_compiled_once()
+    test_render_counts_are_exact_across_threads()
+    test_version_tracks_template_text()
+    test_cache_key_includes_template_version()
+    test_educational_prompt_renders_topic()
+    test_reregistered_template_replaces_served_variant()
+    print("✅ Prompt template tests passed")
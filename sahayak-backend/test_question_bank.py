@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Test the worksheet question bank: questions parsed out of generated
+worksheets, near-duplicates dropped, and bank-mode worksheets assembled from
+banked questions with Gemini called only for the missing question types
+"""
+import asyncio
+import io
+import json
+import re
+import sqlite3
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from PIL import Image, ImageDraw
+
+from services.question_bank import BankedQuestion, QuestionBank, parse_blueprint, parse_worksheet_questions
+from services.response_cache import backend_path
+from test_fakes import fake_gemini, fake_model
+
+
+WORKSHEET = """**Grade 4 Science Worksheet: Photosynthesis**
+
+**Learning Objectives:**
+1. Understand how plants make food.
+
+**Section A: Fill in the Blanks**
+1. Plants make their food in the ________.
+2. The green pigment in leaves is called ________.
+
+**Section B: True or False**
+3. Plants need sunlight to make food.
+4. Roots make food for the plant.
+
+**Section C: Match the following**
+5. Leaf - Food factory
+
+**Section D: Short Answer Questions**
+6. Why are leaves called the food factories of plants?
+7. Name two things a plant needs for photosynthesis.
+
+**Answer Key**
+1. leaves
+"""
+
+
+def test_bank_drops_near_duplicates_and_rotates_questions():
+    questions = parse_worksheet_questions(WORKSHEET)
+    assert [question.type for question in questions] == [
+        "fill_in_the_blank", "fill_in_the_blank", "true_false", "true_false", "short_answer", "short_answer"
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "question_bank.sqlite3")
+        bank = QuestionBank(path)
+        added = asyncio.run(bank.add("Science", "4", "Food and Photosynthesis", questions, "per_grade"))
+        assert len(added) == 6
+
+        # Another worker, same questions reworded slightly or with other spacing
+        other_worker = QuestionBank(path)
+        again = [
+            BankedQuestion(type="fill_in_the_blank", question="Plants make their food in the ______ ."),
+            BankedQuestion(type="short_answer", question="Why are the leaves called food factories of plants?"),
+            BankedQuestion(type="short_answer", question="How does water reach the leaves of a plant?")
+        ]
+        added = asyncio.run(other_worker.add("science", "4", "food and photosynthesis!", again, "top_up"))
+        assert [question.question for question in added] == ["How does water reach the leaves of a plant?"]
+        assert other_worker.stats()["duplicates"] == 2
+
+        # Least-served questions first, so repeat requests rotate through the bank
+        blueprint = {"short_answer": 2, "multiple_choice": 1}
+        first, shortfall = asyncio.run(other_worker.assemble("Science", "4", "Food and Photosynthesis", blueprint))
+        assert shortfall == {"multiple_choice": 1}
+
+        # An assembly that is not used (e.g. too few questions) serves nothing
+        unused, _ = asyncio.run(other_worker.assemble("Science", "4", "Food and Photosynthesis", blueprint))
+        assert unused == first and other_worker.stats()["questions_served"] == 0
+
+        asyncio.run(other_worker.mark_served("Science", "4", "Food and Photosynthesis", first))
+        second, _ = asyncio.run(other_worker.assemble("Science", "4", "Food and Photosynthesis", blueprint))
+        assert len(first) == len(second) == 2
+        assert len({question.question for question in first + second}) == 3
+        assert other_worker.stats()["questions_served"] == 2
+        assert asyncio.run(other_worker.assemble("Science", "5", "Food and Photosynthesis", blueprint))[0] == []
+
+
+def test_late_commits_from_other_workers_are_deduplicated():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "question_bank.sqlite3")
+        bank = QuestionBank(path)
+        first = [BankedQuestion(type="short_answer", question="Why do leaves change colour in autumn?")]
+        assert len(asyncio.run(bank.add("Science", "4", "Leaves", first, "per_grade"))) == 1
+
+        # Another worker stamped its question before this bank's last sync but committed it later
+        with sqlite3.connect(path) as connection:
+            connection.execute(
+                "INSERT INTO questions (subject, grade, topic, type, question, answer, fingerprint, source, "
+                "created_at) VALUES ('science', '4', 'leaves', 'short_answer', ?, '', 'late', 'per_grade', ?)",
+                ("How does water travel from the roots to the leaves?", time.time() - 60)
+            )
+
+        again = [BankedQuestion(type="short_answer", question="How does water travel from roots to the leaves?"),
+                 BankedQuestion(type="short_answer", question="Why do leaves change colour in autumn?")]
+        assert asyncio.run(bank.add("Science", "4", "Leaves", again, "top_up")) == []
+        assert bank.stats()["duplicates"] == 2
+
+
+def test_only_heading_shaped_lines_start_sections():
+    worksheet = """**True or False**
+1. Plants need sunlight to make food.
+Think about the question of where food is made before you answer.
+2. Roots make food for the plant.
+Part of this page is about leaves
+3. Leaves are green because of chlorophyll.
+Section E
+4. Why do plants need water?
+Answer key
+1. True
+"""
+    questions = parse_worksheet_questions(worksheet)
+    assert [question.type for question in questions] == ["true_false"] * 3 + ["short_answer"]
+
+
+def test_invalid_blueprint_falls_back_to_default():
+    assert parse_blueprint("multiple_choice:4, true_false:2") == {"multiple_choice": 4, "true_false": 2}
+    assert parse_blueprint("multiple_choice:lots") == {}
+    assert parse_blueprint("essays:2") == {}
+
+
+ANALYSIS = {
+    "title": "Food and Photosynthesis",
+    "summary": "Green leaves make food for the plant using sunlight, water and air.",
+    "concepts": ["Photosynthesis happens in green leaves"],
+    "vocabulary": ["chlorophyll: green pigment in leaves"]
+}
+
+
+def answer_bank_prompt(call):
+    prompt = call.prompt
+    if "Textbook page analysis" in prompt:
+        return json.dumps(ANALYSIS)
+    if "QUESTIONS NEEDED:" in prompt:
+        needed = prompt.split("QUESTIONS NEEDED:")[1].split("QUESTIONS ALREADY")[0]
+        questions = []
+        topics = "leaves roots stems seeds flowers".split()
+        for count, question_type in re.findall(r"- (\d+) (\w+)", needed):
+            if question_type == "fill_in_the_blank":
+                # Already banked from the per-grade worksheet
+                questions.append({"type": question_type, "question": "Plants make their food in the _____ .",
+                                  "answer": "leaves"})
+            for index in range(int(count)):
+                questions.append({
+                    "type": question_type,
+                    "question": f"{question_type.replace('_', ' ')} about {topics[index]} "
+                                f"for call {len(BankModel.calls)}",
+                    "options": ["one", "two", "three", "four"] if question_type == "multiple_choice" else [],
+                    "answer": "one"
+                })
+        return json.dumps({"questions": questions})
+    return WORKSHEET
+
+
+BankModel = fake_model(answer_bank_prompt)
+
+
+def page_photo():
+    image = Image.new("RGB", (1200, 1600), "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(100, 1500, 60):
+        draw.rectangle((100, y, 100 + (y * 7) % 900 + 100, y + 20), fill="black")
+    output = io.BytesIO()
+    image.save(output, format="JPEG")
+    return output.getvalue()
+
+
+def test_bank_mode_assembles_worksheets_without_ai_calls():
+    photo = page_photo()
+
+    async def run():
+        from main import app
+
+        def post(grades, mode):
+            return client.post("/worksheets/generate-with-vision/upload", files={
+                "image": ("page.jpg", photo, "image/jpeg")
+            }, data={"grades": ",".join(grades), "subject": "Science", "mode": mode})
+
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=60) as client:
+            # A grade-4 worksheet generated in full fills the bank
+            generated = await post(["4"], "per_grade")
+            calls_generated = len(BankModel.calls)
+
+            # Bank mode: grade 4 only needs the types its worksheet lacked, grade 5 everything
+            topped_up = await post(["4", "5"], "bank")
+            top_up_prompts = BankModel.prompts()[calls_generated:]
+
+            started = time.perf_counter()
+            assembled = await post(["4", "5"], "bank")
+            assembled_seconds = time.perf_counter() - started
+            calls_assembled = len(BankModel.calls) - calls_generated - len(top_up_prompts)
+
+            stats = await client.get("/worksheets/question-bank-stats")
+            return generated, calls_generated, topped_up, top_up_prompts, assembled, assembled_seconds, \
+                calls_assembled, stats
+
+    with tempfile.TemporaryDirectory() as directory:
+        bank_path = os.path.join(directory, "question_bank.sqlite3")
+        with fake_gemini(BankModel, GOOGLE_AI_RPM="1000", WORKSHEET_BANK_PATH=bank_path):
+            generated, calls_generated, topped_up, top_up_prompts, assembled, assembled_seconds, \
+                calls_assembled, stats = asyncio.run(run())
+
+    assert generated.status_code == 200 and calls_generated == 2  # page analysis + grade 4
+
+    # One top-up call per grade, asking only for what the bank is missing
+    assert topped_up.status_code == 200
+    assert len(top_up_prompts) == 2
+    grade_4 = next(prompt for prompt in top_up_prompts if "Grade 4" in prompt)
+    needed = grade_4.split("QUESTIONS NEEDED:")[1].split("QUESTIONS ALREADY")[0]
+    assert "- 3 multiple_choice" in needed and "- 1 fill_in_the_blank" in needed
+    assert "true_false" not in needed and "short_answer" not in needed
+    worksheet = topped_up.json()["worksheets"]["4"]
+    assert "Multiple Choice" in worksheet and "Plants need sunlight to make food." in worksheet
+    assert worksheet.count("Plants make their food in the") == 1
+
+    # Everything banked now: no AI call at all, grade 5 even has a full answer key
+    assert assembled.status_code == 200 and calls_assembled == 0
+    assert assembled_seconds < 1.0
+    assert "Answer key:" in assembled.json()["worksheets"]["5"]
+    assert "standard template" not in assembled.json()["worksheets"]["4"]
+
+    stats = stats.json()
+    assert stats["enabled"] and stats["duplicates"] >= 1
+    assert stats["assemblies"] == 4 and stats["avg_assembly_ms"] < 100
+    assert stats["questions"]["multiple_choice"] == 6
+
+
+def test_test_worksheets_stay_out_of_the_real_question_bank():
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=60) as client:
+            response = await client.post("/worksheets/generate-with-vision/upload", files={
+                "image": ("page.jpg", page_photo(), "image/jpeg")
+            }, data={"grades": "4", "subject": "Science"})
+            stats = await client.get("/worksheets/question-bank-stats")
+        return response, stats.json()
+
+    with fake_gemini(BankModel, GOOGLE_AI_RPM="1000"):
+        response, stats = asyncio.run(run())
+
+    assert response.status_code == 200
+    assert not stats["path"].startswith(backend_path("cache"))
+    assert stats["added"] > 0
+
+
+if __name__ == "__main__":
+    test_bank_drops_near_duplicates_and_rotates_questions()
+    test_late_commits_from_other_workers_are_deduplicated()
+    test_only_heading_shaped_lines_start_sections()
+    test_invalid_blueprint_falls_back_to_default()
+    test_bank_mode_assembles_worksheets_without_ai_calls()
+    test_test_worksheets_stay_out_of_the_real_question_bank()
+    print("✅ Question bank tests passed")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test the Gemini RPM/TPM scheduler and the 429 + Retry-After contract
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from google.api_core import exceptions as google_exceptions
+
+from services.rate_limiter import GeminiRateLimiter, QuotaExceededError, INTERACTIVE, BULK
+from test_fakes import fake_gemini, fake_model
+
+
+def test_burst_is_queued_then_admitted():
+    async def run():
+        # 600 RPM refills one request every 0.1s
+        limiter = GeminiRateLimiter(requests_per_minute=600, tokens_per_minute=1_000_000, max_wait_seconds=5)
+        limiter._request_bucket = 2
+        started = time.perf_counter()
+        waits = await asyncio.gather(*[limiter.acquire(100) for _ in range(5)])
+        return waits, time.perf_counter() - started, limiter.stats()
+
+    waits, elapsed, stats = asyncio.run(run())
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+    assert 0.25 <= elapsed < 1.0
+    assert stats["admitted"] == 5
+    assert stats["queued"] == 3
+    assert stats["queue_depth"] == 0
+
+
+def test_excess_beyond_bounded_wait_is_rejected():
+    async def run():
+        limiter = GeminiRateLimiter(requests_per_minute=6, tokens_per_minute=1_000_000, max_wait_seconds=1)
+        limiter._request_bucket = 1
+        await limiter.acquire(100)
+        try:
+            await limiter.acquire(100)
+        except QuotaExceededError as e:
+            return e, limiter.stats()
+        return None, limiter.stats()
+
+    error, stats = asyncio.run(run())
+    assert error is not None
+    assert error.retry_after >= 9  # one request every 10 seconds at 6 RPM
+    assert stats["rejected"] == 1
+
+
+def test_token_budget_is_enforced():
+    async def run():
+        limiter = GeminiRateLimiter(requests_per_minute=1000, tokens_per_minute=1200, max_wait_seconds=0.5)
+        await limiter.acquire(1000)
+        try:
+            await limiter.acquire(1000)
+        except QuotaExceededError as e:
+            return e
+        return None
+
+    assert asyncio.run(run()) is not None
+
+
+async def record_grants(limiter, arrivals):
+    """Acquire for (delay, priority) arrivals; returns priorities in grant order"""
+    order = []
+
+    async def arrive(delay, priority):
+        await asyncio.sleep(delay)
+        await limiter.acquire(100, priority)
+        order.append(priority)
+
+    await asyncio.gather(*[arrive(delay, priority) for delay, priority in arrivals])
+    return order
+
+
+def test_interactive_preempts_queued_bulk():
+    async def run():
+        # 1200 RPM refills one request every 0.05s; the bucket starts empty
+        limiter = GeminiRateLimiter(requests_per_minute=1200, tokens_per_minute=1_000_000,
+                                    max_wait_seconds=5, bulk_min_share=0.2)
+        limiter._request_bucket = 0
+        arrivals = [(0, BULK)] * 6 + [(0.01, INTERACTIVE)] * 2
+        return await record_grants(limiter, arrivals), limiter.stats()
+
+    order, stats = asyncio.run(run())
+    # Interactive requests arrived last but are served within the first grants
+    assert order.index(INTERACTIVE) <= 1
+    assert order[:3].count(INTERACTIVE) == 2
+    assert stats["lanes"][INTERACTIVE]["admitted"] == 2
+    assert stats["lanes"][BULK]["admitted"] == 6
+    assert stats["lanes"][BULK]["wait_p95_seconds"] > stats["lanes"][INTERACTIVE]["wait_p95_seconds"]
+
+
+def test_bulk_keeps_minimum_share():
+    async def run():
+        limiter = GeminiRateLimiter(requests_per_minute=1200, tokens_per_minute=1_000_000,
+                                    max_wait_seconds=5, bulk_min_share=0.25)
+        limiter._request_bucket = 0
+        arrivals = [(0, BULK)] * 3 + [(0, INTERACTIVE)] * 12
+        return await record_grants(limiter, arrivals)
+
+    order = asyncio.run(run())
+    # With a 25% share, bulk gets one grant after every three interactive ones
+    first_bulk_grants = [index for index, priority in enumerate(order) if priority == BULK]
+    assert first_bulk_grants[:3] == [3, 7, 11]
+
+
+def test_bulk_waits_longer_before_rejection():
+    async def run():
+        limiter = GeminiRateLimiter(requests_per_minute=6, tokens_per_minute=1_000_000,
+                                    max_wait_seconds=1, bulk_max_wait_seconds=30)
+        limiter._request_bucket = 0
+        bulk = asyncio.ensure_future(limiter.acquire(100, BULK))
+        await asyncio.sleep(0.01)
+        try:
+            await limiter.acquire(100, INTERACTIVE)
+        except QuotaExceededError as e:
+            interactive_error = e
+        bulk.cancel()
+        return interactive_error, limiter.stats()
+
+    error, stats = asyncio.run(run())
+    assert error.retry_after >= 9
+    assert stats["lanes"][INTERACTIVE]["rejected"] == 1
+    assert stats["lanes"][BULK]["rejected"] == 0
+
+
+def exhaust_quota(call):
+    raise google_exceptions.ResourceExhausted("Quota exceeded for generate_content requests")
+
+
+QuotaExhaustedModel = fake_model(exhaust_quota)
+
+
+def test_http_clients_get_429_with_retry_after():
+    async def run():
+        from main import app
+
+        payload = {"question": "Why is the sky blue?", "language": "en"}
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            # Gemini itself reports the quota as exhausted
+            upstream = await client.post("/knowledge/ask", json=payload)
+
+            # The local scheduler has no budget left
+            service.rate_limiter._request_bucket = 0
+            local = await client.post("/knowledge/ask", json=payload)
+        return upstream, local
+
+    with fake_gemini(QuotaExhaustedModel, GOOGLE_AI_RPM="6", GOOGLE_AI_MAX_QUEUE_WAIT_SECONDS="1") as service:
+        upstream, local = asyncio.run(run())
+
+    for response in (upstream, local):
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) >= 1
+        assert "quota" in response.json()["detail"].lower()
+
+
+if __name__ == "__main__":
+    test_burst_is_queued_then_admitted()
+    test_excess_beyond_bounded_wait_is_rejected()
+    test_token_budget_is_enforced()
+    test_interactive_preempts_queued_bulk()
+    test_bulk_keeps_minimum_share()
+    test_bulk_waits_longer_before_rejection()
+    test_http_clients_get_429_with_retry_after()
+    print("✅ Rate limiter tests passed")
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test retries, deadlines and the circuit breaker with a fault-injecting stand-in model
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from google.api_core import exceptions as google_exceptions
+
+from services.rate_limiter import BULK
+from test_fakes import fake_gemini, fake_model
+
+
+SCRIPT = []
+
+
+def replay_script(call):
+    """Replays SCRIPT: an exception to raise, a delay in seconds, or text"""
+    outcome = SCRIPT.pop(0) if SCRIPT else "recovered"
+    if isinstance(outcome, Exception):
+        raise outcome
+    if isinstance(outcome, (int, float)):
+        time.sleep(outcome)
+        return "too late"
+    return outcome
+
+
+FaultInjectingModel = fake_model(replay_script)
+
+
+def run_with_faults(script, run, **env):
+    SCRIPT[:] = script
+    settings = {"GOOGLE_AI_RPM": "1000", "GOOGLE_AI_RETRY_BASE_DELAY": "0.01", **env}
+    with fake_gemini(FaultInjectingModel, **settings) as service:
+        return asyncio.run(run(service)), service
+
+
+def generate(topic="volcanoes", **kwargs):
+    async def run(service):
+        return await service.generate_text(topic, language="en", content_type="content", **kwargs)
+    return run
+
+
+def test_transient_errors_are_retried():
+    script = [google_exceptions.ServiceUnavailable("503"), google_exceptions.InternalServerError("500"), "Lava flows"]
+    result, service = run_with_faults(script, generate())
+
+    assert result == "Lava flows"
+    assert len(FaultInjectingModel.calls) == 3
+    assert service.get_stats()["retries"]["retries"] == 2
+    assert service.circuit_breaker.state == "closed"
+
+
+def test_auth_errors_are_not_retried():
+    script = [google_exceptions.PermissionDenied("API key not valid")]
+    result, service = run_with_faults(script, generate())
+
+    assert len(FaultInjectingModel.calls) == 1
+    assert "volcanoes" in result  # educational fallback
+    assert service.circuit_breaker.consecutive_failures == 0
+
+
+def test_deadline_bounds_a_hung_call():
+    started = time.perf_counter()
+    result, service = run_with_faults([2.0], generate(deadline_seconds=0.3))
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 1.0
+    assert "volcanoes" in result
+    assert service.get_stats()["retries"]["timeouts"] == 1
+
+
+def test_breaker_opens_fails_fast_and_shows_on_health():
+    outage = [google_exceptions.ServiceUnavailable("503") for _ in range(10)]
+
+    async def run(service):
+        from main import app
+
+        for index in range(3):
+            await service.generate_text(f"topic {index}", language="en", content_type="content")
+        calls_when_open = len(FaultInjectingModel.calls)
+
+        started = time.perf_counter()
+        await service.generate_text("one more topic", language="en", content_type="content")
+        fail_fast_seconds = time.perf_counter() - started
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            health = await client.get("/health")
+        return calls_when_open, fail_fast_seconds, health.json()
+
+    (calls_when_open, fail_fast_seconds, health), service = run_with_faults(
+        outage, run,
+        GOOGLE_AI_MAX_ATTEMPTS="2",
+        GOOGLE_AI_BREAKER_FAILURE_THRESHOLD="4"
+    )
+
+    assert len(FaultInjectingModel.calls) == calls_when_open  # no upstream call while open
+    assert fail_fast_seconds < 0.05
+    assert health["ai_circuit_breaker"]["state"] == "open"
+    assert health["ai_circuit_breaker"]["short_circuited"] >= 1
+
+
+def test_breaker_recovers_after_probe():
+    async def run(service):
+        service.circuit_breaker.recovery_seconds = 0.1
+        for index in range(2):
+            await service.generate_text(f"topic {index}", language="en", content_type="content")
+        opened = service.circuit_breaker.state
+        await asyncio.sleep(0.15)
+        result = await service.generate_text("probe topic", language="en", content_type="content")
+        return opened, result
+
+    (opened, result), service = run_with_faults(
+        [google_exceptions.ServiceUnavailable("503")] * 2, run,
+        GOOGLE_AI_MAX_ATTEMPTS="1",
+        GOOGLE_AI_BREAKER_FAILURE_THRESHOLD="2"
+    )
+
+    assert opened == "open"
+    assert result == "recovered"
+    assert service.circuit_breaker.state == "closed"
+
+
+def test_waiting_for_local_quota_does_not_open_breaker():
+    async def run(service):
+        # No local RPM budget left: every call times out in the scheduler queue
+        service.rate_limiter._request_bucket = 0
+        return [
+            await service.generate_text(f"topic {index}", language="en", content_type="content",
+                                        deadline_seconds=0.2, priority=BULK)
+            for index in range(3)
+        ]
+
+    results, service = run_with_faults(
+        [], run,
+        GOOGLE_AI_RPM="6",
+        GOOGLE_AI_BULK_MAX_QUEUE_WAIT_SECONDS="30",
+        GOOGLE_AI_BREAKER_FAILURE_THRESHOLD="2"
+    )
+
+    assert all("topic" in result for result in results)  # educational fallback
+    assert len(FaultInjectingModel.calls) == 0
+    assert service.circuit_breaker.state == "closed"
+    assert service.circuit_breaker.consecutive_failures == 0
+    assert service.get_stats()["retries"]["admission_timeouts"] == 3
+
+
+if __name__ == "__main__":
+    test_transient_errors_are_retried()
+    test_auth_errors_are_not_retried()
+    test_deadline_bounds_a_hung_call()
+    test_breaker_opens_fails_fast_and_shows_on_health()
+    test_breaker_recovers_after_probe()
+    test_waiting_for_local_quota_does_not_open_breaker()
+    print("✅ Resilience tests passed")
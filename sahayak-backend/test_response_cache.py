@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test the tiered response cache (memory LRU + TTL, shared disk tier)
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import sqlite3
+
+from services.response_cache import BACKEND_DIR, ResponseCache, backend_path
+
+
+def test_key_normalization():
+    key = ResponseCache.make_key("  Water   Cycle ", language="EN", grade_level="3", length="short")
+    same = ResponseCache.make_key("water cycle", language="en", grade_level="3", length="short")
+    other = ResponseCache.make_key("water cycle", language="en", grade_level="4", length="short")
+
+    assert key == same
+    assert key != other
+
+
+def test_memory_lru_and_ttl():
+    async def run():
+        cache = ResponseCache(max_entries=2, ttl_seconds=60)
+        await cache.set("a", "first")
+        await cache.set("b", "second")
+        assert await cache.get("a") == "first"  # "a" is now most recently used
+
+        await cache.set("c", "third")  # evicts "b"
+        assert await cache.get("b") is None
+        assert await cache.get("a") == "first"
+
+        short_lived = ResponseCache(max_entries=2, ttl_seconds=0.05)
+        await short_lived.set("x", "soon gone")
+        time.sleep(0.1)
+        assert await short_lived.get("x") is None
+        return cache.stats(), short_lived.stats()
+
+    stats, short_stats = asyncio.run(run())
+    assert stats["memory_hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert short_stats["expirations"] == 1
+
+
+def test_disk_tier_survives_restart():
+    async def run(path):
+        first_worker = ResponseCache(max_entries=8, ttl_seconds=60, disk_path=path)
+        await first_worker.set("lesson", "cached lesson plan")
+
+        # A second instance stands in for a restarted process or another uvicorn worker
+        second_worker = ResponseCache(max_entries=8, ttl_seconds=60, disk_path=path)
+        value = await second_worker.get("lesson")
+        again = await second_worker.get("lesson")
+        return value, again, second_worker.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        value, again, stats = asyncio.run(run(os.path.join(directory, "responses.sqlite3")))
+
+    assert value == "cached lesson plan"
+    assert again == "cached lesson plan"
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+
+
+def test_expired_disk_rows_are_purged_without_reads():
+    def rows(path):
+        with sqlite3.connect(path) as connection:
+            return connection.execute("SELECT key FROM responses ORDER BY key").fetchall()
+
+    async def run(path):
+        short_lived = ResponseCache(ttl_seconds=0.05, disk_path=path, purge_every=3)
+        for key in ("a", "b"):
+            await short_lived.set(key, "stale")
+        time.sleep(0.1)
+        # Never read again, but the third write purges them
+        await short_lived.set("c", "fresh")
+        after_writes = rows(path)
+
+        await short_lived.set("d", "stale")
+        time.sleep(0.1)
+        # Opening the file purges too
+        reopened = ResponseCache(ttl_seconds=60, disk_path=path)
+        return after_writes, rows(path), short_lived.stats(), reopened.stats()
+
+    with tempfile.TemporaryDirectory() as directory:
+        after_writes, after_open, stats, reopened = asyncio.run(run(os.path.join(directory, "responses.sqlite3")))
+
+    assert after_writes == [("c",)]
+    assert after_open == []
+    assert stats["expirations"] == 2 and reopened["expirations"] == 2
+
+
+def test_relative_paths_resolve_against_backend_directory():
+    assert backend_path("cache/responses.sqlite3") == os.path.join(BACKEND_DIR, "cache", "responses.sqlite3")
+    assert os.path.isfile(os.path.join(BACKEND_DIR, "main.py"))
+    assert backend_path("/var/cache/responses.sqlite3") == "/var/cache/responses.sqlite3"
+    assert backend_path("") == ""
+
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_memory_lru_and_ttl()
+    test_disk_tier_survives_restart()
+    test_expired_disk_rows_are_purged_without_reads()
+    test_relative_paths_resolve_against_backend_directory()
+    print("✅ Response cache tests passed")
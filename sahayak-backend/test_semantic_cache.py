@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test the near-duplicate question index behind /knowledge/ask
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from services.semantic_cache import SemanticQuestionIndex
+from test_fakes import fake_gemini, fake_model
+
+ENGLISH = ("en", "simple", "medium")
+HINDI = ("hi", "simple", "medium")
+
+
+def test_paraphrases_hit_and_different_questions_miss():
+    index = SemanticQuestionIndex(threshold=0.8, audit_rate=1.0)
+    index.add("Why is the sky blue?", ENGLISH, "Because of Rayleigh scattering")
+    index.add("What is photosynthesis?", ENGLISH, "Plants make food from light")
+    index.add("आसमान नीला क्यों है?", HINDI, "प्रकाश के प्रकीर्णन के कारण")
+
+    for paraphrase in ("sky blue why?", "Why's the sky blue", "why is the sky so blue"):
+        hit = index.lookup(paraphrase, ENGLISH)
+        assert hit is not None and hit.answer == "Because of Rayleigh scattering", paraphrase
+    assert index.lookup("explain photosynthesis", ENGLISH).answer == "Plants make food from light"
+    assert index.lookup("आसमान नीला क्यों होता है", HINDI).answer == "प्रकाश के प्रकीर्णन के कारण"
+
+    for different in ("Why is the sea blue?", "Why is grass green?", "How do birds fly?"):
+        assert index.lookup(different, ENGLISH) is None, different
+    # Answers never cross languages or complexity levels
+    assert index.lookup("Why is the sky blue?", HINDI) is None
+    assert index.lookup("Why is the sky blue?", ("en", "detailed", "medium")) is None
+
+    stats = index.stats(include_samples=True)
+    assert stats["hits"] == 5
+    assert stats["exact_hits"] == 3  # identical once function words are dropped, in the same order
+    assert stats["hit_ratio"] == round(5 / 10, 3)
+    assert [sample["question"] for sample in stats["audit_samples"]] == ["sky blue why?", "Why's the sky blue"]
+
+
+def test_word_and_number_order_matter():
+    index = SemanticQuestionIndex(threshold=0.8)
+    index.add("What is 13 times 12?", ENGLISH, "156")
+    index.add("Explain why the sum of 13 and 12 equals 25 in base ten arithmetic", ENGLISH, "carrying")
+    index.add("Does the dog chase the cat?", ENGLISH, "Often")
+
+    assert index.lookup("what is 13 times 12", ENGLISH).answer == "156"
+    assert index.lookup("what is 12 times 13", ENGLISH) is None
+    assert index.lookup("Explain why the sum of 12 and 13 equals 25 in base ten arithmetic", ENGLISH) is None
+    assert index.lookup("does the dog chase a cat", ENGLISH).answer == "Often"
+    assert index.lookup("Does the cat chase the dog?", ENGLISH) is None
+
+
+def test_entries_are_bounded():
+    index = SemanticQuestionIndex(max_entries=3)
+    for topic in ("volcanoes", "earthquakes", "rainbows", "glaciers"):
+        index.add(f"How do {topic} form?", ENGLISH, topic)
+
+    assert index.lookup("How do volcanoes form?", ENGLISH) is None
+    assert index.lookup("how do glaciers form", ENGLISH).answer == "glaciers"
+    assert index.stats()["evictions"] == 1
+
+
+CountingModel = fake_model(
+    lambda call: "Sunlight scatters off air molecules, and blue light scatters the most.", delay=0.2
+)
+
+
+def test_knowledge_endpoint_answers_paraphrases_from_the_index():
+    cache_dir = tempfile.mkdtemp()
+
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            first = await client.post("/knowledge/ask", json={"question": "Why is the sky blue?", "language": "en"})
+            started = time.perf_counter()
+            paraphrase = await client.post("/knowledge/ask", json={"question": "sky blue why?", "language": "en"})
+            paraphrase_seconds = time.perf_counter() - started
+            other_language = await client.post("/knowledge/ask", json={"question": "sky blue why?", "language": "hi"})
+            stats = await client.get("/knowledge/semantic-cache")
+        return first, paraphrase, paraphrase_seconds, other_language, stats
+
+    with fake_gemini(CountingModel, GOOGLE_AI_CACHE_ENABLED="true",
+                     GOOGLE_AI_CACHE_PATH=os.path.join(cache_dir, "responses.sqlite3")):
+        first, paraphrase, paraphrase_seconds, other_language, stats = asyncio.run(run())
+
+    assert paraphrase.status_code == 200
+    assert paraphrase.json()["answer"] == first.json()["answer"]
+    assert paraphrase.json()["question"] == "sky blue why?"
+    assert paraphrase_seconds < 0.1
+    assert other_language.status_code == 200
+    assert len(CountingModel.calls) == 2
+
+    stats = stats.json()
+    assert stats["enabled"] is True
+    assert stats["hits"] == 1
+    assert stats["lookups"] == 3
+    assert stats["entries"] == 2
+
+
+if __name__ == "__main__":
+    test_paraphrases_hit_and_different_questions_miss()
+    test_word_and_number_order_matter()
+    test_entries_are_bounded()
+    test_knowledge_endpoint_answers_paraphrases_from_the_index()
+    print("✅ Semantic cache tests passed")
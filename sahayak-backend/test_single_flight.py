@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test that identical in-flight generation requests share one upstream call
+"""
+import asyncio
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.resilience import GenerationFailedError
+from test_fakes import fake_gemini, fake_model
+
+CLASS_SIZE = 40
+
+
+# Stand-in for genai.GenerativeModel that counts upstream calls
+CountingModel = fake_model(lambda call: "Shared assignment content", delay=0.2)
+
+
+def test_identical_requests_are_coalesced():
+    async def open_assignment(service):
+        return await asyncio.gather(*[
+            service.generate_text(
+                "photosynthesis",
+                language="en",
+                content_type="content",
+                grade_level="4",
+                length="short"
+            )
+            for _ in range(CLASS_SIZE)
+        ])
+
+    with fake_gemini(CountingModel) as service:
+        results = asyncio.run(open_assignment(service))
+        stats = service.get_stats()["single_flight"]
+
+    assert results == ["Shared assignment content"] * CLASS_SIZE
+    assert len(CountingModel.calls) == 1
+    assert stats["executions"] == 1
+    assert stats["calls_saved"] == CLASS_SIZE - 1
+    assert stats["in_flight"] == 0
+
+
+def reject(call):
+    raise ValueError("Request contains an invalid argument")
+
+
+FailingModel = fake_model(reject, delay=0.2)
+
+
+def test_callers_with_different_options_are_not_coalesced():
+    params = {"language": "en", "content_type": "worksheet", "grade_level": "4", "length": "long"}
+
+    async def run(service):
+        return await asyncio.gather(
+            service.generate_text("photosynthesis", fallback=False, **params),
+            service.generate_text("photosynthesis", **params),
+            return_exceptions=True
+        )
+
+    with fake_gemini(FailingModel) as service:
+        strict, lenient = asyncio.run(run(service))
+        json_key = service._cache_key("photosynthesis", "en", "worksheet", "4", "General", "long",
+                                      response_mime_type="application/json")
+        small_key = service._cache_key("photosynthesis", "en", "worksheet", "4", "General", "long",
+                                       max_output_tokens=256)
+        plain_key = service._cache_key("photosynthesis", "en", "worksheet", "4", "General", "long")
+
+    # A fallback=False tier never receives placeholder text, and an ordinary
+    # caller never receives the tier's GenerationFailedError
+    assert isinstance(strict, GenerationFailedError)
+    assert isinstance(lenient, str) and "try again later" in lenient
+    assert len(FailingModel.calls) == 2
+    assert len({json_key, small_key, plain_key}) == 3
+
+
+if __name__ == "__main__":
+    test_identical_requests_are_coalesced()
+    test_callers_with_different_options_are_not_coalesced()
+    print("✅ Single-flight test passed")
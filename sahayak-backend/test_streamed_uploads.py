@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Test streamed multipart worksheet uploads: hashing, disk spooling, the size
+cap and peak memory with 10 MB page photos
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import sys
+import os
+import tempfile
+import tracemalloc
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI, Request
+from PIL import Image
+
+from services.image_ingestion import image_ingestor
+from services.uploads import UploadError, read_streamed_form
+from test_fakes import fake_gemini, fake_model
+
+MB = 1024 * 1024
+
+
+def ten_megabyte_photo(path):
+    """A camera-sized JPEG of noise, which barely compresses: just over 10 MB"""
+    image = Image.effect_noise((3000, 4000), 90).convert("RGB")
+    image.save(path, format="JPEG", quality=95)
+    assert os.path.getsize(path) > 10 * MB
+    return path
+
+
+def form_app(**limits):
+    """Minimal app that reports what read_streamed_form saw"""
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        try:
+            form = await read_streamed_form(request, **limits)
+        except UploadError as e:
+            return {"error": str(e)}
+        try:
+            image = form.files["image"]
+            return {
+                "size": image.size,
+                "sha256": image.sha256,
+                "on_disk": image.on_disk,
+                "filename": image.filename,
+                "first_bytes": image.file.read(3).hex(),
+                "grades": form.getlist("grades"),
+                "subject": form.get("subject")
+            }
+        finally:
+            form.close()
+
+    return app
+
+
+def test_upload_is_hashed_and_spooled_while_streaming():
+    with tempfile.TemporaryDirectory() as directory:
+        path = ten_megabyte_photo(os.path.join(directory, "page.jpg"))
+        with open(path, "rb") as photo:
+            expected = hashlib.sha256(photo.read()).hexdigest()
+
+        async def post(app, upload_path):
+            async with httpx.AsyncClient(app=app, base_url="http://test", timeout=60) as client:
+                with open(upload_path, "rb") as photo:
+                    return await client.post("/upload", data={"grades": ["3", "4"], "subject": "Science"},
+                                             files={"image": ("page.jpg", photo, "image/jpeg")})
+
+        response = asyncio.run(post(form_app(spool_bytes=MB), path)).json()
+        assert response["size"] == os.path.getsize(path)
+        assert response["sha256"] == expected
+        assert response["on_disk"] is True
+        assert response["filename"] == "page.jpg" and response["first_bytes"] == "ffd8ff"
+        assert response["grades"] == ["3", "4"] and response["subject"] == "Science"
+
+        # Small photos stay in memory
+        small = os.path.join(directory, "small.jpg")
+        Image.new("RGB", (64, 64), "white").save(small, format="JPEG")
+        assert asyncio.run(post(form_app(spool_bytes=MB), small)).json()["on_disk"] is False
+
+        # Over the cap: the read stops there
+        response = asyncio.run(post(form_app(max_file_bytes=4 * MB, max_field_bytes=1024, max_parts=4), path))
+        assert "larger than" in response.json()["error"]
+
+
+def test_urlencoded_forms_are_still_accepted():
+    # Older clients post the form urlencoded, with the image as a base64 field
+    photo = b"\xff\xd8\xff" + bytes(3000)
+    encoded = base64.b64encode(photo).decode("ascii")
+
+    async def post(app, image):
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return (await client.post("/upload", data={"image": image, "grades": ["3", "4"],
+                                                       "subject": "Social Science"})).json()
+
+    response = asyncio.run(post(form_app(spool_bytes=1024), encoded))
+    assert response["size"] == len(photo) and response["on_disk"] is True
+    assert response["sha256"] == hashlib.sha256(photo).hexdigest()
+    assert response["first_bytes"] == "ffd8ff"
+    assert response["grades"] == ["3", "4"] and response["subject"] == "Social Science"
+    assert asyncio.run(post(form_app(spool_bytes=MB), encoded))["on_disk"] is False
+    data_url = asyncio.run(post(form_app(), "data:image/jpeg;base64," + encoded))
+    assert data_url["sha256"] == response["sha256"]
+
+    # The size cap applies to the decoded image, not the longer base64 text
+    assert "sha256" in asyncio.run(post(form_app(max_file_bytes=len(photo)), encoded))
+    assert "larger than" in asyncio.run(post(form_app(max_file_bytes=len(photo) - 1), encoded))["error"]
+    assert "not valid base64" in asyncio.run(post(form_app(), "not*base64"))["error"]
+
+
+PageModel = fake_model(lambda call: "1. Describe the pattern printed on the page.")
+
+
+def test_ten_megabyte_upload_peak_memory():
+    async def run(path):
+        from main import app
+        from routers import worksheets
+
+        results = {}
+        async with httpx.AsyncClient(app=app, base_url="http://test", timeout=120) as client:
+            # Warm up imports and singletons outside the measurement
+            await client.get("/worksheets/health")
+
+            # The old way: the base64 string inside a JSON body
+            with open(path, "rb") as photo:
+                body = json.dumps({
+                    "image": base64.b64encode(photo.read()).decode("ascii"),
+                    "grades": ["3", "4"],
+                    "subject": "Science"
+                }).encode("ascii")
+            tracemalloc.start()
+            response = await client.post("/worksheets/generate-with-vision", content=body,
+                                         headers={"Content-Type": "application/json"})
+            results["json"] = (response.status_code, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            del body
+
+            # Streamed multipart, read by the client from disk in chunks
+            image_ingestor.cache_clear()
+            tracemalloc.start()
+            with open(path, "rb") as photo:
+                response = await client.post(
+                    "/worksheets/generate-with-vision/upload",
+                    data={"grades": ["3", "4"], "subject": "Science"},
+                    files={"image": ("page.jpg", photo, "image/jpeg")}
+                )
+            results["multipart"] = (response.status_code, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            results["worksheets"] = list(response.json()["worksheets"])
+
+            # Above the configured cap
+            original_cap = worksheets.WORKSHEET_UPLOAD_MAX_BYTES
+            worksheets.WORKSHEET_UPLOAD_MAX_BYTES = 8 * MB
+            try:
+                with open(path, "rb") as photo:
+                    response = await client.post(
+                        "/worksheets/generate-with-vision/upload",
+                        data={"grades": ["3"], "subject": "Science"},
+                        files={"image": ("page.jpg", photo, "image/jpeg")}
+                    )
+                results["too_large"] = response.status_code
+            finally:
+                worksheets.WORKSHEET_UPLOAD_MAX_BYTES = original_cap
+
+            results["no_image"] = (await client.post(
+                "/worksheets/generate-with-vision/upload", data={"grades": ["3"], "subject": "Science"},
+                files={"other": ("notes.txt", b"notes", "text/plain")}
+            )).status_code
+            results["standard"] = (await client.post(
+                "/worksheets/generate", data={"grades": ["3"], "subject": "Science"},
+                files={"image": ("page.jpg", b"\xff\xd8\xff", "image/jpeg")}
+            )).status_code
+            # A urlencoded post to the upload endpoint carries the page as base64
+            with open(path, "rb") as photo:
+                small = Image.open(photo).resize((300, 400))
+            buffer = io.BytesIO()
+            small.save(buffer, format="JPEG")
+            response = await client.post(
+                "/worksheets/generate-with-vision/upload",
+                data={"image": base64.b64encode(buffer.getvalue()).decode("ascii"),
+                      "grades": ["3"], "subject": "Science"}
+            )
+            results["upload_urlencoded"] = (response.status_code, list(response.json().get("worksheets", {})))
+            results["upload_not_base64"] = (await client.post(
+                "/worksheets/generate-with-vision/upload",
+                data={"image": "not*base64", "grades": ["3"], "subject": "Science"}
+            )).status_code
+            results["standard_urlencoded"] = (await client.post(
+                "/worksheets/generate", data={"image": "/9j/", "grades": ["3"], "subject": "Science"}
+            )).status_code
+        return results
+
+    with fake_gemini(PageModel, GOOGLE_AI_RPM="1000"), tempfile.TemporaryDirectory() as directory:
+        results = asyncio.run(run(ten_megabyte_photo(os.path.join(directory, "page.jpg"))))
+
+    json_status, json_peak = results["json"]
+    multipart_status, multipart_peak = results["multipart"]
+    print(f"Peak traced memory for a 10 MB photo: JSON {json_peak / MB:.1f} MB, "
+          f"multipart {multipart_peak / MB:.1f} MB")
+    assert json_status == 200 and multipart_status == 200
+    assert results["worksheets"] == ["3", "4"]
+
+    # Python-level memory stays around the 1 MB spool threshold instead of
+    # several copies of the photo (Pillow's pixel buffers are not traced)
+    assert multipart_peak < 4 * MB
+    assert json_peak > 3 * multipart_peak
+
+    assert results["too_large"] == 413
+    assert results["no_image"] == 422
+    assert results["standard"] == 200
+    assert results["upload_urlencoded"] == (200, ["3"])
+    assert results["upload_not_base64"] == 400
+    assert results["standard_urlencoded"] == 200
+
+
+if __name__ == "__main__":
+    test_upload_is_hashed_and_spooled_while_streaming()
+    test_urlencoded_forms_are_still_accepted()
+    test_ten_megabyte_upload_peak_memory()
+    print("✅ Streamed upload tests passed")
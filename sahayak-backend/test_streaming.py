@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test Server-Sent Events streaming and upstream cancellation
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from test_fakes import fake_gemini, fake_model
+
+CHUNKS = ["Plants make ", "food from ", "sunlight."]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGrpcCall:
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeStream:
+    """Mimics the SDK streaming response: iterable chunks over a cancellable call"""
+
+    delay = 0.05
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._iterator = FakeGrpcCall()
+        self.produced = 0
+
+    def __iter__(self):
+        for text in self._chunks:
+            if self._iterator.cancelled:
+                return
+            time.sleep(FakeStream.delay)
+            self.produced += 1
+            yield FakeChunk(text)
+
+
+STREAMS = []
+STREAM_CHUNKS = list(CHUNKS)
+
+
+def open_stream(call):
+    assert call.kwargs.get("stream"), "streaming endpoints must use the SDK's streaming mode"
+    response = FakeStream(list(STREAM_CHUNKS))
+    STREAMS.append(response)
+    return response
+
+
+StreamingModel = fake_model(open_stream)
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def with_streaming_service(run):
+    STREAMS.clear()
+    with fake_gemini(StreamingModel) as service:
+        return asyncio.run(run(service))
+
+
+def test_lesson_stream_ends_with_full_response():
+    async def run(service):
+        from main import app
+
+        payload = {"topic": "plants", "subject": "Science", "grade_level": "4", "language": "en"}
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.post("/lessons/generate/stream", json=payload)
+
+    response = with_streaming_service(run)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert [name for name, _ in events] == ["chunk", "chunk", "chunk", "done"]
+    assert "".join(data["text"] for _, data in events[:-1]) == "".join(CHUNKS)
+    assert events[-1][1] == {
+        "lesson_plan": "Plants make food from sunlight.",
+        "topic": "plants",
+        "subject": "Science",
+        "grade_level": "4",
+        "language": "en",
+    }
+
+
+def test_closing_stream_cancels_upstream():
+    async def run(service):
+        STREAM_CHUNKS[:] = [f"part {i} " for i in range(20)]
+        chunks = service.generate_text_stream("plants", language="en", grade_level="4")
+        first = await chunks.__anext__()
+        await chunks.aclose()  # what the SSE response does when the client disconnects
+        await asyncio.sleep(0.2)
+        return first
+
+    try:
+        first = with_streaming_service(run)
+    finally:
+        STREAM_CHUNKS[:] = CHUNKS
+
+    upstream = STREAMS[0]
+    assert first == "part 0 "
+    assert upstream._iterator.cancelled
+    assert upstream.produced < 20
+
+
+def test_stream_checks_breaker_bounds_first_chunk_and_settles_quota():
+    async def collect(service, **kwargs):
+        return [chunk async for chunk in service.generate_text_stream("plants", language="en", **kwargs)]
+
+    async def run(service):
+        settled = []
+        service.rate_limiter.settle = lambda estimated, actual: settled.append((estimated, actual))
+        streamed = await collect(service)
+
+        # Open breaker: fallback content without spending quota or calling upstream
+        service.circuit_breaker.state = service.circuit_breaker.OPEN
+        service.circuit_breaker.opened_at = time.monotonic()
+        admitted = service.rate_limiter.counters["admitted"]
+        short_circuited = await collect(service)
+        spent = service.rate_limiter.counters["admitted"] - admitted
+        service.circuit_breaker.record_success()
+
+        # A provider that never sends the first chunk is cut off at the deadline
+        FakeStream.delay = 2
+        started = time.perf_counter()
+        hung = await collect(service, deadline_seconds=0.3)
+        return streamed, settled, short_circuited, spent, hung, time.perf_counter() - started
+
+    try:
+        streamed, settled, short_circuited, spent, hung, hung_seconds = with_streaming_service(run)
+    finally:
+        FakeStream.delay = 0.05
+
+    assert streamed == CHUNKS
+    assert len(settled) == 1 and settled[0][1] < settled[0][0]
+    assert spent == 0 and len(STREAMS) == 2
+    assert "try again later" in short_circuited[0]
+    assert "try again later" in hung[0] and hung_seconds < 1.0
+    assert STREAMS[1]._iterator.cancelled
+
+
+if __name__ == "__main__":
+    test_lesson_stream_ends_with_full_response()
+    test_closing_stream_cancels_upstream()
+    test_stream_checks_breaker_bounds_first_chunk_and_settles_quota()
+    print("✅ Streaming tests passed")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test the queue-backed structured logging pipeline (JSON, request IDs, sampling)
+"""
+import asyncio
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.structured_logging import (
+    JsonFormatter, RequestIdFilter, SamplingFilter, _StructuredQueueHandler, bind_request_id, request_id_var
+)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def make_pipeline(sample_rate=1.0, max_queue=100):
+    log_queue = queue.Queue(maxsize=max_queue)
+    handler = _StructuredQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    output = ListHandler()
+    output.setFormatter(JsonFormatter())
+
+    logger = logging.getLogger(f"test.structured.{time.monotonic_ns()}")
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(handler)
+    return logger, log_queue, output
+
+
+def test_json_lines_carry_request_id_and_fields():
+    logger, log_queue, output = make_pipeline()
+    listener = logging.handlers.QueueListener(log_queue, output)
+    listener.start()
+
+    async def handle(request_id):
+        bind_request_id(request_id)
+        await asyncio.sleep(0)
+        logger.info("Generation request", extra={"topic": "water cycle", "grade_level": "3"})
+
+    async def run():
+        await asyncio.gather(handle("req-a"), handle("req-b"))
+
+    asyncio.run(run())
+    listener.stop()
+
+    lines = [json.loads(line) for line in output.lines]
+    assert sorted(line["request_id"] for line in lines) == ["req-a", "req-b"]
+    assert all(line["message"] == "Generation request" for line in lines)
+    assert all(line["topic"] == "water cycle" and line["grade_level"] == "3" for line in lines)
+    assert all(line["level"] == "INFO" and "ts" in line for line in lines)
+
+
+def test_sampling_is_per_request():
+    sampler = SamplingFilter(0.25)
+    kept = 0
+    for index in range(2000):
+        request_id = f"request-{index}"
+        decisions = set()
+        for _ in range(3):
+            record = logging.LogRecord("x", logging.DEBUG, __file__, 1, "preview", None, None)
+            record.sample = True
+            record.request_id = request_id
+            decisions.add(sampler.filter(record))
+        assert len(decisions) == 1  # all previews of one request share the decision
+        kept += decisions.pop()
+
+    assert 300 < kept < 700
+
+    unsampled = logging.LogRecord("x", logging.INFO, __file__, 1, "always kept", None, None)
+    assert SamplingFilter(0.0).filter(unsampled)
+
+
+def test_full_queue_never_blocks():
+    logger, log_queue, _ = make_pipeline(max_queue=10)
+    request_id_var.set(None)
+
+    started = time.perf_counter()
+    for index in range(1000):
+        logger.info(f"line {index}")
+    elapsed = time.perf_counter() - started
+
+    assert log_queue.qsize() == 10
+    assert elapsed < 1.0
+
+
+if __name__ == "__main__":
+    test_json_lines_carry_request_id_and_fields()
+    test_sampling_is_per_request()
+    test_full_queue_never_blocks()
+    print("✅ Structured logging tests passed")
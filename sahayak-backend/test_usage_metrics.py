@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test per-module token, latency and cost accounting
+"""
+import asyncio
+import sys
+import os
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from services.usage_metrics import Histogram, UsageRecorder
+from test_fakes import FakeResponse, fake_gemini, fake_model
+
+
+class UsageMetadata:
+    prompt_token_count = 120
+    candidates_token_count = 80
+
+
+MeteredModel = fake_model(lambda call: FakeResponse("Generated explanation", usage_metadata=UsageMetadata()),
+                          delay=0.05)
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((10, 100, 1000))
+    for value in [5] * 50 + [50] * 45 + [500] * 4 + [5000]:
+        histogram.observe(value)
+
+    summary = histogram.to_dict()
+    assert summary["count"] == 100
+    assert summary["p50"] == 10
+    assert summary["p95"] == 100
+    assert histogram.quantile(1.0) is None  # open-ended top bucket
+    assert summary["buckets"] == {"le_10": 50, "le_100": 45, "le_1000": 4, "gt_1000": 1}
+
+
+def test_recorder_costs_and_expensive_prompts():
+    recorder = UsageRecorder(input_price_per_mtok=1.0, output_price_per_mtok=2.0, top_prompts=2)
+    recorder.record("Content", "en", "3", "miss", 1.2, 1000, 500, upstream_seconds=1.0, topic="cheap")
+    recorder.record("Content", "hi", "3", "miss", 2.0, 4000, 2000, upstream_seconds=1.8, topic="costly")
+    recorder.record("Content", "en", "3", "hit", 0.01)
+    recorder.record("Lesson Planner", "en", "5", "miss", 0.3, 10, 10, upstream_seconds=0.2, topic="tiny")
+
+    snapshot = recorder.snapshot()
+    english = snapshot["modules"]["Content"]["en"]
+    assert english["calls"] == 2
+    assert english["cache"] == {"hit": 1, "miss": 1, "coalesced": 0}
+    assert english["cache_hit_ratio"] == 0.5
+    assert english["cost_usd"] == 0.002
+    assert snapshot["totals"]["prompt_tokens"] == 5010
+    assert [entry["topic"] for entry in snapshot["most_expensive_prompts"]] == ["costly", "cheap"]
+
+
+def test_service_records_hits_misses_and_coalesced_calls():
+    async def run():
+        from main import app
+
+        options = {"language": "en", "content_type": "answer", "grade_level": "4"}
+        # Three identical concurrent calls share one upstream request
+        await asyncio.gather(*[service.generate_text("Why is the sky blue?", **options) for _ in range(3)])
+        await service.generate_text("What is rain?", **{**options, "content_type": "lesson_plan"})
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.get("/debug/ai-usage", params={"window_minutes": 5})
+
+    with fake_gemini(MeteredModel, GOOGLE_AI_RPM="1000") as service:
+        response = asyncio.run(run())
+
+    assert response.status_code == 200
+    usage = response.json()["usage"]
+    assert usage["window_minutes"] == 5
+
+    knowledge = usage["modules"]["Knowledge Base"]["en"]
+    assert len(MeteredModel.calls) == 2
+    assert knowledge["calls"] == 3
+    assert knowledge["cache"] == {"hit": 0, "miss": 1, "coalesced": 2}
+    # Token counts come from the provider's usage metadata when present
+    assert knowledge["prompt_tokens"] == 120
+    assert knowledge["output_tokens"] == 80
+    assert knowledge["upstream_latency_ms"]["count"] == 1
+    assert knowledge["latency_ms"]["count"] == 3
+
+    assert usage["modules"]["Lesson Planner"]["en"]["calls"] == 1
+    assert usage["totals"]["cost_usd"] > 0
+
+
+if __name__ == "__main__":
+    test_histogram_quantiles()
+    test_recorder_costs_and_expensive_prompts()
+    test_service_records_hits_misses_and_coalesced_calls()
+    print("✅ Usage metrics tests passed")
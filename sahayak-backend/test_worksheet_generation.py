@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Test concurrent per-grade worksheet generation and per-grade fallback
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from services.genkit_ai_service import GenkitAIService
+from services.rate_limiter import QuotaExceededError
+from test_fakes import fake_gemini, fake_model
+
+SLOW_CALL_SECONDS = 0.2
+GRADES = ["1", "2", "3", "4", "5"]
+
+
+SlowModel = fake_model(
+    lambda call: f"Questions for a prompt of {len(call.prompt)} characters", delay=SLOW_CALL_SECONDS
+)
+
+
+async def post_vision(payload):
+    from main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        started = time.perf_counter()
+        response = await client.post("/worksheets/generate-with-vision", json=payload)
+        return response, time.perf_counter() - started
+
+
+def test_grades_generated_concurrently():
+    with fake_gemini(SlowModel, GOOGLE_AI_RPM="1000"):
+        response, elapsed = asyncio.run(post_vision({"image": "", "grades": GRADES, "subject": "Science"}))
+
+    assert response.status_code == 200
+    worksheets = response.json()["worksheets"]
+    assert list(worksheets) == GRADES
+    assert all(f"WORKSHEET - GRADE {grade}" in worksheets[grade] for grade in GRADES)
+    assert len(SlowModel.calls) == len(GRADES)
+
+    sequential = len(GRADES) * SLOW_CALL_SECONDS
+    print(f"   {len(GRADES)} grades: {elapsed:.2f}s (sequential upstream time {sequential:.2f}s)")
+    assert elapsed < sequential / 2
+
+
+def test_failing_grade_falls_back_alone():
+    original_generate = GenkitAIService.generate_text
+    calls = []
+
+    async def flaky_generate(self, prompt_text, **kwargs):
+        calls.append((kwargs["grade_level"], kwargs["length"]))
+        await asyncio.sleep(0.01)
+        if kwargs["grade_level"] == "4" and kwargs["length"] == "long":
+            raise RuntimeError("malformed response")
+        if kwargs["grade_level"] == "5" and quota_grade_5:
+            raise QuotaExceededError("quota exhausted", retry_after=60)
+        return f"Worksheet body for {prompt_text}"
+
+    with fake_gemini(SlowModel):
+        try:
+            GenkitAIService.generate_text = flaky_generate
+
+            quota_grade_5 = False
+            response, _ = asyncio.run(post_vision({"image": "", "grades": ["3", "4", "5"], "subject": "Science"}))
+            worksheets = response.json()["worksheets"]
+            assert response.status_code == 200
+            assert list(worksheets) == ["3", "4", "5"]
+            assert "(Generated with Google AI fallback)" in worksheets["4"]
+            assert "WORKSHEET - GRADE 3" in worksheets["3"] and "WORKSHEET - GRADE 5" in worksheets["5"]
+            assert sorted(calls) == [("3", "long"), ("4", "long"), ("4", "short"), ("5", "long")]
+
+            # Running out of quota is not a per-grade failure: the request gets a 429
+            quota_grade_5 = True
+            response, _ = asyncio.run(post_vision({"image": "", "grades": ["3", "5"], "subject": "Science"}))
+            assert response.status_code == 429
+        finally:
+            GenkitAIService.generate_text = original_generate
+
+
+if __name__ == "__main__":
+    test_grades_generated_concurrently()
+    test_failing_grade_falls_back_alone()
+    print("✅ Worksheet generation tests passed")
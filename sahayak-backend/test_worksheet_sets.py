@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test one-call multi-grade worksheets: JSON validation, splitting and per-grade fallback
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+
+# Add current directory to path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from services.genkit_ai_service import GRADE_INSTRUCTIONS
+from services.worksheet_sets import parse_worksheet_set
+from test_fakes import fake_gemini, fake_model
+
+
+def worksheet(grade, questions):
+    return {
+        "grade": grade,
+        "title": f"Plants around us - Grade {grade}",
+        "objectives": ["Name the parts of a plant"],
+        "sections": [{
+            "heading": "A. Answer the questions",
+            "instructions": "Write one sentence for each.",
+            "questions": [f"Question {index} for grade {grade}" for index in range(1, questions + 1)]
+        }],
+        "answer_key": ["Roots hold the plant in the soil"]
+    }
+
+
+def test_parse_splits_and_validates_grades():
+    body = {"worksheets": [
+        worksheet(3, 6),
+        worksheet("4", 3),
+        {"grade": "5", "title": "No sections"},
+        worksheet("9", 8)
+    ]}
+    body["worksheets"][0]["sections"].append({
+        "heading": "B. Multiple choice",
+        "questions": [{"question": "Which part makes food?", "options": ["Root", "Leaf"]}]
+    })
+    text = "```json\n" + json.dumps(body) + "\n```"
+
+    valid, invalid = parse_worksheet_set(text, ["3", "4", "5", "6"])
+    assert list(valid) == ["3"]
+    assert invalid == {"4": "3 questions", "5": "missing or malformed", "6": "missing or malformed"}
+
+    rendered = valid["3"].render()
+    assert rendered.startswith("Plants around us - Grade 3")
+    assert "6. Question 6 for grade 3\n\nB. Multiple choice\n7. Which part makes food?\n   (a) Root   (b) Leaf" in rendered
+    assert rendered.endswith("Answer key:\n1. Roots hold the plant in the soil")
+
+    # Cut off mid-object (e.g. by max_output_tokens): every grade falls back
+    valid, invalid = parse_worksheet_set(text[:200], ["3", "4"])
+    assert valid == {} and set(invalid) == {"3", "4"}
+
+
+def answer_structured_prompt(call):
+    if "Respond with JSON only" in call.prompt:
+        # Grade 5 comes back too short to use
+        return json.dumps({"worksheets": [worksheet("3", 8), worksheet("4", 10), worksheet("5", 2)]})
+    return "1. A separately generated question"
+
+
+StructuredModel = fake_model(answer_structured_prompt)
+
+
+def test_combined_mode_falls_back_per_grade():
+    async def run():
+        from main import app
+
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            first = await client.post("/worksheets/generate-with-vision", json={
+                "image": "", "grades": ["3", "4", "5"], "subject": "Science", "mode": "combined"
+            })
+            calls = len(StructuredModel.calls)
+            await client.post("/worksheets/generate-with-vision", json={
+                "image": "", "grades": ["3", "4", "5"], "subject": "Science", "mode": "combined"
+            })
+            return first, StructuredModel.calls[calls:]
+
+    with tempfile.TemporaryDirectory() as directory:
+        with fake_gemini(StructuredModel, GOOGLE_AI_CACHE_ENABLED="true", GOOGLE_AI_RPM="1000",
+                         GOOGLE_AI_CACHE_PATH=os.path.join(directory, "responses.sqlite3")):
+            response, repeat_calls = asyncio.run(run())
+
+    assert response.status_code == 200
+    worksheets = response.json()["worksheets"]
+    assert list(worksheets) == ["3", "4", "5"]
+    assert "WORKSHEET - GRADE 4" in worksheets["4"] and "10. Question 10 for grade 4" in worksheets["4"]
+    assert "A separately generated question" in worksheets["5"]
+
+    # One combined call sized for all grades, then one call for the invalid grade
+    combined, single = StructuredModel.calls[:2]
+    assert "for each of these grades: 3, 4, 5" in combined.prompt
+    assert "Grade 5 Science worksheet" in single.prompt
+    assert combined.generation_config.max_output_tokens == 3 * single.generation_config.max_output_tokens
+
+    # The set with an invalid grade was not cached: a repeat asks for it again,
+    # while the valid single-grade worksheet comes from the cache
+    assert [call.prompt for call in repeat_calls] == [combined.prompt]
+
+
+def test_combined_prompt_carries_instructions_for_each_grade():
+    from routers.worksheets import generate_combined_worksheets
+
+    with fake_gemini(StructuredModel, GOOGLE_AI_RPM="1000") as service:
+        asyncio.run(generate_combined_worksheets(service, ["1", "5"], "Science"))
+
+    # One system prompt, but each grade keeps its own language rules
+    prompt = StructuredModel.calls[0].prompt
+    assert GRADE_INSTRUCTIONS["1"] in prompt and GRADE_INSTRUCTIONS["5"] in prompt
+    assert GRADE_INSTRUCTIONS["3"] not in prompt
+    assert "Grade Level: 1, 5" not in prompt
+
+
+if __name__ == "__main__":
+    test_parse_splits_and_validates_grades()
+    test_combined_mode_falls_back_per_grade()
+    test_combined_prompt_carries_instructions_for_each_grade()
+    print("✅ Multi-grade worksheet tests passed")
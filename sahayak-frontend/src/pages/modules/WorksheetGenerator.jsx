@@ -1,4 +1,4 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import { useTranslation } from 'react-i18next'
 import { 
   PhotoIcon, 
@@ -16,6 +16,7 @@ import api from '../../config/api'
 const WorksheetGenerator = () => {
   const { t } = useTranslation()
   const [uploadedImage, setUploadedImage] = useState(null)
+  const [uploadedFile, setUploadedFile] = useState(null)
   const [subject, setSubject] = useState('science')
   const [selectedGrades, setSelectedGrades] = useState(['3'])
   const [worksheets, setWorksheets] = useState({})
@@ -47,17 +48,27 @@ const WorksheetGenerator = () => {
     { value: '5', label: 'Grade 5' }
   ]
 
+  // Release each preview URL once it is replaced or the page unmounts
+  useEffect(() => {
+    return () => {
+      if (uploadedImage) URL.revokeObjectURL(uploadedImage)
+    }
+  }, [uploadedImage])
+
   const handleImageUpload = (e) => {
     const file = e.target.files[0]
     if (file) {
-      const reader = new FileReader()
-      reader.onload = (e) => {
-        setUploadedImage(e.target.result)
-      }
-      reader.readAsDataURL(file)
+      // The file itself is uploaded; the object URL is only for the preview
+      setUploadedFile(file)
+      setUploadedImage(URL.createObjectURL(file))
     }
   }
 
+  const removeImage = () => {
+    setUploadedImage(null)
+    setUploadedFile(null)
+  }
+
   const toggleGrade = (grade) => {
     setSelectedGrades(prev => 
       prev.includes(grade) 
@@ -67,18 +78,23 @@ const WorksheetGenerator = () => {
   }
 
   const generateWorksheets = async () => {
-    if (!uploadedImage || selectedGrades.length === 0) return
+    if (!uploadedFile || selectedGrades.length === 0) return
 
     setLoading(true)
     setError('')
     setWorksheets({})
 
     try {
-      // Use the new vision-based endpoint with llava-phi3
-      const response = await api.post('/worksheets/generate-with-vision', {
-        image: uploadedImage,
-        grades: selectedGrades,
-        subject: subject
+      // Stream the photo as a multipart upload instead of base64 in JSON
+      const formData = new FormData()
+      formData.append('image', uploadedFile)
+      selectedGrades.forEach(grade => formData.append('grades', grade))
+      formData.append('subject', subject)
+
+      const response = await api.post('/worksheets/generate-with-vision/upload', formData, {
+        headers: {
+          'Content-Type': 'multipart/form-data'
+        }
       })
       
       const generatedWorksheets = response.data.worksheets
@@ -179,7 +195,7 @@ const WorksheetGenerator = () => {
                       className="max-w-full h-40 object-contain mx-auto rounded"
                     />
                     <button
-                      onClick={() => setUploadedImage(null)}
+                      onClick={removeImage}
                       className="absolute top-2 right-2 p-1 bg-red-500 text-white rounded-full hover:bg-red-600"
                     >
                       <XMarkIcon className="w-4 h-4" />
@@ -253,7 +269,7 @@ const WorksheetGenerator = () => {
 
               <button
                 onClick={generateWorksheets}
-                disabled={!uploadedImage || selectedGrades.length === 0 || loading}
+                disabled={!uploadedFile || selectedGrades.length === 0 || loading}
                 className="btn-primary w-full"
               >
                 {loading ? 'Generating...' : 'Generate Worksheets'}